@@ -0,0 +1,196 @@
+"""
+agents/cache_llm.py
+
+Caché persistente de respuestas del modelo de chat.
+---------------------------------------------------
+• La clave combina el backend, el modelo, el hash de los mensajes y los
+  parámetros de muestreo: un informe repetido con el mismo contexto recuperado no vuelve a
+  llamar a la API.
+• Las respuestas caducan tras `TTL_RESPUESTAS` y la caché está limitada en
+  tamaño con desalojo LRU (ver `rag.cache.CacheDisco`).
+• El modo determinista (`temperature=0` y `seed` fijo) hace que la respuesta
+  cacheada sea equivalente a la que devolvería una nueva llamada. Se activa por
+  llamada o con la variable de entorno `ALIE_LLM_DETERMINISTA=1`.
+• `completar_chat_stream` entrega la respuesta token a token; un acierto de
+  caché se entrega completo de una vez.
+• Las llamadas reales respetan el límite de concurrencia de `agents_utils.turno_llm`.
+  En el stream, un hilo lee la respuesta de la API y el turno se libera al
+  terminar esa lectura, no cuando el consumidor acaba de recibirla.
+• Cada llamada registra un tramo (por defecto "llm.chat") con acierto de
+  caché, tokens de entrada / salida y coste estimado.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import queue
+import threading
+from functools import lru_cache
+from typing import Any, Callable, Iterator
+
+from agents_utils import turno_llm
+from backends import backend_activo
+from rag.cache import CACHE_DIR, CacheDisco
+from trazas import coste_estimado, en_contexto, registrar_tramo, tramo
+
+CACHE_LLM_PATH = os.path.join(CACHE_DIR, "respuestas_llm.sqlite3")
+MAX_RESPUESTAS_CACHE = 5_000
+TTL_RESPUESTAS = 7 * 24 * 3600
+SEMILLA_DETERMINISTA = 2024
+
+# Marca de fin del stream en la cola entre el hilo lector y el consumidor
+_FIN = object()
+
+
+@lru_cache(maxsize=1)
+def obtener_cache_llm() -> CacheDisco:
+    return CacheDisco(CACHE_LLM_PATH, MAX_RESPUESTAS_CACHE, ttl=TTL_RESPUESTAS)
+
+
+def parametros_muestreo(temperatura: float, determinista: bool | None = None) -> dict[str, Any]:
+    """Parámetros de muestreo efectivos para la llamada (y para la clave)."""
+    if determinista is None:
+        determinista = os.getenv("ALIE_LLM_DETERMINISTA") == "1"
+    if determinista:
+        return {"temperature": 0.0, "seed": SEMILLA_DETERMINISTA}
+    return {"temperature": temperatura}
+
+
+def clave_respuesta(modelo: str, mensajes: list[dict], parametros: dict[str, Any]) -> str:
+    contenido = json.dumps(
+        # Las respuestas simuladas (ALIE_BACKEND=local) no se mezclan con las reales
+        {"backend": backend_activo(), "modelo": modelo, "mensajes": mensajes, "parametros": parametros},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+
+def _anotar_uso(medida: dict, modelo: str, uso) -> None:
+    if uso is None:
+        return
+    entrada, salida = uso.prompt_tokens, uso.completion_tokens
+    medida.update(tokens_entrada=entrada, tokens_salida=salida, coste_usd=coste_estimado(modelo, entrada, salida))
+
+
+def completar_chat(
+    obtener_cliente: Callable[[], Any],
+    modelo: str,
+    mensajes: list[dict],
+    temperatura: float = 0.7,
+    determinista: bool | None = None,
+    nombre_tramo: str = "llm.chat",
+) -> str:
+    """
+    Devuelve el contenido de la respuesta del modelo, consultando primero la caché.
+
+    Args:
+        obtener_cliente: Devuelve el cliente de OpenAI; solo se invoca si la
+            respuesta no está en caché.
+        modelo: Nombre del modelo de chat.
+        mensajes: Mensajes en el formato de la API de chat.
+        temperatura: Temperatura cuando no se fuerza el modo determinista.
+        determinista: Fuerza (True) o desactiva (False) el modo determinista;
+            None usa `ALIE_LLM_DETERMINISTA`.
+        nombre_tramo: Nombre del tramo de trazas de la llamada.
+    """
+    parametros = parametros_muestreo(temperatura, determinista)
+    clave = clave_respuesta(modelo, mensajes, parametros)
+    cache = obtener_cache_llm()
+    with tramo(nombre_tramo, modelo=modelo) as medida:
+        en_cache = cache.obtener_varios([clave])
+        medida.update(aciertos_cache=len(en_cache), fallos_cache=1 - len(en_cache))
+        if clave in en_cache:
+            return en_cache[clave].decode("utf-8")
+
+        with turno_llm():
+            respuesta = obtener_cliente().chat.completions.create(model=modelo, messages=mensajes, **parametros)
+        _anotar_uso(medida, modelo, getattr(respuesta, "usage", None))
+    texto = respuesta.choices[0].message.content.strip()
+    cache.guardar_varios({clave: texto.encode("utf-8")})
+    return texto
+
+
+def completar_chat_stream(
+    obtener_cliente: Callable[[], Any],
+    modelo: str,
+    mensajes: list[dict],
+    temperatura: float = 0.7,
+    determinista: bool | None = None,
+    nombre_tramo: str = "llm.chat",
+) -> Iterator[str]:
+    """
+    Igual que `completar_chat`, pero entrega el texto a medida que llega
+    (`stream=True`). La respuesta solo se guarda en caché si se recibió completa.
+    """
+    parametros = parametros_muestreo(temperatura, determinista)
+    clave = clave_respuesta(modelo, mensajes, parametros)
+    cache = obtener_cache_llm()
+    en_cache = cache.obtener_varios([clave])
+    if clave in en_cache:
+        registrar_tramo(nombre_tramo, 0.0, modelo=modelo, aciertos_cache=1, fallos_cache=0)
+        yield en_cache[clave].decode("utf-8")
+        return
+
+    cola: queue.SimpleQueue = queue.SimpleQueue()
+    cancelado = threading.Event()
+    threading.Thread(
+        target=en_contexto(_recibir_stream),
+        args=(cola, cancelado, obtener_cliente, modelo, mensajes, parametros, nombre_tramo, clave),
+        name="llm-stream",
+        daemon=True,
+    ).start()
+    try:
+        while (elemento := cola.get()) is not _FIN:
+            if isinstance(elemento, Exception):
+                raise elemento
+            yield elemento
+    finally:
+        # Si el consumidor abandona el stream, la llamada se corta y libera el turno
+        cancelado.set()
+
+
+def _recibir_stream(
+    cola: queue.SimpleQueue,
+    cancelado: threading.Event,
+    obtener_cliente: Callable[[], Any],
+    modelo: str,
+    mensajes: list[dict],
+    parametros: dict[str, Any],
+    nombre_tramo: str,
+    clave: str,
+) -> None:
+    """
+    Lee el stream de la API en su propio hilo y deja cada fragmento en `cola`.
+    El turno de `turno_llm` se libera en cuanto termina la respuesta, aunque el
+    consumidor (un cliente HTTP lento) todavía no la haya leído.
+    """
+    partes: list[str] = []
+    try:
+        with turno_llm(), tramo(nombre_tramo, modelo=modelo, aciertos_cache=0, fallos_cache=1) as medida:
+            eventos = obtener_cliente().chat.completions.create(
+                model=modelo,
+                messages=mensajes,
+                stream=True,
+                # El último evento trae el consumo de tokens
+                stream_options={"include_usage": True},
+                **parametros,
+            )
+            for evento in eventos:
+                if cancelado.is_set():
+                    getattr(eventos, "close", lambda: None)()
+                    return
+                _anotar_uso(medida, modelo, getattr(evento, "usage", None))
+                if not evento.choices:
+                    continue
+                delta = evento.choices[0].delta.content
+                if delta:
+                    partes.append(delta)
+                    cola.put(delta)
+        obtener_cache_llm().guardar_varios({clave: "".join(partes).strip().encode("utf-8")})
+    except Exception as e:
+        cola.put(e)
+    else:
+        cola.put(_FIN)
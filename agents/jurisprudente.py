@@ -13,7 +13,8 @@ from __future__ import annotations
 
 from typing import Any
 
-from agents_utils import get_openai_model
+from agents_utils import MODELO_AGENTES, anotar_uso, get_openai_model, texto_respuesta, turno_llm
+from trazas import tramo
 
 # ---------------------------------------------------------------------
 # Prompt del agente
@@ -65,10 +66,12 @@ def responder_jurisprudencia(contexto: str, periodo: str) -> str:
 
     try:
         model = get_openai_model()
-        response: Any = model.invoke(
-            PROMPT_JURISPRUDENTE.format(input=contexto, periodo=periodo)
-        )
-        return str(response).strip()
+        with turno_llm(), tramo("agente.jurisprudente", modelo=MODELO_AGENTES) as medida:
+            response: Any = model.invoke(
+                PROMPT_JURISPRUDENTE.format(input=contexto, periodo=periodo)
+            )
+            anotar_uso(medida, response)
+        return texto_respuesta(response)
     except Exception:
         return (
             "Ocurrió un error al procesar la jurisprudencia. "
@@ -8,7 +8,8 @@ Agente Legislador:
 • Evita llamadas innecesarias a la API si el contexto es insuficiente.
 """
 
-from agents_utils import get_openai_model
+from agents_utils import MODELO_AGENTES, anotar_uso, get_openai_model, texto_respuesta, turno_llm
+from trazas import tramo
 
 PROMPT_LEGISLADOR = """
 Eres un asistente legal corporativo experto en legislación costarricense. Tu tarea es revisar todas las leyes proporcionadas y generar un resumen ejecutivo para Cacti S.A., considerando el periodo especificado.
@@ -59,10 +60,12 @@ def responder_legislacion(contexto: str, anios_filtrados: list[int]) -> str:
 
     try:
         model = get_openai_model()
-        respuesta = model.invoke(
-            PROMPT_LEGISLADOR.format(input=contexto, periodo=", ".join(map(str, anios_filtrados)))
-        )
-        return str(respuesta).strip()
+        with turno_llm(), tramo("agente.legislador", modelo=MODELO_AGENTES) as medida:
+            respuesta = model.invoke(
+                PROMPT_LEGISLADOR.format(input=contexto, periodo=", ".join(map(str, anios_filtrados)))
+            )
+            anotar_uso(medida, respuesta)
+        return texto_respuesta(respuesta)
     except Exception:
         return (
             "Ocurrió un error al procesar la legislación. "
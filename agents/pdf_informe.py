@@ -0,0 +1,242 @@
+"""
+agents/pdf_informe.py
+
+Renderizado del informe legal en PDF con ReportLab.
+---------------------------------------------------
+• Los estilos se construyen una sola vez por proceso.
+• Trabaja sobre las secciones estructuradas que rellena el redactor
+  (`SeccionesInforme`), sin volver a parsear el texto del informe.
+• `renderizar_pdf` escribe en una ruta o en un objeto tipo fichero y
+  `renderizar_pdf_bytes` devuelve el PDF en memoria (modo servicio).
+• `renderizar_pdf_en_segundo_plano` lo genera en un pool de procesos y
+  devuelve un `Future`: la respuesta de texto no espera a ReportLab. El
+  tiempo medido en el proceso hijo se registra como tramo "pdf".
+"""
+
+import io
+import logging
+import multiprocessing
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import lru_cache
+from typing import BinaryIO, TypedDict
+
+from trazas import en_contexto, registrar_tramo
+
+log = logging.getLogger(__name__)
+
+MAX_PROCESOS_PDF = 2
+MAX_ITEMS_SECCION = 6
+COLOR_CORPORATIVO = "#003366"
+
+PIE_INFORME = (
+    "Este informe ha sido generado con RAGs (Retrieval-Augmented Generation). "
+    "Es indispensable que se consulte con Catalunya Consulting para validar la información "
+    "y tomar decisiones estratégicas. La Inteligencia Artificial es el futuro del management legal, "
+    "pero no sustituye el asesoramiento profesional que Catalunya Consulting ofrece a sus clientes. "
+    "Es una herramienta que complementa la experiencia y el conocimiento de los abogados."
+)
+
+
+class SeccionesInforme(TypedDict, total=False):
+    """Contenido del informe por sección, tal como lo muestra el texto."""
+    periodo: str
+    cabecera: list[str]
+    contratos: list[str]
+    cifras: list[str]
+    jurisprudencia: list[str]
+    legislacion: list[str]
+    agentes: list[str]
+    observaciones: str
+
+
+@lru_cache(maxsize=1)
+def _estilos() -> dict:
+    """Hoja de estilos del informe, creada una vez por proceso."""
+    from reportlab.lib import colors
+    from reportlab.lib.enums import TA_CENTER, TA_LEFT
+    from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+
+    corporativo = colors.HexColor(COLOR_CORPORATIVO)
+    styles = getSampleStyleSheet()
+    styles.add(ParagraphStyle(name="Justify", alignment=TA_LEFT, fontSize=8, leading=10))
+    styles.add(ParagraphStyle(name="SectionTitle", alignment=TA_LEFT, fontSize=10, leading=12, textColor=corporativo, spaceAfter=2, spaceBefore=6, fontName="Helvetica-Bold"))
+    styles.add(ParagraphStyle(name="Header", alignment=TA_CENTER, fontSize=13, leading=15, textColor=corporativo, fontName="Helvetica-Bold"))
+    styles.add(ParagraphStyle(name="Footer", alignment=TA_CENTER, fontSize=7, leading=9, textColor=colors.grey))
+    return {"styles": styles, "corporativo": corporativo}
+
+
+def secciones_desde_texto(resumen: str) -> SeccionesInforme:
+    """Reconstruye las secciones a partir del texto de un informe ya redactado."""
+    marcadores = (
+        ("INFORME LEGAL", "header"),
+        ("Periodo de análisis", "periodo"),
+        ("CONTRATOS", "contratos"),
+        ("CIFRAS DEL PERIODO", "cifras"),
+        ("JURISPRUDENCIA", "jurisprudencia"),
+        ("Consideraciones legales", "legislacion"),
+        ("ANÁLISIS DE LOS AGENTES ESPECIALIZADOS", "agentes"),
+        ("Este informe", "footer"),
+        ("Generado por", "cabecera"),
+        ("RESUMEN U OBSERVACIONES DE CATALUNYA CONSULTING", "observaciones"),
+    )
+    lineas: dict[str, list[str]] = {}
+    actual = None
+    for linea in resumen.strip().split("\n"):
+        linea = linea.strip()
+        for prefijo, nombre in marcadores:
+            if linea.startswith(prefijo):
+                actual = nombre
+                lineas[actual] = [linea]
+                break
+        else:
+            if actual:
+                lineas[actual].append(linea)
+
+    secciones: SeccionesInforme = {}
+    if "periodo" in lineas:
+        secciones["periodo"] = lineas["periodo"][0]
+    if "cabecera" in lineas:
+        secciones["cabecera"] = [l for l in lineas["cabecera"] if l]
+    for nombre in ("contratos", "cifras", "jurisprudencia"):
+        if nombre in lineas:
+            secciones[nombre] = [l for l in lineas[nombre] if l.startswith("• ")]
+    if "legislacion" in lineas:
+        cuerpo = "\n".join(lineas["legislacion"][1:])
+        secciones["legislacion"] = [f"• {ley.strip()}" for ley in cuerpo.split("• ") if ley.strip()]
+    if "agentes" in lineas:
+        secciones["agentes"] = ["\n".join(lineas["agentes"][1:])]
+    if "observaciones" in lineas:
+        secciones["observaciones"] = "\n".join(lineas["observaciones"][1:])
+    return secciones
+
+
+def _construir_story(secciones: SeccionesInforme) -> list:
+    from reportlab.platypus import HRFlowable, Paragraph, Spacer
+
+    estilos = _estilos()
+    styles, corporativo = estilos["styles"], estilos["corporativo"]
+
+    def parrafos(lineas, espacio: float = 2) -> None:
+        for linea in lineas:
+            if linea.strip():
+                story.append(Paragraph(linea.strip(), styles["Justify"]))
+                story.append(Spacer(1, espacio))
+
+    story = []
+    # Header
+    story.append(Paragraph("INFORME LEGAL Y FINANCIERO AUTOMATIZADO", styles["Header"]))
+    story.append(Spacer(1, 2))
+    if secciones.get("periodo"):
+        parrafos([secciones["periodo"]])
+    parrafos(secciones.get("cabecera", []))
+    # Línea divisoria (horizontal, fina)
+    story.append(HRFlowable(width="100%", thickness=1, color=corporativo))
+    story.append(Spacer(1, 4))
+    # Contratos y jurisprudencia: solo las primeras entradas para no exceder una página
+    if "contratos" in secciones:
+        story.append(Paragraph("Contratos relevantes", styles["SectionTitle"]))
+        parrafos(secciones["contratos"][:MAX_ITEMS_SECCION])
+    if secciones.get("cifras"):
+        story.append(Paragraph("Cifras del periodo (Monto_CRC)", styles["SectionTitle"]))
+        parrafos(secciones["cifras"][:MAX_ITEMS_SECCION])
+    if "jurisprudencia" in secciones:
+        story.append(Paragraph("Jurisprudencia relevante", styles["SectionTitle"]))
+        parrafos(secciones["jurisprudencia"][:MAX_ITEMS_SECCION])
+    # Legislación
+    if "legislacion" in secciones:
+        story.append(Paragraph("Legislación relevante", styles["SectionTitle"]))
+        for ley in secciones["legislacion"]:
+            ley = ley.strip().removeprefix("• ")
+            if ley:
+                story.append(Paragraph(ley, styles["Justify"]))
+                story.append(Spacer(1, 6))
+    # Análisis de los agentes especializados
+    if secciones.get("agentes"):
+        story.append(Paragraph("Análisis de los agentes especializados", styles["SectionTitle"]))
+        parrafos(l.replace("**", "") for bloque in secciones["agentes"] for l in bloque.split("\n"))
+    # Observaciones de Catalunya Consulting
+    if "observaciones" in secciones:
+        story.append(Paragraph("Análisis estratégico y recomendaciones personalizadas para Cacti S.A.", styles["SectionTitle"]))
+        for line in secciones["observaciones"].split("\n"):
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("## ") or line.startswith("#### ") or (line.startswith("**") and line.endswith("**")) or (line.endswith(":") and not line.startswith("-")):
+                clean_line = line.replace("## ", "").replace("#### ", "").replace("**", "").strip(":").strip()
+                story.append(Spacer(1, 2))
+                story.append(Paragraph(clean_line, styles["SectionTitle"]))
+            else:
+                clean_line = line.replace("**", "").replace("--", "").strip()
+                story.append(Paragraph(clean_line, styles["Justify"]))
+                story.append(Spacer(1, 2))
+    # Footer
+    story.append(Spacer(1, 3))
+    story.append(Paragraph(PIE_INFORME, styles["Footer"]))
+    # Línea final (horizontal, fina)
+    story.append(Spacer(1, 1))
+    story.append(HRFlowable(width="100%", thickness=1, color=corporativo))
+    return story
+
+
+def renderizar_pdf(secciones: SeccionesInforme, destino: str | BinaryIO) -> None:
+    """Genera el PDF en `destino` (ruta de archivo u objeto tipo fichero)."""
+    from reportlab.lib.pagesizes import LETTER
+    from reportlab.platypus import SimpleDocTemplate
+
+    doc = SimpleDocTemplate(destino, pagesize=LETTER,
+                            rightMargin=40, leftMargin=40,
+                            topMargin=40, bottomMargin=40)
+    doc.build(_construir_story(secciones))
+
+
+def renderizar_pdf_bytes(secciones: SeccionesInforme) -> bytes:
+    """Genera el PDF en memoria, sin tocar el disco."""
+    buffer = io.BytesIO()
+    renderizar_pdf(secciones, buffer)
+    return buffer.getvalue()
+
+
+def _renderizar_en_proceso(secciones: SeccionesInforme, nombre_archivo: str | None) -> tuple[bytes | None, float]:
+    """Se ejecuta en el proceso hijo; devuelve el PDF (si va a memoria) y la duración."""
+    inicio = time.perf_counter()
+    if nombre_archivo is None:
+        datos = renderizar_pdf_bytes(secciones)
+    else:
+        renderizar_pdf(secciones, nombre_archivo)
+        datos = None
+    return datos, time.perf_counter() - inicio
+
+
+@lru_cache(maxsize=1)
+def _obtener_pool() -> ProcessPoolExecutor:
+    # "spawn": el proceso principal tiene hilos activos (servidor, agentes)
+    return ProcessPoolExecutor(max_workers=MAX_PROCESOS_PDF, mp_context=multiprocessing.get_context("spawn"))
+
+
+def renderizar_pdf_en_segundo_plano(secciones: SeccionesInforme, nombre_archivo: str | None = None) -> Future:
+    """
+    Encarga el PDF a un proceso en segundo plano. Con `nombre_archivo` el
+    resultado se escribe en disco; sin él, el `Future` devuelve los bytes.
+    """
+    resultado: Future = Future()
+
+    def al_terminar(futuro: Future) -> None:
+        try:
+            datos, segundos = futuro.result()
+        except Exception as e:
+            registrar_tramo("pdf", 0.0, error=type(e).__name__, archivo=nombre_archivo)
+            log.error("No se pudo generar el PDF %s: %s", nombre_archivo or "(memoria)", e)
+            resultado.set_exception(e)
+            return
+        if datos is None:
+            registrar_tramo("pdf", segundos, archivo=nombre_archivo)
+        else:
+            registrar_tramo("pdf", segundos, bytes=len(datos))
+        if nombre_archivo:
+            log.info("PDF generado correctamente: %s", nombre_archivo)
+        resultado.set_result(datos)
+
+    futuro = _obtener_pool().submit(_renderizar_en_proceso, dict(secciones), nombre_archivo)
+    futuro.add_done_callback(en_contexto(al_terminar))
+    return resultado
@@ -2,130 +2,255 @@
 agents/redactor_legal.py
 
 • Compone un resumen legal final a partir de contratos, jurisprudencia y legislación.
-• Genera un PDF de una sola página con ReportLab.
+• Rellena las secciones estructuradas del informe, que `agents.pdf_informe`
+  convierte en un PDF de una sola página con ReportLab.
+• Los documentos se deduplican por registro y el prompt de observaciones se
+  ajusta a un presupuesto de tokens (ver `rag.contexto`).
+• Las cifras de Monto_CRC (totales, contrapartes y serie mensual) llegan ya
+  calculadas sobre todos los registros (ver `rag.analitica`); el redactor solo
+  les da formato y las pasa al prompt para que GPT-4o no tenga que sumar.
 """
 
+import logging
 from datetime import datetime
+from typing import Callable, Iterator
+
+from langchain.schema import Document
+
+from agents.cache_llm import completar_chat_stream
+from backends import obtener_cliente_chat
+from agents.pdf_informe import SeccionesInforme, renderizar_pdf, secciones_desde_texto
+from rag.contexto import deduplicar, empaquetar
+from rag.periodos import en_periodo
+from trazas import tramo
+
+log = logging.getLogger(__name__)
+
+# Contrapartes que se listan en las cifras del periodo
+MAX_CONTRAPARTES = 5
+
+
+def _crc(monto: int) -> str:
+    return f"CRC {monto:,}"
+
+
+def formatear_cifras(cifras: dict[str, dict]) -> list[str]:
+    """Líneas de la sección de cifras a partir de `rag.analitica.TablaMontos.resumir`."""
+    lineas = []
+    for titulo, resumen in cifras.items():
+        lineas.append(f"• {titulo}: {_crc(resumen['total'])} en {resumen['registros']} registros")
+        if len(resumen["por_anio"]) > 1:
+            lineas.append("• " + titulo + " por año: " + "; ".join(f"{a}: {_crc(t)}" for a, t in resumen["por_anio"].items()))
+        contrapartes = resumen["por_contraparte"][:MAX_CONTRAPARTES]
+        if contrapartes:
+            lineas.append(
+                "• " + titulo + " por contraparte: "
+                + "; ".join(f"{empresa}: {_crc(total)} ({n})" for empresa, total, n in contrapartes)
+            )
+        if resumen["por_mes"]:
+            lineas.append("• " + titulo + " por mes: " + "; ".join(f"{m}: {_crc(t)}" for m, t in resumen["por_mes"].items()))
+    return lineas
+
+
+def redactar_respuesta_legal(
+    contexto: dict[str, list[Document]],
+    anio_inicio: int,
+    anio_fin: int,
+    determinista: bool | None = None,
+    analisis_agentes: dict[str, str] | Callable[[], dict[str, str]] | None = None,
+    secciones: SeccionesInforme | None = None,
+    cifras: dict[str, dict] | None = None,
+) -> str:
+    """
+    Redacta el informe completo (ver `redactar_respuesta_legal_stream`).
+    """
+    return "".join(
+        redactar_respuesta_legal_stream(contexto, anio_inicio, anio_fin, determinista, analisis_agentes, secciones, cifras)
+    )
+
+
+def redactar_respuesta_legal_stream(
+    contexto: dict[str, list[Document]],
+    anio_inicio: int,
+    anio_fin: int,
+    determinista: bool | None = None,
+    analisis_agentes: dict[str, str] | Callable[[], dict[str, str]] | None = None,
+    secciones: SeccionesInforme | None = None,
+    cifras: dict[str, dict] | None = None,
+) -> Iterator[str]:
+    """
+    Redacta el informe a partir de los documentos recuperados y lo entrega por
+    partes: primero las secciones deterministas (contratos, jurisprudencia y
+    legislación), de inmediato, y después las observaciones de GPT-4o token a
+    token. Los campos de cada entrada se toman del `Registro` guardado en los
+    metadatos durante la carga, sin volver a parsear el texto.
+
+    La sección de observaciones pasa por la caché de respuestas del LLM;
+    `determinista` fuerza una generación reproducible (ver `agents.cache_llm`).
+    `analisis_agentes` contiene los resúmenes de los agentes legislador y
+    jurisprudente (o una función que espera a que terminen), que se incluyen en
+    el informe y en el prompt de observaciones.
+
+    Si se pasa `secciones`, se rellena con el contenido de cada sección a
+    medida que se redacta, para generar el PDF sin volver a parsear el texto.
+    `cifras` son los agregados de Monto_CRC del periodo por tipo de documento
+    (ver `graph.flujo.cifras_del_periodo`).
+    """
+    if secciones is None:
+        secciones = {}
+    if not (isinstance(anio_inicio, int) and isinstance(anio_fin, int) and anio_inicio <= anio_fin):
+        yield "No se indicaron años válidos."
+        return
 
+    def filtrar_por_anio(datos: list[Document]) -> list[Document]:
+        # Por el año entero del registro: comparación de intervalo, sin buscar
+        # el año como texto (que también coincidía con otros números)
+        return [d for d in datos if en_periodo(d.metadata, anio_inicio, anio_fin)]
 
-def redactar_respuesta_legal(contexto: dict[str, list[str]], anio_inicio: int, anio_fin: int) -> str:
-    if not (isinstance(anio_inicio, int) and isinstance(anio_fin, int) and anio_inicio <= anio_fin):
-        return "No se indicaron años válidos."
-
-    def filtrar_por_anio(datos: list[str]) -> list[str]:
-        return [d for d in datos if any(str(a) in d for a in range(anio_inicio, anio_fin + 1))]
-
-    def extraer_info_contrato(texto: str) -> str:
-        lineas = texto.split('\n')
-        anio = next((l.replace('Año: ','') for l in lineas if l.startswith('Año:')), None)
-        contraparte = next((l.replace('Empresa Contraparte: ','') for l in lineas if l.startswith('Empresa Contraparte:')), None)
-        resumen = next((l.replace('Resumen: ','') for l in lineas if l.startswith('Resumen:')), None)
-        monto = next((l.replace('Monto: ','') for l in lineas if l.startswith('Monto:')), None)
-        duracion = next((l.replace('Duración: ','') for l in lineas if l.startswith('Duración:')), None)
-        alcance = next((l.replace('Alcance: ','') for l in lineas if l.startswith('Alcance:')), None)
+    def extraer_info_contrato(doc: Document) -> str:
+        registro = doc.metadata
         partes = []
-        if anio:
-            partes.append(f"Año: {anio}")
-        if contraparte:
-            partes.append(f"Empresa: {contraparte}")
-        if resumen:
-            partes.append(f"Resumen: {resumen}")
-        if monto:
-            partes.append(f"Monto: {monto}")
-        if duracion:
-            partes.append(f"Duración: {duracion}")
-        if alcance:
-            partes.append(f"Alcance: {alcance}")
-        return "<br/>".join(partes) if partes else texto[:120]
-
-    def extraer_info_juris(texto: str) -> str:
-        lineas = texto.split('\n')
-        tribunal = next((l.replace('Tribunal: ','') for l in lineas if l.startswith('Tribunal:')), None)
-        resumen = next((l.replace('Resumen: ','') for l in lineas if l.startswith('Resumen:')), None)
-        anio = next((l.replace('Año: ','') for l in lineas if l.startswith('Año:')), None)
+        if registro.get("año"):
+            partes.append(f"Año: {registro['año']}")
+        if registro.get("empresa"):
+            partes.append(f"Empresa: {registro['empresa']}")
+        if registro.get("resumen"):
+            partes.append(f"Resumen: {registro['resumen']}")
+        if registro.get("monto_crc"):
+            monto = registro["monto_crc"]
+            partes.append(f"Monto: CRC {monto:,}" if isinstance(monto, int) else f"Monto: {monto}")
+        if registro.get("duracion"):
+            partes.append(f"Duración: {registro['duracion']}")
+        if registro.get("alcance"):
+            partes.append(f"Alcance: {registro['alcance']}")
+        return "<br/>".join(partes) if partes else doc.page_content[:120]
+
+    def extraer_info_juris(doc: Document) -> str:
+        registro = doc.metadata
         partes = []
-        if tribunal:
-            partes.append(f"Tribunal: {tribunal}")
-        if resumen:
-            partes.append(f"Resumen: {resumen}")
-        if anio:
-            partes.append(f"Año: {anio}")
-        return "<br/>".join(partes) if partes else texto[:120]
-
-    contratos = filtrar_por_anio(contexto.get("contrato", []))
-    jurisprudencia = filtrar_por_anio(contexto.get("jurisprudencia", []))
-    legislacion = filtrar_por_anio(contexto.get("legislacion", []))
+        if registro.get("tribunal"):
+            partes.append(f"Tribunal: {registro['tribunal']}")
+        if registro.get("resumen"):
+            partes.append(f"Resumen: {registro['resumen']}")
+        if registro.get("año"):
+            partes.append(f"Año: {registro['año']}")
+        return "<br/>".join(partes) if partes else doc.page_content[:120]
+
+    # Un documento por registro, en el orden del ranking de recuperación
+    contratos = deduplicar(filtrar_por_anio(contexto.get("contrato", [])))
+    jurisprudencia = deduplicar(filtrar_por_anio(contexto.get("jurisprudencia", [])))
+    legislacion = deduplicar(filtrar_por_anio(contexto.get("legislacion", [])))
 
     contratos_unicos = list(dict.fromkeys([extraer_info_contrato(c) for c in contratos]))
     jurisprudencia_unicos = list(dict.fromkeys([extraer_info_juris(j) for j in jurisprudencia]))
 
-    def formatear_ley(texto: str) -> str:
-        lineas = texto.split('\n')
-        datos = {}
-        for linea in lineas:
-            if ":" in linea:
-                clave, valor = linea.split(":", 1)
-                datos[clave.strip()] = valor.strip()
+    def formatear_ley(doc: Document) -> str:
+        registro = doc.metadata
         return (
-            f"• Ley: {datos.get('Ley', 'Desconocida')}\n"
-            f"  Artículo: {datos.get('Artículo', '?')}\n"
-            f"  Tema: {datos.get('Tema', 'N/A')}\n"
-            f"  Norma Aplicada: {datos.get('Norma_Aplicada', 'N/A')}\n"
-            f"  Año: {datos.get('Año', '?')}\n"
-            f"  Resumen: {datos.get('Resumen', '')}\n"
+            f"• Ley: {registro.get('ley', 'Desconocida')}\n"
+            f"  Artículo: {registro.get('articulo', '?')}\n"
+            f"  Tema: {registro.get('tema', 'N/A')}\n"
+            f"  Norma Aplicada: {registro.get('norma_aplicada', 'N/A')}\n"
+            f"  Año: {registro.get('año', '?')}\n"
+            f"  Resumen: {registro.get('resumen', '')}\n"
             f"  Análisis: Esta disposición legal introduce implicaciones sustantivas para la gestión corporativa, requiriendo atención particular para asegurar el cumplimiento normativo y prevenir riesgos regulatorios."
         )
 
     legislacion_unicos = list(dict.fromkeys([formatear_ley(l) for l in legislacion]))
 
-    resumen = f"""
+    secciones.update(
+        periodo=f"Periodo de análisis: {anio_inicio} a {anio_fin}",
+        cabecera=[
+            "Generado por: Catalunya Consulting",
+            "Bufete de abogados orientado al derecho empresarial",
+            "Informe para: Cacti S.A.",
+            f"Fecha de generación: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}",
+        ],
+        contratos=[f"• {c}" for c in contratos_unicos] or ["• No se encontraron contratos relevantes."],
+        jurisprudencia=[f"• {j}" for j in jurisprudencia_unicos] or ["• No se encontró jurisprudencia relevante."],
+        legislacion=legislacion_unicos or ["• No se encontró legislación relevante."],
+        cifras=formatear_cifras(cifras or {}),
+    )
+    seccion_cifras = (
+        "CIFRAS DEL PERIODO (Monto_CRC, todos los registros):\n" + "\n".join(secciones["cifras"]) + "\n\n"
+        if secciones["cifras"] else ""
+    )
+    cabecera = secciones["cabecera"]
+
+    yield f"""
 INFORME LEGAL AUTOMATIZADO – CACTI S.A.
 
-Generado por: Catalunya Consulting
-Bufete de abogados orientado al derecho empresarial
+{cabecera[0]}
+{cabecera[1]}
 
-Informe para: Cacti S.A.
-Fecha de generación: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}
+{cabecera[2]}
+{cabecera[3]}
 
-Periodo de análisis: {anio_inicio} a {anio_fin}
+{secciones["periodo"]}
 
 CONTRATOS ({len(contratos)}):
 (Se presenta un análisis extendido y detallado de los contratos relevantes para la empresa en el periodo indicado)
-{chr(10).join(f"• {c}" for c in contratos_unicos) or "• No se encontraron contratos relevantes."}
+{chr(10).join(secciones["contratos"])}
 
-JURISPRUDENCIA RELEVANTE ({len(jurisprudencia)}):
+{seccion_cifras}JURISPRUDENCIA RELEVANTE ({len(jurisprudencia)}):
 (Se presenta un análisis extendido y detallado de la jurisprudencia relevante para la empresa en el periodo indicado)
-{chr(10).join(f"• {j}" for j in jurisprudencia_unicos) or "• No se encontró jurisprudencia relevante."}
+{chr(10).join(secciones["jurisprudencia"])}
 
 Consideraciones legales:
-{chr(10).join(legislacion_unicos) or "• No se encontró legislación relevante."}
+{chr(10).join(secciones["legislacion"])}
 
-Este informe ha sido generado automáticamente y resume información legal y financiera para el periodo seleccionado.
+"""
+
+    # Los agentes se ejecutan en paralelo mientras se emite lo anterior
+    if callable(analisis_agentes):
+        analisis_agentes = analisis_agentes()
+    analisis_agentes = analisis_agentes or {}
+    bloques_agentes = [
+        f"{titulo}:\n{analisis_agentes[clave]}"
+        for clave, titulo in (("legislacion", "Agente legislador"), ("jurisprudencia", "Agente jurisprudente"))
+        if analisis_agentes.get(clave)
+    ]
+    secciones["agentes"] = bloques_agentes
+    seccion_agentes = (
+        "ANÁLISIS DE LOS AGENTES ESPECIALIZADOS:\n" + "\n\n".join(bloques_agentes) + "\n\n"
+        if bloques_agentes else ""
+    )
+
+    yield f"""{seccion_agentes}Este informe ha sido generado automáticamente y resume información legal y financiera para el periodo seleccionado.
 
 Recomendación final:
 A partir del análisis detallado de los contratos, la jurisprudencia y la legislación relevante, se recomienda a la dirección de Cacti S.A. considerar cuidadosamente el impacto práctico de cada obligación contractual, precedente judicial y disposición normativa en la toma de decisiones empresariales. Profundizar en la comprensión de los riesgos, oportunidades y tendencias identificadas permitirá anticipar escenarios, fortalecer la gestión legal y optimizar la estrategia corporativa. Ante dudas específicas, se sugiere consultar con el equipo legal para adaptar las acciones a la realidad normativa y jurisprudencial vigente.
 """
 
-    try:
-        import os
-        from openai import OpenAI
-
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    # El informe muestra todas las entradas; el prompt, las mejor clasificadas
+    # que caben en el presupuesto de tokens
+    prompt = empaquetar(
+        {"contratos": contratos_unicos, "jurisprudencia": jurisprudencia_unicos, "legislacion": legislacion_unicos}
+    )
 
-        respuesta_ia = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
+    try:
+        yield "\n\nRESUMEN U OBSERVACIONES DE CATALUNYA CONSULTING:\n"
+        observaciones = completar_chat_stream(
+            obtener_cliente_chat,
+            modelo="gpt-4o",
+            mensajes=[
                 {"role": "system", "content": "Eres un asesor jurídico especializado en derecho corporativo."},
                 {"role": "user", "content": f"""A continuación se te presentan tres bloques de contenido legal extraídos del análisis de una empresa:
 
 CONTRATOS:
-{chr(10).join(contratos_unicos)}
+{chr(10).join(prompt["contratos"])}
+
+CIFRAS EXACTAS DEL PERIODO (calculadas sobre todos los registros; no las recalcules):
+{chr(10).join(secciones["cifras"]) or "Sin montos registrados."}
 
 JURISPRUDENCIA:
-{chr(10).join(jurisprudencia_unicos)}
+{chr(10).join(prompt["jurisprudencia"])}
 
 LEGISLACIÓN:
-{chr(10).join(legislacion_unicos)}
+{chr(10).join(prompt["legislacion"])}
+
+ANÁLISIS DE LOS AGENTES ESPECIALIZADOS:
+{chr(10).join(bloques_agentes) or "Sin análisis adicionales."}
 
 Redacta una sección titulada 'Resumen u Observaciones de Catalunya Consulting' que:
 - Sintetice los hallazgos clave de los tres bloques.
@@ -134,138 +259,27 @@ Redacta una sección titulada 'Resumen u Observaciones de Catalunya Consulting'
 
 Usa un estilo claro, profesional y estratégico."""}
             ],
-            temperature=0.7
+            temperatura=0.7,
+            determinista=determinista,
+            nombre_tramo="llm.observaciones",
         )
-        resumen += "\n\nRESUMEN U OBSERVACIONES DE CATALUNYA CONSULTING:\n"
-        resumen += respuesta_ia.choices[0].message.content.strip()
+        partes = []
+        for delta in observaciones:
+            partes.append(delta)
+            yield delta
+        secciones["observaciones"] = "".join(partes)
     except Exception as e:
-        resumen += f"\n\nRESUMEN U OBSERVACIONES DE CATALUNYA CONSULTING:\n Error: {str(e)}"
-        print("Error al generar la sección de observaciones:", e)
-
-    return resumen
-
-def generar_pdf(resumen: str, nombre_archivo: str = "respuesta_legal.pdf") -> None:
-    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, HRFlowable
-    from reportlab.lib.pagesizes import LETTER
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.enums import TA_LEFT, TA_CENTER
-    from reportlab.lib.units import inch
-    from reportlab.lib import colors
-
-    doc = SimpleDocTemplate(nombre_archivo, pagesize=LETTER,
-                            rightMargin=40, leftMargin=40,
-                            topMargin=40, bottomMargin=40)
-
-    styles = getSampleStyleSheet()
-    styles.add(ParagraphStyle(name="Justify", alignment=TA_LEFT, fontSize=8, leading=10))
-    styles.add(ParagraphStyle(name="SectionTitle", alignment=TA_LEFT, fontSize=10, leading=12, textColor=colors.HexColor('#003366'), spaceAfter=2, spaceBefore=6, fontName="Helvetica-Bold"))
-    styles.add(ParagraphStyle(name="Header", alignment=TA_CENTER, fontSize=13, leading=15, textColor=colors.HexColor('#003366'), fontName="Helvetica-Bold"))
-    styles.add(ParagraphStyle(name="Footer", alignment=TA_CENTER, fontSize=7, leading=9, textColor=colors.grey))
-
-    # Extraer secciones del resumen
-    secciones = {}
-    actual = None
-    for linea in resumen.strip().split('\n'):
-        if linea.strip().startswith("INFORME LEGAL"):
-            actual = "header"
-            secciones[actual] = linea.strip()
-        elif linea.strip().startswith("Periodo de análisis"):
-            actual = "periodo"
-            secciones[actual] = linea.strip()
-        elif linea.strip().startswith("CONTRATOS"):
-            actual = "contratos"
-            secciones[actual] = linea.strip()
-        elif linea.strip().startswith("JURISPRUDENCIA"):
-            actual = "jurisprudencia"
-            secciones[actual] = linea.strip()
-        elif linea.strip().startswith("Consideraciones legales"):
-            actual = "legislacion"
-            secciones[actual] = linea.strip()
-        elif linea.strip().startswith("Este informe"):
-            actual = "footer"
-            secciones[actual] = linea.strip()
-        elif linea.strip().startswith("Generado por"):
-            actual = "subheader"
-            secciones[actual] = linea.strip()
-        elif linea.strip().startswith("RESUMEN U OBSERVACIONES DE CATALUNYA CONSULTING"):
-            actual = "observaciones"
-            secciones[actual] = linea.strip()
-        elif actual:
-            secciones[actual] += "\n" + linea.strip()
-
-    def truncar_seccion(texto: str, max_items: int = 6) -> str:
-        lineas = [l for l in texto.split("\n") if l.strip().startswith("• ")]
-        if not lineas:
-            return texto
-        return "\n".join(lineas[:max_items])
-
-    story = []
-    # Header
-    story.append(Paragraph("INFORME LEGAL Y FINANCIERO AUTOMATIZADO", styles["Header"]))
-    story.append(Spacer(1, 2))
-    if "periodo" in secciones:
-        story.append(Paragraph(secciones["periodo"], styles["Justify"]))
-        story.append(Spacer(1, 2))
-    if "subheader" in secciones:
-        for line in secciones["subheader"].split("\n"):
-            if line.strip():
-                story.append(Paragraph(line.strip(), styles["Justify"]))
-                story.append(Spacer(1, 2))
-    # Línea divisoria (horizontal, fina)
-    story.append(HRFlowable(width="100%", thickness=1, color=colors.HexColor('#003366')))
-    story.append(Spacer(1, 4))
-    # Contratos
-    if "contratos" in secciones:
-        story.append(Paragraph("Contratos relevantes", styles["SectionTitle"]))
-        for line in truncar_seccion(secciones["contratos"]).split("\n"):
-            if line.strip():
-                story.append(Paragraph(line, styles["Justify"]))
-                story.append(Spacer(1, 2))
-    # Jurisprudencia
-    if "jurisprudencia" in secciones:
-        story.append(Paragraph("Jurisprudencia relevante", styles["SectionTitle"]))
-        for line in truncar_seccion(secciones["jurisprudencia"]).split("\n"):
-            if line.strip():
-                story.append(Paragraph(line, styles["Justify"]))
-                story.append(Spacer(1, 2))
-    # Legislación
-    if "legislacion" in secciones:
-        story.append(Paragraph("Legislación relevante", styles["SectionTitle"]))
-        leyes = secciones["legislacion"].split("• ")
-        for ley in leyes:
-            if not ley.strip():
-                continue
-            for linea in ley.strip().split("<br/>"):
-                if linea.strip():
-                    story.append(Paragraph(linea.strip(), styles["Justify"]))
-            story.append(Spacer(1, 6))
-    # Observaciones de Catalunya Consulting
-    if "observaciones" in secciones:
-        story.append(Paragraph("Análisis estratégico y recomendaciones personalizadas para Cacti S.A.", styles["SectionTitle"]))
-        for line in secciones["observaciones"].split("\n")[1:]:
-            line = line.strip()
-            if not line:
-                continue
-            if line.startswith("## ") or line.startswith("#### ") or (line.startswith("**") and line.endswith("**")) or (line.endswith(":") and not line.startswith("-")):
-                clean_line = line.replace("## ", "").replace("#### ", "").replace("**", "").strip(":").strip()
-                story.append(Spacer(1, 2))
-                story.append(Paragraph(clean_line, styles["SectionTitle"]))
-            else:
-                clean_line = line.replace("**", "").replace("--", "").strip()
-                story.append(Paragraph(clean_line, styles["Justify"]))
-                story.append(Spacer(1, 2))
-    # Footer
-        story.append(Spacer(1, 3))
-        story.append(Paragraph(
-            "Este informe ha sido generado con RAGs (Retrieval-Augmented Generation). "
-            "Es indispensable que se consulte con Catalunya Consulting para validar la información "
-            "y tomar decisiones estratégicas. La Inteligencia Artificial es el futuro del management legal, "
-            "pero no sustituye el asesoramiento profesional que Catalunya Consulting ofrece a sus clientes. "
-            "Es una herramienta que complementa la experiencia y el conocimiento de los abogados.",
-            styles["Footer"]
-        ))
-    # Línea final (horizontal, fina)
-    story.append(Spacer(1, 1))
-    story.append(HRFlowable(width="100%", thickness=1, color=colors.HexColor('#003366')))
-    doc.build(story)
-    print(f"PDF generado correctamente: {nombre_archivo}")
+        secciones["observaciones"] = f" Error: {str(e)}"
+        yield secciones["observaciones"]
+        log.error("Error al generar la sección de observaciones: %s", e)
+
+
+def generar_pdf(resumen: str | SeccionesInforme, nombre_archivo: str = "respuesta_legal.pdf") -> None:
+    """
+    Genera el PDF de forma síncrona. Acepta las secciones estructuradas del
+    redactor o, por compatibilidad, el texto completo del informe.
+    """
+    secciones = secciones_desde_texto(resumen) if isinstance(resumen, str) else resumen
+    with tramo("pdf", archivo=nombre_archivo):
+        renderizar_pdf(secciones, nombre_archivo)
+    log.info("PDF generado correctamente: %s", nombre_archivo)
@@ -0,0 +1,70 @@
+"""
+agents_utils.py
+
+Utilidades compartidas por los agentes especializados (legislador, jurisprudente).
+
+• `get_openai_model`: modelo de chat de los agentes, uno por proceso y sobre el
+  pool HTTP compartido de `clientes` (el simulado de `backends` con
+  `ALIE_BACKEND=local`).
+• `turno_llm`: limita las llamadas simultáneas al LLM de todo el proceso (agentes
+  y redactor) cuando se fija un máximo con `limitar_concurrencia_llm`, como
+  hace el motor por lotes.
+• `anotar_uso`: tokens y coste de una respuesta, para el tramo de trazas.
+"""
+
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+from backends import chat_simulado, es_local
+from clientes import modelo_chat
+from trazas import coste_estimado
+
+MODELO_AGENTES = "gpt-4o"
+
+# Sin límite salvo que se configure (ver `limitar_concurrencia_llm`)
+_limite_llm: threading.BoundedSemaphore | None = None
+
+
+def get_openai_model():
+    """
+    Modelo de chat de los agentes, creado una vez por proceso. El tiempo máximo
+    por llamada es el de `clientes` (`ALIE_TIMEOUT_LLM`); el flujo aplica
+    además su propio tiempo máximo por agente.
+    """
+    if es_local():
+        return chat_simulado()
+    return modelo_chat(MODELO_AGENTES, 0.0)
+
+
+def texto_respuesta(respuesta) -> str:
+    """Extrae el texto de un mensaje de LangChain (o de una cadena)."""
+    return str(getattr(respuesta, "content", respuesta)).strip()
+
+
+def anotar_uso(medida: dict, respuesta) -> None:
+    """Añade al tramo los tokens y el coste estimado de un mensaje de LangChain."""
+    uso = getattr(respuesta, "usage_metadata", None) or {}
+    entrada, salida = uso.get("input_tokens", 0), uso.get("output_tokens", 0)
+    medida.update(
+        tokens_entrada=entrada,
+        tokens_salida=salida,
+        coste_usd=coste_estimado(MODELO_AGENTES, entrada, salida),
+    )
+
+
+def limitar_concurrencia_llm(maximo: int | None) -> None:
+    """Fija el máximo de llamadas simultáneas al LLM en el proceso (None = sin límite)."""
+    global _limite_llm
+    _limite_llm = threading.BoundedSemaphore(maximo) if maximo else None
+
+
+@contextmanager
+def turno_llm() -> Iterator[None]:
+    """Espera un turno libre antes de llamar al LLM, si hay límite configurado."""
+    limite = _limite_llm
+    if limite is None:
+        yield
+        return
+    with limite:
+        yield
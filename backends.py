@@ -0,0 +1,138 @@
+"""
+backends.py
+
+Backends intercambiables de embeddings y de chat.
+-------------------------------------------------
+• `ALIE_BACKEND=openai` (por defecto) usa la API de OpenAI.
+• `ALIE_BACKEND=local` usa sustitutos deterministas que no necesitan
+  `OPENAI_API_KEY`, pensados para pruebas y para `benchmark.py`:
+    - `EmbeddingsHash`: bolsa de palabras con hashing, normalizada (L2); los
+      textos que comparten palabras quedan cerca.
+    - `ChatSimulado`: respuesta enlatada derivada del prompt, con latencia
+      configurable; imita tanto el cliente de OpenAI (`chat.completions.create`,
+      con y sin `stream`) como el `invoke` de LangChain que usan los agentes.
+• `ALIE_LATENCIA_LLM` (segundos) y `ALIE_LATENCIA_TOKEN` fijan la latencia
+  simulada de cada llamada y de cada token emitido en streaming.
+• Los clientes reales salen del registro de `clientes` (pool HTTP compartido).
+"""
+
+import hashlib
+import math
+import os
+import re
+import time
+from functools import lru_cache
+from types import SimpleNamespace
+from typing import Iterator, List
+
+from langchain_core.embeddings import Embeddings
+
+import clientes
+
+DIMENSION_HASH = 256
+PALABRA_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def backend_activo() -> str:
+    return os.getenv("ALIE_BACKEND", "openai").strip().lower()
+
+
+def es_local() -> bool:
+    return backend_activo() == "local"
+
+
+class EmbeddingsHash(Embeddings):
+    """Embeddings deterministas por hashing de palabras (sin red ni modelo)."""
+
+    def __init__(self, dimension: int = DIMENSION_HASH):
+        self.dimension = dimension
+        self.model = f"hash-{dimension}"
+
+    def _vector(self, texto: str) -> List[float]:
+        vector = [0.0] * self.dimension
+        for palabra in PALABRA_RE.findall(texto.lower()):
+            h = int.from_bytes(hashlib.blake2b(palabra.encode("utf-8"), digest_size=8).digest(), "little")
+            # El bit alto decide el signo para repartir las colisiones
+            vector[h % self.dimension] += 1.0 if h >> 63 else -1.0
+        norma = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norma for v in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._vector(text)
+
+
+class ChatSimulado:
+    """
+    Modelo de chat determinista. La respuesta resume el prompt (número de
+    líneas y una huella) en varias frases, de modo que el informe y el PDF
+    tienen un tamaño realista.
+    """
+
+    def __init__(self, latencia: float | None = None, latencia_token: float | None = None, frases: int = 12):
+        self.latencia = float(os.getenv("ALIE_LATENCIA_LLM", "0")) if latencia is None else latencia
+        self.latencia_token = float(os.getenv("ALIE_LATENCIA_TOKEN", "0")) if latencia_token is None else latencia_token
+        self.frases = frases
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._crear))
+
+    def responder(self, prompt: str) -> str:
+        huella = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+        lineas = prompt.count("\n") + 1
+        cuerpo = [
+            f"- Observación {i + 1} ({huella}): el contexto analizado contiene {lineas} líneas relevantes."
+            for i in range(self.frases)
+        ]
+        return "## Resumen simulado\n" + "\n".join(cuerpo)
+
+    @staticmethod
+    def _uso(prompt: str, respuesta: str) -> SimpleNamespace:
+        return SimpleNamespace(prompt_tokens=len(prompt.split()), completion_tokens=len(respuesta.split()))
+
+    def _crear(self, model: str, messages: list[dict], stream: bool = False, **_):
+        prompt = "\n".join(m.get("content", "") for m in messages)
+        respuesta = self.responder(prompt)
+        uso = self._uso(prompt, respuesta)
+        time.sleep(self.latencia)
+        if stream:
+            return self._stream(respuesta, uso)
+        mensaje = SimpleNamespace(content=respuesta)
+        return SimpleNamespace(choices=[SimpleNamespace(message=mensaje)], usage=uso)
+
+    def _stream(self, respuesta: str, uso) -> Iterator[SimpleNamespace]:
+        for palabra in re.findall(r"\S+\s*", respuesta):
+            time.sleep(self.latencia_token)
+            delta = SimpleNamespace(content=palabra)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=None)
+        yield SimpleNamespace(choices=[], usage=uso)
+
+    def invoke(self, prompt: str) -> SimpleNamespace:
+        """Interfaz de LangChain usada por los agentes."""
+        respuesta = self.responder(str(prompt))
+        time.sleep(self.latencia)
+        uso = self._uso(str(prompt), respuesta)
+        return SimpleNamespace(
+            content=respuesta,
+            usage_metadata={"input_tokens": uso.prompt_tokens, "output_tokens": uso.completion_tokens},
+        )
+
+
+@lru_cache(maxsize=1)
+def chat_simulado() -> ChatSimulado:
+    """Modelo simulado compartido por el proceso (lee la latencia al crearse)."""
+    return ChatSimulado()
+
+
+def obtener_embeddings_base(modelo: str) -> Embeddings:
+    """Modelo de embeddings sin caché del backend activo."""
+    if es_local():
+        return EmbeddingsHash()
+    return clientes.modelo_embeddings(modelo)
+
+
+def obtener_cliente_chat():
+    """Cliente con la interfaz `chat.completions.create` del backend activo."""
+    if es_local():
+        return chat_simulado()
+    return clientes.cliente_openai()
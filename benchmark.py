@@ -0,0 +1,351 @@
+"""
+benchmark.py
+
+Banco de pruebas sin conexión del pipeline completo.
+----------------------------------------------------
+• Genera corpus sintéticos en el formato segmentado de `data/`
+  (`---CONTRATO---` … `---FIN---`) de 10^3 a 10^6 segmentos.
+• Usa los backends locales (`ALIE_BACKEND=local`): embeddings por hashing y
+  chat simulado con latencia configurable; no necesita `OPENAI_API_KEY`.
+• Mide rendimiento y latencia de carga, división, embeddings, indexación,
+  recuperación e informe (texto y PDF). Los tiempos por etapa salen de los
+  tramos de `trazas.py`, los mismos que se ven en producción.
+• Cada tamaño se ejecuta en un directorio temporal propio: el índice y las
+  cachés reales no se tocan.
+• Guarda los resultados en JSON y, con `--comparar`, muestra la variación
+  respecto de una ejecución anterior.
+• Con `--recall` evalúa la cuantización int8 de `IndiceNumpy` sobre el mismo
+  corpus: recall@k frente a la búsqueda float32 exacta, latencia y tamaño de
+  la matriz recorrida para cada factor de reordenación (`--reordenar`).
+
+Uso:
+    python benchmark.py --segmentos 1000 10000 --consultas 50 --informes 10 --salida bench.json
+    python benchmark.py --segmentos 1000 10000 --comparar bench.json
+    python benchmark.py --segmentos 10000 100000 --recall --reordenar 1 2 4 8
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+os.environ["ALIE_BACKEND"] = "local"
+
+from chromadb.api.client import SharedSystemClient  # noqa: E402
+
+from agents.cache_llm import obtener_cache_llm  # noqa: E402
+from agents.pdf_informe import renderizar_pdf_bytes  # noqa: E402
+from graph.flujo import recuperar_para, redactar_informe_stream  # noqa: E402
+from rag.indice_numpy import IndiceNumpy  # noqa: E402
+from rag.periodos import filtro_periodo  # noqa: E402
+from rag.recuperador import id_fragmento  # noqa: E402
+from rag.vectorstore import (  # noqa: E402
+    COLECCIONES,
+    NUMPY_PATH,
+    abrir_vectorstores,
+    actualizar_indice,
+    obtener_embeddings,
+)
+from trazas import configurar_logging, reiniciar_tramos, resumen_tramos  # noqa: E402
+
+SEGMENTOS_POR_ARCHIVO = 1_000
+ANIOS = list(range(2020, 2026))
+EMPRESAS = [f"Empresa {letra} S.A." for letra in "ABCDEFGHIJKLMNOPQRST"]
+TEMAS = ["Protección de datos", "Derecho laboral", "Gobierno corporativo", "Contratación pública",
+         "Propiedad intelectual", "Obligaciones tributarias", "Competencia", "Responsabilidad civil"]
+# Reparto de los segmentos entre tipos de documento
+PROPORCIONES = {"contrato": 0.4, "jurisprudencia": 0.2, "legislacion": 0.2, "libro_contables": 0.2}
+
+
+def _segmento(tipo: str, rng: random.Random, i: int) -> str:
+    anio, empresa, tema = rng.choice(ANIOS), rng.choice(EMPRESAS), rng.choice(TEMAS)
+    if tipo == "contrato":
+        return (
+            f"---CONTRATO---\nAño: {anio}\nMes: {rng.randint(1, 12):02d}\nEmpresa: {empresa}\n"
+            f"Tipo: {tema}\nMonto_CRC: {rng.randint(1, 500) * 100_000}\n[Cláusulas]\n"
+            f"Duración: {rng.randint(1, 36)} meses\nPago: 50% inicial, 50% contra entrega\n"
+            f"Confidencialidad: {rng.randint(1, 10)} años\n"
+            f"Resumen: Contrato {i} de {tema.lower()} entre {empresa} y Cacti S.A.\n---FIN---\n"
+        )
+    if tipo == "jurisprudencia":
+        return (
+            f"---JURISPRUDENCIA---\nAño: {anio}\nTribunal: Sala {rng.choice(['Primera', 'Segunda', 'Tercera'])}\n"
+            f"Resolución: {i:05d}-{anio}\nTema: {tema}\nJurisprudencia_Aplicada: Código de Comercio, Art. {rng.randint(1, 900)}\n"
+            f"Resumen: El tribunal resuelve un caso de {tema.lower()} que afecta a sociedades como {empresa}.\n---FIN---\n"
+        )
+    if tipo == "legislacion":
+        return (
+            f"---LEGISLACION---\nAño: {anio}\nLey: Ley de {tema} {i}\nArtículo: {rng.randint(1, 200)}\n"
+            f"Tema: {tema}\nNorma_Aplicada: Ley General de Sociedades\n"
+            f"Resumen: Las sociedades anónimas deberán cumplir nuevas obligaciones de {tema.lower()}.\n---FIN---\n"
+        )
+    return (
+        f"---LIBRO_CONTABLE---\nAño: {anio}\nMes: {rng.randint(1, 12):02d}\nEmpresa: {empresa}\n"
+        f"Tipo: {rng.choice(['Ingreso', 'Gasto'])}\nMonto_CRC: {rng.randint(1, 1000) * 10_000}\n"
+        f"Resumen: Asiento {i} de {tema.lower()}.\n---FIN---\n"
+    )
+
+
+def generar_corpus(destino: Path, segmentos: int, semilla: int = 0) -> dict[str, int]:
+    """Escribe `segmentos` segmentos sintéticos en `destino/<tipo>/*.txt` y devuelve el reparto."""
+    rng = random.Random(semilla)
+    reparto = {tipo: int(segmentos * p) for tipo, p in PROPORCIONES.items()}
+    reparto["contrato"] += segmentos - sum(reparto.values())
+    for tipo, cantidad in reparto.items():
+        carpeta = destino / tipo
+        carpeta.mkdir(parents=True, exist_ok=True)
+        for inicio in range(0, cantidad, SEGMENTOS_POR_ARCHIVO):
+            fin = min(inicio + SEGMENTOS_POR_ARCHIVO, cantidad)
+            texto = "".join(_segmento(tipo, rng, i) for i in range(inicio, fin))
+            (carpeta / f"{tipo}_{inicio // SEGMENTOS_POR_ARCHIVO:05d}.txt").write_text(texto, encoding="utf-8")
+    return reparto
+
+
+def _latencias(valores: list[float]) -> dict[str, float]:
+    if not valores:
+        return {}
+    ordenados = sorted(valores)
+    return {
+        "n": len(valores),
+        "media_ms": statistics.fmean(valores) * 1000,
+        "p50_ms": ordenados[len(ordenados) // 2] * 1000,
+        "p95_ms": ordenados[min(len(ordenados) - 1, int(len(ordenados) * 0.95))] * 1000,
+    }
+
+
+def _tramo(resumen: dict, nombre: str, unidades: float | None = None) -> dict[str, float]:
+    datos = resumen.get(nombre)
+    if not datos:
+        return {}
+    resultado = {"segundos": datos["segundos"], "llamadas": datos["cuenta"]}
+    if unidades:
+        resultado["por_segundo"] = unidades / datos["segundos"] if datos["segundos"] else 0.0
+    return resultado
+
+
+def medir(segmentos: int, consultas: int, informes: int, semilla: int = 0) -> dict:
+    """Genera un corpus en el directorio actual y mide cada etapa."""
+    reparto = generar_corpus(Path("data"), segmentos, semilla)
+    rng = random.Random(semilla)
+    reiniciar_tramos()
+    # La caché de respuestas se abre en el directorio de cada tamaño
+    obtener_cache_llm.cache_clear()
+
+    embeddings = obtener_embeddings()
+    inicio = time.perf_counter()
+    cambios = actualizar_indice(embeddings)
+    total_indice = time.perf_counter() - inicio
+    fragmentos = sum(c["agregados"] for c in cambios.values())
+    indice = resumen_tramos()
+
+    vectorstores = abrir_vectorstores(embeddings)
+    latencias_recuperacion = []
+    for _ in range(consultas):
+        anio = rng.choice(ANIOS)
+        inicio = time.perf_counter()
+        recuperar_para(vectorstores, rng.choice(EMPRESAS), [anio, anio + 1] if anio < ANIOS[-1] else [anio])
+        latencias_recuperacion.append(time.perf_counter() - inicio)
+
+    primera_parte, informe_completo, pdf = [], [], []
+    for _ in range(informes):
+        anios = sorted(rng.sample(ANIOS, 2))
+        contexto = recuperar_para(vectorstores, rng.choice(EMPRESAS), list(range(anios[0], anios[1] + 1)))
+        secciones = {}
+        inicio = time.perf_counter()
+        for n, _parte in enumerate(redactar_informe_stream(contexto, list(range(anios[0], anios[1] + 1)), secciones)):
+            if n == 0:
+                primera_parte.append(time.perf_counter() - inicio)
+        informe_completo.append(time.perf_counter() - inicio)
+        inicio = time.perf_counter()
+        renderizar_pdf_bytes(secciones)
+        pdf.append(time.perf_counter() - inicio)
+
+    return {
+        "segmentos": segmentos,
+        "reparto": reparto,
+        "fragmentos": fragmentos,
+        "etapas": {
+            "cargar": _tramo(indice, "cargar", segmentos),
+            "dividir": _tramo(indice, "dividir", segmentos),
+            "embed": _tramo(indice, "embed", fragmentos),
+            "indexar": _tramo(indice, "indexar", fragmentos),
+            "indice_total": {"segundos": total_indice, "por_segundo": segmentos / total_indice if total_indice else 0.0},
+            "recuperacion": _latencias(latencias_recuperacion),
+            "informe_primera_parte": _latencias(primera_parte),
+            "informe_completo": _latencias(informe_completo),
+            "pdf": _latencias(pdf),
+        },
+    }
+
+
+def medir_cuantizacion(segmentos: int, consultas: int, factores: list[int], k: int = 10, semilla: int = 0) -> dict:
+    """
+    Genera un corpus en el directorio actual, lo indexa con `IndiceNumpy` y
+    compara la búsqueda int8 (con cada factor de reordenación) con la float32.
+    """
+    reparto = generar_corpus(Path("data"), segmentos, semilla)
+    rng = random.Random(semilla)
+    embeddings = obtener_embeddings()
+    actualizar_indice(embeddings)
+
+    exactos = {c: IndiceNumpy(f"{NUMPY_PATH}/{c}") for c in COLECCIONES}
+    exactos = {c: indice for c, indice in exactos.items() if indice.count()}
+    textos = [f"{rng.choice(TEMAS)} {rng.choice(EMPRESAS)}" for _ in range(consultas)]
+    vectores = embeddings.embed_documents(textos)
+    # La mitad de las búsquedas llevan el filtro por periodo del flujo
+    filtros = []
+    for _ in range(consultas):
+        anio = rng.choice(ANIOS)
+        filtros.append(filtro_periodo(anio, min(anio + 1, ANIOS[-1])) if rng.random() < 0.5 else None)
+
+    def buscar(indices: dict[str, IndiceNumpy]) -> tuple[list[list[str]], list[float]]:
+        resultados, latencias = [], []
+        for vector, filtro in zip(vectores, filtros):
+            for indice in indices.values():
+                inicio = time.perf_counter()
+                docs = indice.similarity_search_by_vector(vector, k=k, filter=filtro)
+                latencias.append(time.perf_counter() - inicio)
+                resultados.append([id_fragmento(d) for d in docs])
+        return resultados, latencias
+
+    # Búsquedas en el mismo orden que `buscar`: (vector, índice exacto)
+    pares = [(vector, indice) for vector in vectores for indice in exactos.values()]
+    referencia, latencias = buscar(exactos)
+    # Con empates en la similitud, cualquier fragmento tan cercano como el
+    # k-ésimo exacto es un acierto
+    umbrales = [
+        indice.similitudes(vector, ids).min() - 1e-6 if ids else float("inf")
+        for (vector, indice), ids in zip(pares, referencia)
+    ]
+    filas = sum(indice.count() for indice in exactos.values())
+    dimension = next(iter(exactos.values())).dimension if exactos else 0
+    variantes = {"float32": {"recall": 1.0, "bytes": filas * dimension * 4, **_latencias(latencias)}}
+    for factor in factores:
+        cuantizados = {c: IndiceNumpy(f"{NUMPY_PATH}/{c}", cuantizacion="int8", reordenar=factor) for c in exactos}
+        obtenidos, latencias = buscar(cuantizados)
+        aciertos = sum(
+            int((indice.similitudes(vector, ids) >= umbral).sum())
+            for (vector, indice), ids, umbral in zip(pares, obtenidos, umbrales)
+            if ids
+        )
+        variantes[f"int8_x{factor}"] = {
+            "recall": aciertos / (sum(map(len, referencia)) or 1),
+            # Matriz int8 más una escala por fila; la float32 solo se lee para los candidatos
+            "bytes": filas * (dimension + 4),
+            **_latencias(latencias),
+        }
+    return {
+        "segmentos": segmentos,
+        "reparto": reparto,
+        "fragmentos": filas,
+        "dimension": dimension,
+        "k": k,
+        "variantes": variantes,
+    }
+
+
+def _imprimir_cuantizacion(resultado: dict) -> None:
+    print(f"\n{resultado['segmentos']} segmentos -> {resultado['fragmentos']} vectores de {resultado['dimension']} dim., recall@{resultado['k']}")
+    base = resultado["variantes"]["float32"]["bytes"] or 1
+    for nombre, datos in resultado["variantes"].items():
+        print(
+            f"  {nombre:<10} recall={datos['recall']:.4f}  tamaño={datos['bytes'] / 2**20:8.1f} MiB"
+            f" ({base / (datos['bytes'] or 1):.2f}x)  p50_ms={datos.get('p50_ms', 0.0):.2f}  p95_ms={datos.get('p95_ms', 0.0):.2f}"
+        )
+
+
+def _comparar(actual: list[dict], anterior: list[dict]) -> None:
+    """Imprime la variación de cada métrica respecto de una ejecución anterior."""
+    previos = {r["segmentos"]: r for r in anterior}
+    for resultado in actual:
+        previo = previos.get(resultado["segmentos"])
+        if previo is None:
+            continue
+        print(f"\nVariación con {resultado['segmentos']} segmentos (positivo = mejor):")
+        for etapa, metricas in resultado["etapas"].items():
+            antes = previo["etapas"].get(etapa, {})
+            for clave in ("por_segundo", "p50_ms", "p95_ms"):
+                if clave in metricas and antes.get(clave):
+                    cambio = (metricas[clave] - antes[clave]) / antes[clave] * 100
+                    if clave != "por_segundo":
+                        cambio = -cambio
+                    print(f"  {etapa:<22} {clave:<12} {antes[clave]:>12.2f} -> {metricas[clave]:>12.2f}  ({cambio:+.1f}%)")
+
+
+def _imprimir(resultado: dict) -> None:
+    print(f"\n{resultado['segmentos']} segmentos -> {resultado['fragmentos']} fragmentos")
+    for etapa, metricas in resultado["etapas"].items():
+        detalle = "  ".join(f"{k}={v:.2f}" if isinstance(v, float) else f"{k}={v}" for k, v in metricas.items())
+        print(f"  {etapa:<22} {detalle}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Banco de pruebas sin conexión del asistente legal.")
+    parser.add_argument("--segmentos", type=int, nargs="+", default=[1_000, 10_000])
+    parser.add_argument("--consultas", type=int, default=50, help="Recuperaciones medidas por tamaño.")
+    parser.add_argument("--informes", type=int, default=5, help="Informes completos medidos por tamaño.")
+    parser.add_argument("--indice", choices=["chroma", "numpy"], default=os.getenv("ALIE_INDICE", "chroma"),
+                        help="Almacén vectorial (ver ALIE_INDICE en rag/vectorstore.py).")
+    parser.add_argument("--latencia-llm", type=float, default=0.0, help="Latencia simulada por llamada al LLM (s).")
+    parser.add_argument("--latencia-token", type=float, default=0.0, help="Latencia simulada por token en streaming (s).")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--salida", help="Archivo JSON donde guardar los resultados.")
+    parser.add_argument("--comparar", help="Resultados JSON de una ejecución anterior.")
+    parser.add_argument("--conservar", action="store_true", help="No borrar los directorios temporales.")
+    parser.add_argument("--recall", action="store_true",
+                        help="Evalúa recall, tamaño y latencia de la cuantización int8 (índice NumPy).")
+    parser.add_argument("--reordenar", type=int, nargs="+", default=[1, 2, 4, 8],
+                        help="Factores de reordenación float32 evaluados con --recall (candidatos = k * factor).")
+    args = parser.parse_args()
+
+    if args.recall:
+        args.indice = "numpy"
+    os.environ["ALIE_INDICE"] = args.indice
+    os.environ["ALIE_LATENCIA_LLM"] = str(args.latencia_llm)
+    os.environ["ALIE_LATENCIA_TOKEN"] = str(args.latencia_token)
+    configurar_logging()
+
+    resultados = []
+    origen = os.getcwd()
+    for segmentos in args.segmentos:
+        directorio = tempfile.mkdtemp(prefix=f"alie_bench_{segmentos}_")
+        # Todas las rutas del proyecto son relativas: el corpus, el índice y
+        # las cachés quedan dentro del directorio temporal
+        os.chdir(directorio)
+        try:
+            if args.recall:
+                resultado = medir_cuantizacion(segmentos, args.consultas, args.reordenar, semilla=args.semilla)
+            else:
+                resultado = medir(segmentos, args.consultas, args.informes, args.semilla)
+        finally:
+            os.chdir(origen)
+            # Chroma reutiliza los clientes por ruta (relativa): el siguiente
+            # tamaño debe abrir los suyos
+            SharedSystemClient.clear_system_cache()
+            if not args.conservar:
+                shutil.rmtree(directorio, ignore_errors=True)
+        (_imprimir_cuantizacion if args.recall else _imprimir)(resultado)
+        resultados.append(resultado)
+
+    salida = {
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "parametros": vars(args),
+        "resultados": resultados,
+    }
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(salida, f, ensure_ascii=False, indent=1)
+    if args.comparar and not args.recall:
+        with open(args.comparar, encoding="utf-8") as f:
+            _comparar(resultados, json.load(f)["resultados"])
+
+
+if __name__ == "__main__":
+    main()
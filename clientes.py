@@ -0,0 +1,142 @@
+"""
+clientes.py
+
+Registro de clientes de la API de OpenAI, compartidos por todo el proceso.
+--------------------------------------------------------------------------
+• Un único pool HTTP con keep-alive (`httpx`) para el chat y los embeddings:
+  las llamadas reutilizan conexiones abiertas en lugar de repetir la conexión
+  y el saludo TLS en cada informe.
+• Variantes síncrona (`cliente_openai`, `modelo_chat`, `modelo_embeddings`) y
+  asíncrona (`cliente_openai_async`, una por bucle de eventos).
+• Configuración por variables de entorno:
+    - `OPENAI_BASE_URL`: endpoint alternativo (p. ej. un servidor local
+      compatible con la API para pruebas).
+    - `ALIE_MAX_CONEXIONES`: conexiones simultáneas del pool (límite de
+      concurrencia HTTP del proceso).
+    - `ALIE_TIMEOUT_LLM` y `ALIE_MAX_REINTENTOS`: tiempo máximo por petición y
+      reintentos del SDK (errores de conexión, 429 y 5xx).
+• `backends` y `agents_utils` obtienen aquí sus clientes; el modo local
+  (`ALIE_BACKEND=local`) no abre ninguna conexión.
+"""
+
+import asyncio
+import os
+import weakref
+from functools import lru_cache
+
+import httpx
+
+MAX_CONEXIONES = 20
+# Segundos que una conexión inactiva permanece abierta en el pool
+KEEPALIVE_SEGUNDOS = 30.0
+TIMEOUT_LLM = 60.0
+TIMEOUT_CONEXION = 10.0
+MAX_REINTENTOS = 2
+
+_clientes_async: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, object]" = weakref.WeakKeyDictionary()
+
+
+def endpoint() -> str | None:
+    """URL base de la API (None = la de OpenAI)."""
+    return os.getenv("OPENAI_BASE_URL") or None
+
+
+def _api_key() -> str | None:
+    return os.getenv("OPENAI_API_KEY")
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(float(os.getenv("ALIE_TIMEOUT_LLM", TIMEOUT_LLM)), connect=TIMEOUT_CONEXION)
+
+
+def _limites() -> httpx.Limits:
+    maximo = int(os.getenv("ALIE_MAX_CONEXIONES", MAX_CONEXIONES))
+    return httpx.Limits(max_connections=maximo, max_keepalive_connections=maximo, keepalive_expiry=KEEPALIVE_SEGUNDOS)
+
+
+def _reintentos() -> int:
+    return int(os.getenv("ALIE_MAX_REINTENTOS", MAX_REINTENTOS))
+
+
+@lru_cache(maxsize=1)
+def http_sincrono() -> httpx.Client:
+    """Pool HTTP síncrono del proceso, compartido por chat y embeddings."""
+    return httpx.Client(limits=_limites(), timeout=_timeout())
+
+
+@lru_cache(maxsize=1)
+def cliente_openai():
+    """Cliente síncrono del SDK de OpenAI (`chat.completions`, `embeddings`)."""
+    from openai import OpenAI
+
+    return OpenAI(
+        api_key=_api_key(),
+        base_url=endpoint(),
+        http_client=http_sincrono(),
+        max_retries=_reintentos(),
+        timeout=_timeout(),
+    )
+
+
+def cliente_openai_async():
+    """
+    Cliente asíncrono del SDK de OpenAI para el bucle de eventos actual. Las
+    conexiones de un pool asíncrono pertenecen a su bucle, así que se crea uno
+    por bucle y se libera con él.
+    """
+    from openai import AsyncOpenAI
+
+    bucle = asyncio.get_running_loop()
+    cliente = _clientes_async.get(bucle)
+    if cliente is None:
+        cliente = AsyncOpenAI(
+            api_key=_api_key(),
+            base_url=endpoint(),
+            http_client=httpx.AsyncClient(limits=_limites(), timeout=_timeout()),
+            max_retries=_reintentos(),
+            timeout=_timeout(),
+        )
+        _clientes_async[bucle] = cliente
+    return cliente
+
+
+@lru_cache(maxsize=8)
+def modelo_chat(modelo: str, temperatura: float = 0.0):
+    """Modelo de chat de LangChain sobre el pool compartido, uno por configuración."""
+    from langchain_openai import ChatOpenAI
+
+    return ChatOpenAI(
+        model=modelo,
+        temperature=temperatura,
+        api_key=_api_key(),
+        base_url=endpoint(),
+        timeout=_timeout(),
+        max_retries=_reintentos(),
+        http_client=http_sincrono(),
+    )
+
+
+@lru_cache(maxsize=4)
+def modelo_embeddings(modelo: str):
+    """Embeddings de LangChain sobre el pool compartido, uno por modelo."""
+    from langchain_openai import OpenAIEmbeddings
+
+    api_key = _api_key()
+    if not api_key:
+        raise ValueError("La API key de OpenAI no está configurada en las variables de entorno.")
+    return OpenAIEmbeddings(
+        model=modelo,
+        api_key=api_key,
+        base_url=endpoint(),
+        timeout=_timeout(),
+        max_retries=_reintentos(),
+        http_client=http_sincrono(),
+    )
+
+
+def cerrar() -> None:
+    """Cierra el pool síncrono (al terminar el proceso o en pruebas)."""
+    if http_sincrono.cache_info().currsize:
+        http_sincrono().close()
+    for funcion in (http_sincrono, cliente_openai, modelo_chat, modelo_embeddings):
+        funcion.cache_clear()
@@ -1,36 +1,206 @@
 # graph/flujo.py
 
+import logging
 import re
-from rag.vectorstore import construir_vectorstore
-from agents.redactor_legal import redactar_respuesta_legal, generar_pdf
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from time import monotonic
+from typing import Callable, Iterator
 
-def ejecutar_flujo_legal(pregunta: str, empresa: str, periodo: str) -> str:
+from rag.contexto import deduplicar, empaquetar
+from rag.periodos import filtro_periodo
+from rag.recuperador import recuperar_contexto
+from rag.vectorstore import abrir_analitica, abrir_vectorstores
+from agents.jurisprudente import responder_jurisprudencia
+from agents.legislador import responder_legislacion
+from agents.pdf_informe import SeccionesInforme, renderizar_pdf_en_segundo_plano
+from agents.redactor_legal import redactar_respuesta_legal_stream
+from trazas import en_contexto, tramo
+
+log = logging.getLogger(__name__)
+
+# Tiempo máximo de espera por agente especializado (segundos)
+TIMEOUT_AGENTE = 90
+# Tipos de documento con Monto_CRC -> título de sus cifras en el informe
+TIPOS_CON_MONTO = {"contrato": "Contratos", "libro_contables": "Libros contables"}
+
+
+def _como_bloques(docs, marcador: str) -> str:
     """
-    Ejecuta el flujo legal completo: filtra años, recupera documentos, redacta el resumen legal y genera un PDF.
+    Reconstruye el formato segmentado que esperan los prompts de los agentes:
+    un bloque por registro (fragmentos solapados fundidos), en orden de
+    ranking y hasta el presupuesto de tokens del prompt.
     """
+    bloques = [f"---{marcador}---\n{d.page_content}\n---FIN---" for d in deduplicar(docs)]
+    return "\n".join(empaquetar({marcador: bloques})[marcador])
 
-    anios = sorted(set(int(a) for a in re.findall(r"\d{4}", periodo)))
-    if not anios:
-        return "No se detectaron años válidos en el periodo proporcionado."
-
-    # Construir el vectorstore filtrando solo por los años relevantes
-    vs = construir_vectorstore(anios_filtrados=anios)
-
-    # Recuperar documentos clave usando el vectorstore correcto por tipo
-    contexto = {
-        "contrato": [d.page_content for d in vs["contrato"].similarity_search(f"contratos firmados {empresa}", k=20)] if "contrato" in vs else [],
-        "jurisprudencia": [d.page_content for d in vs["jurisprudencia"].similarity_search(f"jurisprudencia aplicable {empresa}", k=20)] if "jurisprudencia" in vs else [],
-        "finanzas": [d.page_content for d in vs["finanzas"].similarity_search(f"libros contables de {empresa}", k=20)] if "finanzas" in vs else [],
-        "estatutos": [d.page_content for d in vs["estatutos"].similarity_search(f"estatutos de {empresa}", k=5)] if "estatutos" in vs else [],
-        "legislacion": [d.page_content for d in vs["legislacion"].similarity_search(f"legislación relevante {empresa}", k=10)] if "legislacion" in vs else []
+
+def anios_de_periodo(periodo: str) -> list[int]:
+    """Años del periodo; un rango "2020-2022" incluye también los años intermedios."""
+    encontrados = sorted(set(int(a) for a in re.findall(r"\d{4}", periodo)))
+    if not encontrados:
+        return []
+    return list(range(encontrados[0], encontrados[-1] + 1))
+
+
+def consultas_para(empresa: str) -> dict[str, tuple[str, int]]:
+    """
+    Consulta y número de resultados (k) por colección para una empresa. La
+    búsqueda híbrida (vectorial + BM25 + referencias exactas) permite un k
+    menor con la misma cobertura, y con él menos contexto para GPT-4o.
+    """
+    return {
+        "contrato": (f"contratos firmados {empresa}", 10),
+        "jurisprudencia": (f"jurisprudencia aplicable {empresa}", 10),
+        "finanzas": (f"libros contables de {empresa}", 10),
+        "estatutos": (f"estatutos de {empresa}", 5),
+        "legislacion": (f"legislación relevante {empresa}", 6),
+    }
+
+
+def recuperar_para(vectorstores: dict, empresa: str, anios: list[int], pregunta: str = "") -> dict:
+    """
+    Recupera el contexto de una empresa y periodo. Una sola colección por tipo
+    con todos los años: el periodo se resuelve como filtro de metadatos en
+    Chroma, sin reconstruir índices por periodo; el filtro es un rango de años
+    (`rag.periodos.filtro_periodo`), no una lista. La pregunta se suma a la
+    consulta léxica (leyes, artículos, resoluciones o contrapartes citadas).
+    """
+    with tramo("recuperar", empresa=empresa, anios=len(anios)) as medida:
+        contexto = recuperar_contexto(vectorstores, consultas_para(empresa), filtro_periodo(anios[0], anios[-1]), pregunta)
+        medida["documentos"] = sum(len(docs) for docs in contexto.values())
+    return contexto
+
+
+def cifras_del_periodo(anios: list[int]) -> dict[str, dict]:
+    """
+    Agregados exactos de Monto_CRC del periodo sobre todos los registros (no
+    solo los recuperados), por tipo de documento con montos. Sin LLM.
+    """
+    with tramo("analitica", anios=len(anios)) as medida:
+        tabla = abrir_analitica()
+        cifras = {titulo: tabla.resumir(anios[0], anios[-1], tipo) for tipo, titulo in TIPOS_CON_MONTO.items()}
+        cifras = {titulo: resumen for titulo, resumen in cifras.items() if resumen["registros"]}
+        medida["registros"] = sum(resumen["registros"] for resumen in cifras.values())
+    return cifras
+
+
+def lanzar_agentes(
+    contexto: dict, anios: list[int], timeout: float | None = TIMEOUT_AGENTE
+) -> Callable[[], dict[str, str]]:
+    """
+    Lanza en paralelo los agentes legislador y jurisprudente, de modo que el
+    tiempo total de LLM sea el del agente más lento, y devuelve una función que
+    espera sus resultados. Un agente que supera `timeout` segundos se descarta
+    sin bloquear el resto del flujo (None espera sin límite).
+    """
+    periodo = f"{anios[0]}-{anios[-1]}" if len(anios) > 1 else str(anios[0])
+    tareas = {
+        "legislacion": (responder_legislacion, _como_bloques(contexto.get("legislacion", []), "LEGISLACION"), anios),
+        "jurisprudencia": (responder_jurisprudencia, _como_bloques(contexto.get("jurisprudencia", []), "JURISPRUDENCIA"), periodo),
     }
 
-    total_docs = sum(len(v) for v in contexto.values())
+    pool = ThreadPoolExecutor(max_workers=len(tareas))
+    futuros = {nombre: pool.submit(en_contexto(funcion), *args) for nombre, (funcion, *args) in tareas.items()}
+    limite = monotonic() + timeout if timeout is not None else None
+
+    def esperar() -> dict[str, str]:
+        resultados = {}
+        for nombre, futuro in futuros.items():
+            try:
+                restante = max(0.0, limite - monotonic()) if limite is not None else None
+                resultados[nombre] = futuro.result(timeout=restante)
+            except TimeoutError:
+                resultados[nombre] = "El análisis no se completó a tiempo."
+        # No esperar a los agentes que agotaron el tiempo
+        pool.shutdown(wait=False, cancel_futures=True)
+        return resultados
+
+    return esperar
+
+
+def ejecutar_agentes(contexto: dict, anios: list[int]) -> dict[str, str]:
+    """Ejecuta los agentes en paralelo y espera sus resultados."""
+    return lanzar_agentes(contexto, anios)()
+
+
+def redactar_informe_stream(
+    contexto: dict,
+    anios: list[int],
+    secciones: SeccionesInforme | None = None,
+    timeout_agentes: float | None = TIMEOUT_AGENTE,
+) -> Iterator[str]:
+    """
+    A partir del contexto ya recuperado, lanza los agentes y entrega el informe
+    del redactor por partes, rellenando `secciones` para el PDF.
+    """
+    # Agentes especializados en paralelo; el redactor emite las secciones
+    # deterministas mientras tanto y espera sus análisis para integrarlos
+    esperar_agentes = lanzar_agentes(contexto, anios, timeout_agentes)
 
     # Redactar respuesta legal
-    resumen = redactar_respuesta_legal(contexto, anio_inicio=anios[0], anio_fin=anios[-1])
+    yield from redactar_respuesta_legal_stream(
+        contexto,
+        anio_inicio=anios[0],
+        anio_fin=anios[-1],
+        analisis_agentes=esperar_agentes,
+        secciones=secciones,
+        cifras=cifras_del_periodo(anios),
+    )
+
+
+def ejecutar_flujo_legal(
+    pregunta: str,
+    empresa: str,
+    periodo: str,
+    vectorstores: dict | None = None,
+    nombre_pdf: str | None = "respuesta_legal.pdf",
+) -> str:
+    """
+    Ejecuta el flujo legal completo: filtra años, recupera documentos, redacta el resumen legal y genera un PDF.
+
+    Si se reciben `vectorstores` ya abiertos (modo servicio) se reutilizan; si no,
+    se abren en modo lectura las colecciones ya indexadas. La consulta nunca
+    reindexa: el índice se sincroniza con `python main.py --indexar`, con
+    `/precalentar`, con `--vigilar` o al preparar un lote.
+    """
+    return "".join(ejecutar_flujo_legal_stream(pregunta, empresa, periodo, vectorstores, nombre_pdf))
+
+
+def ejecutar_flujo_legal_stream(
+    pregunta: str,
+    empresa: str,
+    periodo: str,
+    vectorstores: dict | None = None,
+    nombre_pdf: str | None = "respuesta_legal.pdf",
+    secciones: SeccionesInforme | None = None,
+) -> Iterator[str]:
+    """
+    Igual que `ejecutar_flujo_legal`, pero entrega el informe por partes en
+    cuanto están disponibles: las secciones deterministas primero y las
+    observaciones de GPT-4o token a token.
+
+    Al terminar, el PDF se encarga a un proceso en segundo plano (sin
+    `nombre_pdf` no se escribe ninguno). `secciones` recibe el contenido
+    estructurado del informe, p. ej. para generar el PDF en memoria.
+    """
+
+    anios = anios_de_periodo(periodo)
+    if not anios:
+        yield "No se detectaron años válidos en el periodo proporcionado."
+        return
+
+    # Abrir las colecciones persistidas sin escribir en ellas
+    vs = vectorstores if vectorstores is not None else abrir_vectorstores()
+    if not vs:
+        log.warning("No hay colecciones indexadas: ejecute 'python main.py --indexar' para indexar data/.")
+
+    # Recuperar documentos clave usando el vectorstore correcto por tipo:
+    # una sola petición de embeddings y búsquedas concurrentes por colección
+    contexto = recuperar_para(vs, empresa, anios, pregunta)
 
-    # Generar PDF
-    generar_pdf(resumen)
+    secciones = {} if secciones is None else secciones
+    yield from redactar_informe_stream(contexto, anios, secciones)
 
-    return resumen
\ No newline at end of file
+    # La respuesta de texto no espera a ReportLab
+    if nombre_pdf:
+        renderizar_pdf_en_segundo_plano(secciones, nombre_pdf)
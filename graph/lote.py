@@ -0,0 +1,181 @@
+"""
+graph/lote.py
+
+Motor de informes por lotes.
+----------------------------
+• Lee un manifiesto de trabajos (JSON) con la empresa y el periodo de cada informe.
+• Sincroniza y abre el índice una sola vez: todos los trabajos comparten las
+  colecciones de Chroma y la caché de embeddings.
+• Deduplica la recuperación: los trabajos con la misma empresa, los mismos
+  años y la misma pregunta (opcional) reutilizan un único contexto, y las consultas de todas las empresas se
+  vectorizan en una sola petición.
+• Ejecuta los trabajos en paralelo con un máximo de llamadas simultáneas al LLM
+  (ver `agents_utils.limitar_concurrencia_llm`).
+• Escribe un PDF con nombre propio por trabajo en el directorio de salida; los
+  PDF se generan en segundo plano mientras avanzan los demás trabajos.
+
+Formato del manifiesto:
+    {
+      "salida": "informes",
+      "trabajos": [
+        {"empresa": "Cacti S.A.", "periodo": "2020-2022"},
+        {"periodo": "2024", "pdf": "cacti_2024.pdf"},
+        {"periodo": "2021", "pregunta": "Resolución 097-2021"}
+      ]
+    }
+La empresa por defecto es Cacti S.A. También se admite directamente la lista
+de trabajos.
+"""
+
+import json
+import logging
+import os
+import re
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic
+
+from agents.pdf_informe import renderizar_pdf_en_segundo_plano
+from agents_utils import limitar_concurrencia_llm
+from graph.flujo import anios_de_periodo, consultas_para, recuperar_para, redactar_informe_stream
+from rag.vectorstore import construir_vectorstore
+from trazas import nueva_traza
+
+log = logging.getLogger(__name__)
+
+DIRECTORIO_SALIDA = "informes"
+MAX_TRABAJOS_SIMULTANEOS = 8
+MAX_LLM_SIMULTANEAS = 4
+EMPRESA_POR_DEFECTO = "Cacti S.A."
+
+
+def cargar_trabajos(ruta: str) -> tuple[list[dict], str | None]:
+    """Lee el manifiesto y devuelve los trabajos y el directorio de salida (si lo indica)."""
+    with open(ruta, "r", encoding="utf-8") as f:
+        datos = json.load(f)
+    if isinstance(datos, list):
+        return datos, None
+    return datos.get("trabajos", []), datos.get("salida")
+
+
+def _slug(texto: str) -> str:
+    texto = unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^a-z0-9]+", "_", texto.lower()).strip("_") or "informe"
+
+
+def _nombres_pdf(trabajos: list[dict], anios_por_trabajo: list[list[int]], salida: str) -> list[str]:
+    """Un nombre de PDF distinto por trabajo: `<empresa>_<periodo>.pdf`, numerado si se repite."""
+    nombres, usados = [], set()
+    for trabajo, anios in zip(trabajos, anios_por_trabajo):
+        base = trabajo.get("pdf")
+        if not base:
+            if not anios:
+                periodo = "sin_periodo"
+            else:
+                periodo = f"{anios[0]}-{anios[-1]}" if len(anios) > 1 else str(anios[0])
+            base = f"{_slug(trabajo['empresa'])}_{periodo}.pdf"
+        raiz, ext = os.path.splitext(base)
+        nombre, n = base, 1
+        while nombre in usados:
+            n += 1
+            nombre = f"{raiz}_{n}{ext or '.pdf'}"
+        usados.add(nombre)
+        nombres.append(os.path.join(salida, nombre))
+    return nombres
+
+
+def ejecutar_lote(
+    trabajos: list[dict],
+    salida: str = DIRECTORIO_SALIDA,
+    vectorstores: dict | None = None,
+    max_trabajos: int = MAX_TRABAJOS_SIMULTANEOS,
+    max_llm: int = MAX_LLM_SIMULTANEAS,
+) -> list[dict]:
+    """
+    Genera un informe por trabajo.
+
+    Args:
+        trabajos: Diccionarios con "periodo" y, opcionalmente, "empresa",
+            "pregunta" y "pdf".
+        salida: Directorio donde se escriben los PDF.
+        vectorstores: Colecciones ya abiertas; si no se indican se sincroniza
+            el índice una vez para todo el lote.
+        max_trabajos: Informes en curso a la vez.
+        max_llm: Llamadas simultáneas al LLM (agentes y redactor).
+
+    Returns:
+        Por trabajo: empresa, periodo, ruta del PDF, estado ("ok" / "error"),
+        error si lo hubo, duración en segundos e identificador de traza.
+    """
+    os.makedirs(salida, exist_ok=True)
+    trabajos = [{**t, "empresa": t.get("empresa") or EMPRESA_POR_DEFECTO} for t in trabajos]
+    anios_por_trabajo = [anios_de_periodo(str(t.get("periodo", ""))) for t in trabajos]
+    pdfs = _nombres_pdf(trabajos, anios_por_trabajo, salida)
+
+    vs = vectorstores if vectorstores is not None else construir_vectorstore()
+
+    # Recuperación deduplicada: una por combinación distinta (empresa, años)
+    claves = {
+        (t["empresa"], tuple(anios), t.get("pregunta", ""))
+        for t, anios in zip(trabajos, anios_por_trabajo)
+        if anios
+    }
+    empresas = sorted({empresa for empresa, _, _ in claves})
+    colecciones = [nombre for nombre in consultas_para("") if nombre in vs]
+    if empresas and colecciones:
+        # Deja en la caché los vectores de todas las consultas con una sola petición
+        vs[colecciones[0]].embeddings.embed_documents(
+            [texto for e in empresas for texto, _ in consultas_para(e).values()]
+        )
+    with ThreadPoolExecutor(max_workers=max(1, min(max_trabajos, len(claves) or 1))) as pool:
+        futuros = {clave: pool.submit(recuperar_para, vs, clave[0], list(clave[1]), clave[2]) for clave in claves}
+        contextos = {clave: futuro.result() for clave, futuro in futuros.items()}
+    log.info("%d trabajos, %d recuperaciones distintas", len(trabajos), len(contextos))
+
+    # PDF encargados en segundo plano, por índice de trabajo
+    pdfs_pendientes = {}
+
+    def ejecutar(indice: int) -> dict:
+        trabajo, anios = trabajos[indice], anios_por_trabajo[indice]
+        resultado = {
+            "empresa": trabajo["empresa"],
+            "periodo": trabajo.get("periodo", ""),
+            "pdf": pdfs[indice],
+        }
+        inicio = monotonic()
+        # Una traza por trabajo para separar sus tramos en la salida JSONL
+        with nueva_traza() as traza:
+            resultado["traza"] = traza
+            try:
+                if not anios:
+                    raise ValueError("No se detectaron años válidos en el periodo proporcionado.")
+                contexto = contextos[(resultado["empresa"], tuple(anios), trabajo.get("pregunta", ""))]
+                secciones = {}
+                # Sin tiempo máximo por agente: en el lote la espera incluye la cola del LLM
+                for _ in redactar_informe_stream(contexto, anios, secciones, timeout_agentes=None):
+                    pass
+                resultado["estado"] = "ok"
+                pdfs_pendientes[indice] = renderizar_pdf_en_segundo_plano(secciones, pdfs[indice])
+            except Exception as e:
+                resultado.update(estado="error", error=str(e))
+        resultado["segundos"] = round(monotonic() - inicio, 2)
+        return resultado
+
+    limitar_concurrencia_llm(max_llm)
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, max_trabajos)) as pool:
+            resultados = list(pool.map(ejecutar, range(len(trabajos))))
+    finally:
+        limitar_concurrencia_llm(None)
+
+    for indice, futuro in pdfs_pendientes.items():
+        try:
+            futuro.result()
+        except Exception as e:
+            resultados[indice].update(estado="error", error=f"PDF: {e}")
+    for resultado in resultados:
+        log.info("%s: %s", resultado["estado"], resultado["pdf"])
+
+    correctos = sum(r["estado"] == "ok" for r in resultados)
+    log.info("%d/%d informes generados en %s", correctos, len(resultados), salida)
+    return resultados
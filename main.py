@@ -1,5 +1,7 @@
-from datetime import datetime
-from graph.flujo import ejecutar_flujo_legal
+import argparse
+
+from graph.flujo import ejecutar_flujo_legal_stream
+from trazas import configurar_logging, configurar_trazas, nueva_traza
 
 def main() -> None:
     print("\nGenerador de resumen legal automatizado para Cacti S.A.")
@@ -9,14 +11,47 @@ def main() -> None:
         return
     try:
         pregunta = "¿Cuál es el resumen legal del periodo indicado?"
-        respuesta = ejecutar_flujo_legal(pregunta=pregunta, empresa="Cacti S.A.", periodo=periodo)
+        respuesta = ""
+        # Mostrar el informe a medida que se genera, sin truncarlo
+        with nueva_traza():
+            for parte in ejecutar_flujo_legal_stream(pregunta=pregunta, empresa="Cacti S.A.", periodo=periodo):
+                if not respuesta:
+                    print("\n Respuesta del asistente:\n")
+                respuesta += parte
+                print(parte, end="", flush=True)
+        print()
         if not respuesta or "No se encontró información" in respuesta:
             print("\n No se generó contenido relevante para el periodo indicado.")
-        else:
-            print("\n Respuesta del asistente:\n")
-            print(respuesta)  # Mostrar todo el contenido sin truncarlo
     except Exception as e:
         print(f"\n Error en la ejecución: {e}")
 
 if __name__ == "__main__":
-    main()      
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Asistente legal automatizado para Cacti S.A.")
+    parser.add_argument("--indexar", action="store_true", help="Sincroniza el índice con data/ y termina.")
+    parser.add_argument("--servidor", action="store_true", help="Inicia el servicio HTTP residente.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8080)
+    parser.add_argument(
+        "--vigilar", type=float, nargs="?", const=5.0, metavar="SEGUNDOS",
+        help="En modo servidor, incorpora los cambios de data/ en segundo plano (cada 5 s por defecto).",
+    )
+    parser.add_argument("--lote", metavar="MANIFIESTO", help="Genera los informes de un manifiesto JSON de trabajos.")
+    parser.add_argument("--salida", help="Directorio de los PDF del lote (por defecto, el del manifiesto o 'informes').")
+    parser.add_argument("--max-llm", type=int, default=4, help="Llamadas simultáneas al LLM en modo lote.")
+    parser.add_argument("--trazas", metavar="ARCHIVO", help="Escribe los tramos medidos como líneas JSON (también ALIE_TRAZAS).")
+    args = parser.parse_args()
+    configurar_logging()
+    if args.trazas:
+        configurar_trazas(args.trazas)
+    if args.indexar:
+        from rag.vectorstore import construir_vectorstore
+        construir_vectorstore()
+    elif args.servidor:
+        from servidor import servir
+        servir(args.host, args.puerto, vigilar=args.vigilar)
+    elif args.lote:
+        from graph.lote import DIRECTORIO_SALIDA, cargar_trabajos, ejecutar_lote
+        trabajos, salida = cargar_trabajos(args.lote)
+        ejecutar_lote(trabajos, salida=args.salida or salida or DIRECTORIO_SALIDA, max_llm=args.max_llm)
+    else:
+        main()
@@ -0,0 +1,192 @@
+"""
+rag/analitica.py
+
+Cifras exactas de `Monto_CRC` sobre todos los registros, sin pasar por el LLM:
+
+• `TablaMontos` guarda en columnas (`array` durante la ingesta, NumPy al
+  consultar) el tipo, la fuente, la contraparte (`empresa`), el año, el mes y
+  el monto de cada registro con `monto_crc` (contratos y libros contables).
+  Se construye en la misma pasada de carga que el índice y se persiste junto
+  a las colecciones (`analitica.npz`).
+• `resumir` calcula para un intervalo de años el total, los totales por año,
+  las sumas por contraparte y la serie mes a mes con `np.bincount`, sin
+  recorrer los registros en Python.
+• Los registros se guardan por archivo de origen: una actualización parcial
+  (`rag/vigilancia.py`) sustituye solo las filas de los archivos que cambiaron.
+"""
+
+import os
+from array import array
+from functools import lru_cache
+from typing import Iterable, Iterator
+
+import numpy as np
+from langchain.schema import Document
+
+# Columnas categóricas: códigos sobre un vocabulario ("" = sin valor)
+CATEGORICAS = ("tipo", "fuente", "empresa")
+SIN_MES = 0
+
+
+def _mes(valor) -> int:
+    try:
+        mes = int(str(valor).strip())
+    except (TypeError, ValueError):
+        return SIN_MES
+    return mes if 1 <= mes <= 12 else SIN_MES
+
+
+class TablaMontos:
+    """Montos por registro en columnas, con las categorías codificadas."""
+
+    def __init__(self):
+        self.vocabularios: dict[str, list[str]] = {campo: [""] for campo in CATEGORICAS}
+        self._codigos_vocabulario: dict[str, dict[str, int]] = {campo: {"": 0} for campo in CATEGORICAS}
+        self._codigos = {campo: array("i") for campo in CATEGORICAS}
+        self._anios = array("i")
+        self._meses = array("b")
+        self._montos = array("q")
+
+    def __len__(self) -> int:
+        return len(self._montos)
+
+    def _codigo(self, campo: str, valor) -> int:
+        valor = valor if isinstance(valor, str) else ""
+        codigos = self._codigos_vocabulario[campo]
+        codigo = codigos.get(valor)
+        if codigo is None:
+            codigo = codigos[valor] = len(self.vocabularios[campo])
+            self.vocabularios[campo].append(valor)
+        return codigo
+
+    def agregar(self, registro: dict) -> bool:
+        """Añade el registro si tiene año y monto enteros; devuelve si se añadió."""
+        monto, anio = registro.get("monto_crc"), registro.get("año")
+        if not (isinstance(monto, int) and isinstance(anio, int)):
+            return False
+        for campo in CATEGORICAS:
+            self._codigos[campo].append(self._codigo(campo, registro.get(campo)))
+        self._anios.append(anio)
+        self._meses.append(_mes(registro.get("mes")))
+        self._montos.append(monto)
+        return True
+
+    def registrar(self, documentos: Iterable[Document]) -> Iterator[Document]:
+        """Añade los registros de `documentos` a medida que pasan (antes de dividirlos)."""
+        for doc in documentos:
+            self.agregar(doc.metadata)
+            yield doc
+
+    def eliminar_fuentes(self, fuentes: Iterable[str]) -> None:
+        """Quita las filas de los archivos indicados."""
+        codigos = [self._codigos_vocabulario["fuente"][f] for f in fuentes if f in self._codigos_vocabulario["fuente"]]
+        if not codigos or not len(self):
+            return
+        conservar = ~np.isin(np.frombuffer(self._codigos["fuente"], dtype=np.int32), codigos)
+        for campo in CATEGORICAS:
+            self._codigos[campo] = array("i", np.frombuffer(self._codigos[campo], dtype=np.int32)[conservar].tobytes())
+        self._anios = array("i", np.frombuffer(self._anios, dtype=np.int32)[conservar].tobytes())
+        self._meses = array("b", np.frombuffer(self._meses, dtype=np.int8)[conservar].tobytes())
+        self._montos = array("q", np.frombuffer(self._montos, dtype=np.int64)[conservar].tobytes())
+
+    # ------------------------------------------------------------------
+    # Persistencia
+    # ------------------------------------------------------------------
+    def guardar(self, ruta: str) -> None:
+        """Escribe la tabla de forma atómica."""
+        os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+        temporal = ruta + ".tmp.npz"
+        columnas = {f"codigos_{campo}": np.frombuffer(self._codigos[campo], dtype=np.int32) for campo in CATEGORICAS}
+        vocabularios = {f"vocabulario_{campo}": np.array(self.vocabularios[campo], dtype=str) for campo in CATEGORICAS}
+        np.savez(
+            temporal,
+            anios=np.frombuffer(self._anios, dtype=np.int32),
+            meses=np.frombuffer(self._meses, dtype=np.int8),
+            montos=np.frombuffer(self._montos, dtype=np.int64),
+            **columnas,
+            **vocabularios,
+        )
+        os.replace(temporal, ruta)
+
+    @classmethod
+    def cargar(cls, ruta: str) -> "TablaMontos":
+        """Lee una tabla guardada; si no existe o está dañada, devuelve una vacía."""
+        tabla = cls()
+        if not os.path.exists(ruta):
+            return tabla
+        try:
+            with np.load(ruta, allow_pickle=False) as datos:
+                for campo in CATEGORICAS:
+                    tabla.vocabularios[campo] = datos[f"vocabulario_{campo}"].tolist()
+                    tabla._codigos[campo] = array("i", datos[f"codigos_{campo}"].astype(np.int32).tobytes())
+                tabla._anios = array("i", datos["anios"].astype(np.int32).tobytes())
+                tabla._meses = array("b", datos["meses"].astype(np.int8).tobytes())
+                tabla._montos = array("q", datos["montos"].astype(np.int64).tobytes())
+        except (OSError, KeyError, ValueError):
+            return cls()
+        tabla._codigos_vocabulario = {
+            campo: {valor: codigo for codigo, valor in enumerate(valores)} for campo, valores in tabla.vocabularios.items()
+        }
+        return tabla
+
+    # ------------------------------------------------------------------
+    # Agregados
+    # ------------------------------------------------------------------
+    def resumir(self, anio_inicio: int, anio_fin: int, tipo: str | None = None) -> dict:
+        """
+        Agregados exactos de los registros del intervalo cerrado de años (y
+        del `tipo` indicado): total, número de registros, totales por año,
+        sumas por contraparte (de mayor a menor) y serie mensual.
+        """
+        anios = np.frombuffer(self._anios, dtype=np.int32)
+        mascara = (anios >= anio_inicio) & (anios <= anio_fin)
+        if tipo is not None:
+            codigo = self._codigos_vocabulario["tipo"].get(tipo)
+            mascara &= np.frombuffer(self._codigos["tipo"], dtype=np.int32) == (-1 if codigo is None else codigo)
+
+        montos = np.frombuffer(self._montos, dtype=np.int64)[mascara]
+        anios = anios[mascara] - anio_inicio
+        meses = np.frombuffer(self._meses, dtype=np.int8)[mascara].astype(np.int64)
+        empresas = np.frombuffer(self._codigos["empresa"], dtype=np.int32)[mascara]
+        anios_periodo = anio_fin - anio_inicio + 1
+
+        # `bincount` suma en float64: exacto mientras cada total sea < 2**53
+        def sumar(grupos: np.ndarray, tamano: int) -> tuple[np.ndarray, np.ndarray]:
+            totales = np.bincount(grupos, weights=montos, minlength=tamano).round().astype(np.int64)
+            return totales, np.bincount(grupos, minlength=tamano)
+
+        por_anio, _ = sumar(anios, anios_periodo)
+        por_empresa, cuenta_empresa = sumar(empresas, len(self.vocabularios["empresa"]))
+        con_mes = meses != SIN_MES
+        por_mes = np.bincount(
+            anios[con_mes] * 12 + meses[con_mes] - 1, weights=montos[con_mes], minlength=anios_periodo * 12
+        ).round().astype(np.int64)
+
+        orden = np.argsort(-por_empresa, kind="stable")
+        return {
+            "total": int(montos.sum()),
+            "registros": int(len(montos)),
+            "por_anio": {anio_inicio + i: int(t) for i, t in enumerate(por_anio.tolist()) if t},
+            "por_contraparte": [
+                (self.vocabularios["empresa"][e] or "Sin contraparte", int(por_empresa[e]), int(cuenta_empresa[e]))
+                for e in orden.tolist()
+                if cuenta_empresa[e]
+            ],
+            "por_mes": {
+                f"{anio_inicio + i // 12}-{i % 12 + 1:02d}": int(t) for i, t in enumerate(por_mes.tolist()) if t
+            },
+        }
+
+
+@lru_cache(maxsize=4)
+def _abrir(ruta: str, _version: tuple[int, int]) -> TablaMontos:
+    return TablaMontos.cargar(ruta)
+
+
+def abrir_tabla(ruta: str) -> TablaMontos:
+    """Tabla de solo lectura; se vuelve a leer cuando el archivo cambia."""
+    try:
+        info = os.stat(ruta)
+    except FileNotFoundError:
+        return TablaMontos()
+    return _abrir(ruta, (info.st_mtime_ns, info.st_size))
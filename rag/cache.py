@@ -0,0 +1,179 @@
+"""
+rag/cache.py
+
+Caché persistente en disco (SQLite) con desalojo LRU:
+
+• `CacheDisco`: almacén clave → bytes con límite de entradas, caducidad
+  opcional (TTL) y contadores de aciertos / fallos.
+• `EmbeddingsCacheadas`: envoltorio de cualquier modelo de embeddings de
+  LangChain que solo consulta la API para textos que no están en caché. La clave
+  es (modelo, hash del texto), por lo que sirve tanto para fragmentos como para
+  las consultas de plantilla del flujo (p. ej. "contratos firmados {empresa}").
+  Cada llamada registra un tramo "embed" con aciertos, tokens y coste.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+from rag.splitter import contar_tokens
+from trazas import coste_estimado, tramo
+
+CACHE_DIR = "rag/cache"
+CACHE_EMBEDDINGS_PATH = os.path.join(CACHE_DIR, "embeddings.sqlite3")
+MAX_EMBEDDINGS_CACHE = 200_000
+
+
+class CacheDisco:
+    """
+    Almacén clave → valor persistido en SQLite. Cada lectura actualiza la marca
+    de último uso; al superar `max_entradas` se eliminan las menos usadas. Con
+    `ttl` (segundos) las entradas más antiguas que ese plazo se descartan.
+    """
+
+    def __init__(self, ruta: str, max_entradas: int, ttl: float | None = None):
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self.aciertos = 0
+        self.fallos = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(ruta, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " clave TEXT PRIMARY KEY, valor BLOB NOT NULL, usado REAL NOT NULL,"
+            " creado REAL NOT NULL DEFAULT 0)"
+        )
+        columnas = {fila[1] for fila in self._conn.execute("PRAGMA table_info(cache)")}
+        if "creado" not in columnas:
+            # Cachés creadas antes de admitir TTL
+            self._conn.execute("ALTER TABLE cache ADD COLUMN creado REAL NOT NULL DEFAULT 0")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_usado ON cache(usado)")
+        self._conn.commit()
+
+    def obtener_varios(self, claves: List[str]) -> dict[str, bytes]:
+        """Devuelve los valores presentes en caché para las claves dadas."""
+        encontrados: dict[str, bytes] = {}
+        ahora = time.time()
+        limite = ahora - self.ttl if self.ttl is not None else 0
+        with self._lock:
+            # SQLite limita el número de parámetros por consulta
+            for i in range(0, len(claves), 500):
+                lote = claves[i:i + 500]
+                marcas = ",".join("?" * len(lote))
+                filas = self._conn.execute(
+                    f"SELECT clave, valor FROM cache WHERE clave IN ({marcas}) AND creado >= ?",
+                    [*lote, limite],
+                ).fetchall()
+                encontrados.update(filas)
+            if encontrados:
+                self._conn.executemany(
+                    "UPDATE cache SET usado = ? WHERE clave = ?",
+                    [(ahora, c) for c in encontrados],
+                )
+                self._conn.commit()
+            self.aciertos += len(encontrados)
+            self.fallos += len(set(claves)) - len(encontrados)
+        return encontrados
+
+    def guardar_varios(self, valores: dict[str, bytes]) -> None:
+        """Inserta o reemplaza valores y aplica el desalojo LRU."""
+        if not valores:
+            return
+        ahora = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO cache (clave, valor, usado, creado) VALUES (?, ?, ?, ?)",
+                [(c, v, ahora, ahora) for c, v in valores.items()],
+            )
+            if self.ttl is not None:
+                self._conn.execute("DELETE FROM cache WHERE creado < ?", (ahora - self.ttl,))
+            (total,) = self._conn.execute("SELECT COUNT(*) FROM cache").fetchone()
+            exceso = total - self.max_entradas
+            if exceso > 0:
+                self._conn.execute(
+                    "DELETE FROM cache WHERE clave IN "
+                    "(SELECT clave FROM cache ORDER BY usado ASC LIMIT ?)",
+                    (exceso,),
+                )
+            self._conn.commit()
+
+    def estadisticas(self) -> dict[str, float]:
+        consultas = self.aciertos + self.fallos
+        return {
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "tasa_aciertos": self.aciertos / consultas if consultas else 0.0,
+        }
+
+
+class EmbeddingsCacheadas(Embeddings):
+    """
+    Envuelve un modelo de embeddings y reutiliza los vectores ya calculados.
+    Los vectores se guardan como float32.
+    """
+
+    def __init__(self, base: Embeddings, cache: CacheDisco | None = None):
+        self.base = base
+        self.modelo = getattr(base, "model", type(base).__name__)
+        self.cache = cache or CacheDisco(CACHE_EMBEDDINGS_PATH, MAX_EMBEDDINGS_CACHE)
+
+    def _clave(self, texto: str) -> str:
+        digest = hashlib.sha256(texto.encode("utf-8")).hexdigest()
+        return f"{self.modelo}:{digest}"
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with tramo("embed", modelo=self.modelo, textos=len(texts)) as medida:
+            claves = [self._clave(t) for t in texts]
+            en_cache = self.cache.obtener_varios(claves)
+
+            # Calcular solo los textos ausentes (una vez por texto distinto)
+            pendientes: dict[str, str] = {}
+            for clave, texto in zip(claves, texts):
+                if clave not in en_cache:
+                    pendientes.setdefault(clave, texto)
+            medida.update(aciertos_cache=len(en_cache), fallos_cache=len(pendientes))
+            if pendientes:
+                tokens = sum(contar_tokens(list(pendientes.values())))
+                medida.update(tokens_entrada=tokens, coste_usd=coste_estimado(self.modelo, tokens))
+                vectores = self.base.embed_documents(list(pendientes.values()))
+                nuevos = {
+                    clave: array("f", vector).tobytes()
+                    for clave, vector in zip(pendientes, vectores)
+                }
+                self.cache.guardar_varios(nuevos)
+                en_cache.update(nuevos)
+
+        resultado = []
+        for clave in claves:
+            vector = array("f")
+            vector.frombytes(en_cache[clave])
+            resultado.append(vector.tolist())
+        return resultado
+
+    def embed_query(self, text: str) -> List[float]:
+        with tramo("embed", modelo=self.modelo, textos=1) as medida:
+            clave = self._clave(text)
+            en_cache = self.cache.obtener_varios([clave])
+            medida.update(aciertos_cache=len(en_cache), fallos_cache=1 - len(en_cache))
+            if clave not in en_cache:
+                tokens = contar_tokens([text])[0]
+                medida.update(tokens_entrada=tokens, coste_usd=coste_estimado(self.modelo, tokens))
+                vector = self.base.embed_query(text)
+                self.cache.guardar_varios({clave: array("f", vector).tobytes()})
+                return list(vector)
+        vector = array("f")
+        vector.frombytes(en_cache[clave])
+        return vector.tolist()
+
+    def estadisticas(self) -> dict[str, float]:
+        return self.cache.estadisticas()
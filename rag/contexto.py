@@ -0,0 +1,102 @@
+"""
+rag/contexto.py
+
+Ensamblado del contexto que se envía a GPT-4o:
+
+• `deduplicar` agrupa los fragmentos recuperados por registro (todos los
+  fragmentos de un mismo segmento comparten metadatos, y con ellos el
+  identificador `id_registro`) y une los que se solapan por el
+  `chunk_overlap` del splitter, de modo que cada registro aparece una vez.
+• Se conserva el orden de recuperación, que es el ranking por puntuación de la
+  búsqueda (vectorial o fusionada con BM25): ante un recorte, se descarta lo
+  peor puntuado.
+• `empaquetar` llena el prompt hasta un presupuesto de tokens contado con
+  tiktoken (mismo codificador que `rag/splitter.py`), alternando entre
+  secciones para que ninguna se quede sin representación.
+• El presupuesto por prompt se configura con `ALIE_PRESUPUESTO_TOKENS`.
+"""
+
+import hashlib
+import json
+import os
+
+from langchain.schema import Document
+
+from rag.splitter import DEFAULT_CHUNK_OVERLAP, contar_tokens
+from trazas import tramo
+
+PRESUPUESTO_TOKENS = 6_000
+# Un token ocupa de media menos de 8 caracteres: cota del solapamiento a buscar
+MAX_SOLAPE_CARACTERES = DEFAULT_CHUNK_OVERLAP * 8
+MIN_SOLAPE_CARACTERES = 20
+
+
+def presupuesto_tokens() -> int:
+    """Tokens de contexto por prompt (`ALIE_PRESUPUESTO_TOKENS`, por defecto 6000)."""
+    return int(os.getenv("ALIE_PRESUPUESTO_TOKENS", PRESUPUESTO_TOKENS))
+
+
+def id_registro(doc: Document) -> str:
+    """Identificador estable del registro de origen (hash de sus metadatos)."""
+    return hashlib.sha256(json.dumps(doc.metadata, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def _unir_solapados(a: str, b: str) -> str:
+    """Une dos fragmentos de un registro eliminando el texto que comparten."""
+    if b in a:
+        return a
+    if a in b:
+        return b
+    limite = min(len(a), len(b), MAX_SOLAPE_CARACTERES)
+    for n in range(limite, MIN_SOLAPE_CARACTERES - 1, -1):
+        if a.endswith(b[:n]):
+            return a + b[n:]
+        if b.endswith(a[:n]):
+            return b + a[n:]
+    return f"{a}\n{b}"
+
+
+def deduplicar(docs: list[Document]) -> list[Document]:
+    """
+    Un documento por registro, en el orden en que aparece por primera vez; los
+    fragmentos repetidos o solapados del mismo registro se funden en uno.
+    """
+    registros: dict[str, Document] = {}
+    for doc in docs:
+        clave = id_registro(doc)
+        previo = registros.get(clave)
+        if previo is None:
+            registros[clave] = Document(page_content=doc.page_content, metadata=doc.metadata)
+        else:
+            previo.page_content = _unir_solapados(previo.page_content, doc.page_content)
+    return list(registros.values())
+
+
+def empaquetar(secciones: dict[str, list[str]], presupuesto: int | None = None) -> dict[str, list[str]]:
+    """
+    Selecciona entradas de cada sección, en orden de ranking y por turnos
+    entre secciones, mientras quepan en `presupuesto` tokens. Las entradas que
+    no caben se omiten y se prueba con las siguientes (pueden ser más cortas).
+    """
+    presupuesto = presupuesto_tokens() if presupuesto is None else presupuesto
+    entradas = [texto for lista in secciones.values() for texto in lista]
+    tokens = iter(contar_tokens(entradas))
+    colas = {nombre: [(texto, next(tokens)) for texto in lista] for nombre, lista in secciones.items()}
+
+    with tramo("contexto", presupuesto=presupuesto, entradas=len(entradas)) as medida:
+        seleccion: dict[str, list[str]] = {nombre: [] for nombre in secciones}
+        usados = 0
+        turno = 0
+        while any(colas.values()):
+            for nombre, cola in colas.items():
+                if len(cola) <= turno:
+                    continue
+                texto, n = cola[turno]
+                if usados + n <= presupuesto:
+                    seleccion[nombre].append(texto)
+                    usados += n
+            turno += 1
+            colas = {nombre: cola for nombre, cola in colas.items() if len(cola) > turno}
+        medida["tokens"] = usados
+        medida["descartadas"] = len(entradas) - sum(map(len, seleccion.values()))
+    return seleccion
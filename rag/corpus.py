@@ -0,0 +1,144 @@
+"""
+rag/corpus.py
+
+Representación compacta de un corpus de segmentos o fragmentos en memoria:
+
+• `Corpus` guarda los campos comunes en columnas: `tipo`, `mes`, `empresa`
+  y `fuente` como códigos (`array`) sobre un vocabulario de cadenas
+  internadas, y `año` como `array` de enteros. El resto de campos del
+  `Registro` va en un diccionario por fila con claves internadas.
+• Los textos se guardan una sola vez; el `Document` de LangChain (con su
+  diccionario de metadatos) se crea bajo demanda, solo en la frontera con
+  el índice (`documento`, `pares`).
+• `particionar` reparte las filas por una clave en una única pasada.
+"""
+
+import sys
+from array import array
+from typing import Callable, Iterable, Iterator, Sequence, Tuple
+
+from langchain.schema import Document
+
+# Campos con columna propia; los códigos indexan el vocabulario de cada uno
+COLUMNAS_TEXTO = ("tipo", "mes", "empresa", "fuente")
+# Valor de la columna "año" cuando el registro no lo tiene
+SIN_ANIO = -(2**31)
+
+
+class _Vocabulario:
+    """Cadenas internadas ↔ códigos enteros."""
+
+    __slots__ = ("valores", "codigos")
+
+    def __init__(self):
+        self.valores: list[str | None] = [None]
+        self.codigos: dict[str, int] = {}
+
+    def codigo(self, valor: str | None) -> int:
+        if valor is None:
+            return 0
+        codigo = self.codigos.get(valor)
+        if codigo is None:
+            codigo = len(self.valores)
+            valor = sys.intern(valor)
+            self.valores.append(valor)
+            self.codigos[valor] = codigo
+        return codigo
+
+
+class Corpus:
+    """Filas (id opcional, texto, registro) almacenadas por columnas."""
+
+    def __init__(self, documentos: Iterable[Document] = ()):
+        self.ids: list[str | None] = []
+        self.textos: list[str] = []
+        self.anios = array("i")
+        self._vocabularios = {campo: _Vocabulario() for campo in COLUMNAS_TEXTO}
+        self._codigos = {campo: array("I") for campo in COLUMNAS_TEXTO}
+        self._extras: list[dict | None] = []
+        for doc in documentos:
+            self.agregar(doc)
+
+    def __len__(self) -> int:
+        return len(self.textos)
+
+    def agregar(self, doc: Document, id_fila: str | None = None) -> int:
+        """Añade un documento y devuelve su posición."""
+        registro = doc.metadata
+        anio = registro.get("año")
+        # Un año no numérico (texto original) se conserva en los extras
+        self.anios.append(anio if isinstance(anio, int) else SIN_ANIO)
+        for campo in COLUMNAS_TEXTO:
+            valor = registro.get(campo)
+            self._codigos[campo].append(self._vocabularios[campo].codigo(valor if isinstance(valor, str) else None))
+        extras = {
+            sys.intern(campo): valor
+            for campo, valor in registro.items()
+            if not (campo == "año" and isinstance(valor, int))
+            and not (campo in self._codigos and isinstance(valor, str))
+        }
+        self._extras.append(extras or None)
+        self.textos.append(doc.page_content)
+        self.ids.append(id_fila)
+        return len(self.textos) - 1
+
+    def valor(self, campo: str, fila: int):
+        if campo == "año":
+            anio = self.anios[fila]
+            return anio if anio != SIN_ANIO else (self._extras[fila] or {}).get("año")
+        if campo in self._codigos:
+            valor = self._vocabularios[campo].valores[self._codigos[campo][fila]]
+            return valor if valor is not None else (self._extras[fila] or {}).get(campo)
+        return (self._extras[fila] or {}).get(campo)
+
+    def metadatos(self, fila: int) -> dict:
+        """Reconstruye el `Registro` de la fila (mismo contenido que al agregarlo)."""
+        registro = {}
+        for campo in COLUMNAS_TEXTO:
+            valor = self._vocabularios[campo].valores[self._codigos[campo][fila]]
+            if valor is not None:
+                registro[campo] = valor
+        if self.anios[fila] != SIN_ANIO:
+            registro["año"] = self.anios[fila]
+        if self._extras[fila]:
+            registro.update(self._extras[fila])
+        return registro
+
+    def documento(self, fila: int) -> Document:
+        return Document(page_content=self.textos[fila], metadata=self.metadatos(fila))
+
+    def __iter__(self) -> Iterator[Document]:
+        return (self.documento(fila) for fila in range(len(self)))
+
+    def pares(self, filas: Sequence[int] | None = None) -> "_Pares":
+        """Vista perezosa (id, Document) de las filas, para la ingesta."""
+        return _Pares(self, range(len(self)) if filas is None else filas)
+
+    def particionar(self, clave: Callable[["Corpus", int], str | None]) -> dict[str, list[int]]:
+        """Filas por valor de `clave(corpus, fila)` en una sola pasada (None se omite)."""
+        particiones: dict[str, list[int]] = {}
+        for fila in range(len(self)):
+            grupo = clave(self, fila)
+            if grupo is not None:
+                particiones.setdefault(grupo, []).append(fila)
+        return particiones
+
+
+class _Pares(Sequence):
+    """Secuencia (id, Document) que crea cada `Document` al pedirlo."""
+
+    def __init__(self, corpus: Corpus, filas: Sequence[int]):
+        self.corpus = corpus
+        self.filas = filas
+
+    def __len__(self) -> int:
+        return len(self.filas)
+
+    def __getitem__(self, indice) -> Tuple[str, Document]:
+        if isinstance(indice, slice):
+            return _Pares(self.corpus, self.filas[indice])
+        fila = self.filas[indice]
+        return self.corpus.ids[fila], self.corpus.documento(fila)
+
+    def textos(self) -> list[str]:
+        return [self.corpus.textos[fila] for fila in self.filas]
@@ -0,0 +1,378 @@
+"""
+rag/indice_numpy.py
+
+Índice vectorial en proceso con NumPy, alternativa ligera a Chroma:
+
+• Cada colección es un directorio con una matriz float32 de embeddings
+  (`vectores.f32`, filas normalizadas) y un archivo de metadatos columnar
+  (`metadatos.json`: ids, textos y una lista de valores por campo).
+• Abrir una colección es un `np.memmap` de la matriz y la lectura del JSON;
+  no hay SQLite ni grafo HNSW que cargar.
+• `similarity_search_by_vector` resuelve el filtro de metadatos con máscaras
+  vectorizadas, calcula todas las similitudes con un único producto
+  matriz-vector y selecciona el top-k con `argpartition`.
+• Con `cuantizacion="int8"` (`ALIE_CUANTIZACION=int8`) se mantiene además
+  una copia int8 de la matriz (`vectores.i8`, una escala float32 por fila en
+  `escalas.f32`): el recorrido completo lee 4 veces menos memoria y solo los
+  `k * reordenar` mejores candidatos se vuelven a puntuar con los vectores
+  float32, que permanecen en disco y solo se leen para esas filas. La copia
+  se genera al escribir (ingesta, borrado o `cuantizar`), nunca al abrir.
+  Limitación aceptada: NumPy no multiplica int8 con BLAS, así que cada bloque
+  se convierte a float32 y, con la matriz ya en RAM, el recorrido tarda lo
+  mismo que el float32 (o algo más). La ganancia es de memoria: 4 veces
+  menos páginas residentes y leídas, que acelera cuando la matriz float32
+  no cabe en RAM.
+• Expone la misma interfaz que usan el flujo y la ingesta (`embeddings`,
+  `similarity_search`, `similarity_search_by_vector`, `upsert`, `delete`,
+  `delete_collection`), por lo que es intercambiable con Chroma
+  (ver `ALIE_INDICE` en `rag/vectorstore.py`).
+
+Filtros admitidos (subconjunto de la sintaxis de Chroma):
+    {"año": 2021}, {"año": {"$eq": 2021}}, {"año": {"$in": [2021, 2022]}},
+    {"año": {"$gte": 2020}} (también $gt, $lte y $lt), {"$and": [{...}, {...}]}
+"""
+
+import json
+import os
+import shutil
+import threading
+
+import numpy as np
+from langchain.schema import Document
+
+from rag.periodos import intervalo_de
+
+ARCHIVO_VECTORES = "vectores.f32"
+ARCHIVO_CUANTIZADOS = "vectores.i8"
+ARCHIVO_ESCALAS = "escalas.f32"
+ARCHIVO_METADATOS = "metadatos.json"
+VERSION_INDICE = 1
+# Valor de las celdas sin dato en las columnas enteras (p. ej. "año")
+SIN_VALOR = -1
+CUANTIZACIONES = ("int8",)
+# Candidatos que se reordenan con float32, como múltiplo de k
+FACTOR_REORDENACION = 4
+# Filas por bloque al cuantizar la matriz
+BLOQUE_FILAS = 4096
+# Filas int8 que se convierten a float32 a la vez al puntuar: el bloque
+# convertido cabe en la caché L2 y se reutiliza en todo el recorrido
+BLOQUE_ESCANEO = 256
+
+
+def cuantizar(vectores: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Cuantización escalar simétrica por fila: vector ≈ escala * int8."""
+    escalas = np.abs(vectores).max(axis=1) / 127
+    escalas[escalas == 0] = 1
+    cuantizados = np.rint(vectores / escalas[:, None]).astype(np.int8)
+    return cuantizados, escalas.astype(np.float32)
+
+
+class IndiceNumpy:
+    """Colección de vectores persistida como matriz mapeada en memoria."""
+
+    def __init__(
+        self,
+        directorio: str,
+        embedding_function=None,
+        cuantizacion: str | None = None,
+        reordenar: int = FACTOR_REORDENACION,
+    ):
+        if cuantizacion not in (None, *CUANTIZACIONES):
+            raise ValueError(f"Cuantización no soportada por IndiceNumpy: {cuantizacion}")
+        self.directorio = directorio
+        self.embeddings = embedding_function
+        self.cuantizacion = cuantizacion
+        self.reordenar = reordenar
+        self._lock = threading.Lock()
+        self._cargar()
+
+    # ------------------------------------------------------------------
+    # Persistencia
+    # ------------------------------------------------------------------
+    @property
+    def _ruta_vectores(self) -> str:
+        return os.path.join(self.directorio, ARCHIVO_VECTORES)
+
+    @property
+    def _ruta_metadatos(self) -> str:
+        return os.path.join(self.directorio, ARCHIVO_METADATOS)
+
+    @property
+    def _ruta_cuantizados(self) -> str:
+        return os.path.join(self.directorio, ARCHIVO_CUANTIZADOS)
+
+    @property
+    def _ruta_escalas(self) -> str:
+        return os.path.join(self.directorio, ARCHIVO_ESCALAS)
+
+    @property
+    def _mantiene_int8(self) -> bool:
+        """La copia int8 se actualiza si se usa o si ya existe en disco."""
+        return self.cuantizacion == "int8" or os.path.exists(self._ruta_escalas)
+
+    def _cargar(self) -> None:
+        datos = {}
+        if os.path.exists(self._ruta_metadatos):
+            with open(self._ruta_metadatos, encoding="utf-8") as f:
+                datos = json.load(f)
+            if datos.get("version") != VERSION_INDICE:
+                datos = {}
+        self.dimension: int | None = datos.get("dimension")
+        self.ids: list[str] = datos.get("ids", [])
+        self.documentos: list[str] = datos.get("documentos", [])
+        self.columnas: dict[str, list] = datos.get("columnas", {})
+        self._posiciones = {i: n for n, i in enumerate(self.ids)}
+        self._mapear()
+
+    def _mapear(self) -> None:
+        """Mapea la matriz en memoria (solo las filas que recoge el JSON)."""
+        self._mascaras: dict[str, np.ndarray] = {}
+        n = len(self.ids)
+        self.cuantizada = self.escalas = None
+        if not n:
+            self.matriz = np.empty((0, self.dimension or 0), dtype=np.float32)
+            return
+        # Si una escritura se interrumpió tras añadir vectores, las filas
+        # sobrantes al final del archivo se ignoran
+        self.matriz = np.memmap(self._ruta_vectores, dtype=np.float32, mode="r", shape=(n, self.dimension))
+        # Abrir nunca escribe: sin copia int8 completa se busca en float32
+        # hasta que una escritura (o `cuantizar`) la genere
+        if self.cuantizacion == "int8" and self._int8_completa(n):
+            self.cuantizada = np.memmap(self._ruta_cuantizados, dtype=np.int8, mode="r", shape=(n, self.dimension))
+            self.escalas = np.memmap(self._ruta_escalas, dtype=np.float32, mode="r", shape=(n,))
+
+    def _int8_completa(self, n: int) -> bool:
+        """True si la copia int8 cubre las `n` filas válidas de la matriz."""
+        if not n:
+            return True
+        return (
+            os.path.exists(self._ruta_escalas)
+            and os.path.getsize(self._ruta_escalas) >= n * 4
+            and os.path.getsize(self._ruta_cuantizados) >= n * self.dimension
+        )
+
+    def _guardar_metadatos(self) -> None:
+        """Escribe los metadatos de forma atómica: marcan cuántas filas son válidas."""
+        os.makedirs(self.directorio, exist_ok=True)
+        datos = {
+            "version": VERSION_INDICE,
+            "dimension": self.dimension,
+            "ids": self.ids,
+            "documentos": self.documentos,
+            "columnas": self.columnas,
+        }
+        temporal = self._ruta_metadatos + ".tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump(datos, f, ensure_ascii=False)
+        os.replace(temporal, self._ruta_metadatos)
+
+    def _reescribir(self, matriz: np.ndarray) -> None:
+        os.makedirs(self.directorio, exist_ok=True)
+        temporal = self._ruta_vectores + ".tmp"
+        np.ascontiguousarray(matriz, dtype=np.float32).tofile(temporal)
+        os.replace(temporal, self._ruta_vectores)
+        if self._mantiene_int8:
+            self._reescribir_int8(matriz)
+
+    def _reescribir_int8(self, matriz: np.ndarray) -> None:
+        """Cuantiza la matriz por bloques (sin cargarla entera en float32)."""
+        with open(self._ruta_cuantizados + ".tmp", "wb") as fc, open(self._ruta_escalas + ".tmp", "wb") as fe:
+            for inicio in range(0, len(matriz), BLOQUE_FILAS):
+                cuantizados, escalas = cuantizar(np.asarray(matriz[inicio:inicio + BLOQUE_FILAS], dtype=np.float32))
+                fc.write(cuantizados.tobytes())
+                fe.write(escalas.tobytes())
+        # Las escalas se sustituyen al final: su tamaño marca la copia int8 como válida
+        os.replace(self._ruta_cuantizados + ".tmp", self._ruta_cuantizados)
+        os.replace(self._ruta_escalas + ".tmp", self._ruta_escalas)
+
+    # ------------------------------------------------------------------
+    # Escritura (la ingesta escribe desde un solo hilo)
+    # ------------------------------------------------------------------
+    def upsert(self, ids: list[str], embeddings: list[list[float]], documents: list[str], metadatas: list[dict]) -> None:
+        """Añade o reemplaza filas. Los vectores se guardan normalizados (L2)."""
+        vectores = np.asarray(embeddings, dtype=np.float32)
+        normas = np.linalg.norm(vectores, axis=1, keepdims=True)
+        vectores /= np.where(normas == 0, 1, normas)
+        with self._lock:
+            if self.dimension is None:
+                self.dimension = vectores.shape[1]
+            elif vectores.shape[1] != self.dimension:
+                raise ValueError(f"Dimensión {vectores.shape[1]} incompatible con el índice ({self.dimension}).")
+
+            existentes = [i for i in ids if i in self._posiciones]
+            if existentes:
+                self._eliminar(existentes)
+
+            # Las filas nuevas se añaden al final del archivo (descartando
+            # las que hubiera dejado una escritura interrumpida)
+            os.makedirs(self.directorio, exist_ok=True)
+            with open(self._ruta_vectores, "ab") as f:
+                f.truncate(len(self.ids) * self.dimension * 4)
+                f.write(vectores.tobytes())
+            if self._mantiene_int8 and self._int8_completa(len(self.ids)):
+                cuantizados, escalas = cuantizar(vectores)
+                with open(self._ruta_cuantizados, "ab") as f:
+                    f.truncate(len(self.ids) * self.dimension)
+                    f.write(cuantizados.tobytes())
+                with open(self._ruta_escalas, "ab") as f:
+                    f.truncate(len(self.ids) * 4)
+                    f.write(escalas.tobytes())
+
+            n = len(self.ids)
+            self.ids.extend(ids)
+            self.documentos.extend(documents)
+            for campo in {c for m in metadatas for c in m} - self.columnas.keys():
+                self.columnas[campo] = [None] * n
+            for campo, valores in self.columnas.items():
+                valores.extend(m.get(campo) for m in metadatas)
+            self._posiciones.update((i, n + k) for k, i in enumerate(ids))
+            self._guardar_metadatos()
+            self._mapear()
+            self._completar_int8()
+
+    def _eliminar(self, ids: list[str]) -> None:
+        borrar = {self._posiciones[i] for i in ids if i in self._posiciones}
+        if not borrar:
+            return
+        conservar = np.array([n for n in range(len(self.ids)) if n not in borrar], dtype=np.int64)
+        self._reescribir(np.asarray(self.matriz)[conservar])
+        self.ids = [self.ids[n] for n in conservar]
+        self.documentos = [self.documentos[n] for n in conservar]
+        self.columnas = {campo: [valores[n] for n in conservar] for campo, valores in self.columnas.items()}
+        self._posiciones = {i: n for n, i in enumerate(self.ids)}
+        self._guardar_metadatos()
+        self._mapear()
+
+    def _completar_int8(self) -> None:
+        """Genera la copia int8 si este índice cuantiza y falta o está incompleta."""
+        if self.cuantizacion == "int8" and not self._int8_completa(len(self.ids)):
+            # Índice creado sin cuantizar o escritura interrumpida
+            self._reescribir_int8(self.matriz)
+            self._mapear()
+
+    def cuantizar(self) -> None:
+        """Escritura explícita de la copia int8 (la sincronización del índice la invoca)."""
+        with self._lock:
+            self._completar_int8()
+
+    def delete(self, ids: list[str]) -> None:
+        with self._lock:
+            self._eliminar(ids)
+
+    def delete_collection(self) -> None:
+        with self._lock:
+            shutil.rmtree(self.directorio, ignore_errors=True)
+            self._cargar()
+
+    def count(self) -> int:
+        return len(self.ids)
+
+    # ------------------------------------------------------------------
+    # Consulta
+    # ------------------------------------------------------------------
+    def _columna(self, campo: str) -> np.ndarray:
+        """Columna de metadatos como array (enteros si todos lo son)."""
+        valores = self.columnas.get(campo, [None] * len(self.ids))
+        if all(isinstance(v, int) or v is None for v in valores):
+            return np.array([SIN_VALOR if v is None else v for v in valores], dtype=np.int64)
+        columna = np.empty(len(valores), dtype=object)
+        columna[:] = valores
+        return columna
+
+    def _mascara(self, filtro: dict) -> np.ndarray:
+        mascara = np.ones(len(self.ids), dtype=bool)
+        for campo, condicion in filtro.items():
+            if campo == "$and":
+                for parte in condicion:
+                    mascara &= self._mascara(parte)
+                continue
+            columna = self._columna(campo)
+            if isinstance(condicion, dict):
+                (operador, valor), = condicion.items()
+                if operador == "$eq":
+                    mascara &= columna == valor
+                elif operador == "$in" and columna.dtype != object:
+                    mascara &= np.isin(columna, list(valor))
+                elif operador in ("$gte", "$gt", "$lte", "$lt"):
+                    minimo, maximo = intervalo_de(operador, valor)
+                    mascara &= (columna >= minimo) & (columna <= maximo) & (columna != SIN_VALOR)
+                elif operador == "$in":
+                    coincide = np.zeros(len(columna), dtype=bool)
+                    for v in valor:
+                        coincide |= columna == v
+                    mascara &= coincide
+                else:
+                    raise ValueError(f"Operador de filtro no soportado por IndiceNumpy: {operador}")
+            else:
+                mascara &= columna == condicion
+        return mascara
+
+    def similarity_search_by_vector(self, embedding: list[float], k: int = 4, filter: dict | None = None, **_) -> list[Document]:
+        """Top-k por similitud coseno entre las filas que cumplen el filtro."""
+        with self._lock:
+            matriz, ids, documentos, columnas = self.matriz, self.ids, self.documentos, self.columnas
+            cuantizada, escalas = self.cuantizada, self.escalas
+            if filter:
+                clave = json.dumps(filter, sort_keys=True, ensure_ascii=False, default=str)
+                if clave not in self._mascaras:
+                    self._mascaras[clave] = np.flatnonzero(self._mascara(filter))
+                filas = self._mascaras[clave]
+            else:
+                filas = None
+        if not len(ids) or k <= 0:
+            return []
+
+        consulta = np.asarray(embedding, dtype=np.float32)
+        consulta /= np.linalg.norm(consulta) or 1.0
+        if filas is not None and not len(filas):
+            return []
+        if cuantizada is not None:
+            filas, puntuaciones = self._reordenar(matriz, cuantizada, escalas, filas, consulta, k)
+        elif filas is None:
+            puntuaciones = matriz @ consulta
+            filas = np.arange(len(ids))
+        else:
+            puntuaciones = matriz[filas] @ consulta
+        k = min(k, len(filas))
+        mejores = np.argpartition(-puntuaciones, k - 1)[:k]
+        mejores = mejores[np.argsort(-puntuaciones[mejores])]
+        return [
+            Document(
+                page_content=documentos[fila],
+                metadata={c: v[fila] for c, v in columnas.items() if v[fila] is not None},
+            )
+            for fila in filas[mejores].tolist()
+        ]
+
+    def _reordenar(self, matriz, cuantizada, escalas, filas, consulta, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Puntúa todas las filas con la matriz int8 y devuelve los
+        `k * reordenar` mejores candidatos con su similitud exacta (float32).
+        """
+        n = len(cuantizada) if filas is None else len(filas)
+        aproximadas = np.empty(n, dtype=np.float32)
+        bloque = np.empty((min(n, BLOQUE_ESCANEO), cuantizada.shape[1]), dtype=np.float32)
+        for inicio in range(0, n, BLOQUE_ESCANEO):
+            fin = min(inicio + BLOQUE_ESCANEO, n)
+            convertido = bloque[: fin - inicio]
+            convertido[...] = cuantizada[inicio:fin] if filas is None else cuantizada[filas[inicio:fin]]
+            aproximadas[inicio:fin] = convertido @ consulta
+        aproximadas *= escalas if filas is None else escalas[filas]
+
+        candidatos = min(n, max(k, k * self.reordenar))
+        elegidos = np.argpartition(-aproximadas, candidatos - 1)[:candidatos] if candidatos < n else np.arange(n)
+        elegidos.sort()  # lectura secuencial de las filas float32
+        elegidos = elegidos if filas is None else filas[elegidos]
+        return elegidos, matriz[elegidos] @ consulta
+
+    def similitudes(self, embedding: list[float], ids: list[str]) -> np.ndarray:
+        """Similitud coseno exacta (float32) de la consulta con las filas `ids`."""
+        consulta = np.asarray(embedding, dtype=np.float32)
+        consulta /= np.linalg.norm(consulta) or 1.0
+        with self._lock:
+            filas = [self._posiciones[i] for i in ids]
+            matriz = self.matriz
+        return matriz[filas] @ consulta if filas else np.empty(0, dtype=np.float32)
+
+    def similarity_search(self, query: str, k: int = 4, filter: dict | None = None, **kwargs) -> list[Document]:
+        return self.similarity_search_by_vector(self.embeddings.embed_query(query), k=k, filter=filter, **kwargs)
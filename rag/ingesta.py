@@ -0,0 +1,167 @@
+"""
+rag/ingesta.py
+
+Pipeline de ingesta por lotes para corpus grandes:
+
+• Agrupa los fragmentos en lotes limitados por número de textos y por
+  presupuesto de tokens (mismo codificador `cl100k_base` que `rag/splitter.py`).
+• Calcula los embeddings de varios lotes en paralelo, con un máximo de
+  peticiones simultáneas y una ventana acotada de lotes en vuelo: solo esos
+  lotes tienen sus textos y vectores en memoria a la vez.
+• Reintenta con espera exponencial cuando la API responde 429 (rate limit).
+• Escribe cada lote en la colección en cuanto termina y avisa mediante
+  `al_confirmar`, que el indexador usa para guardar el manifiesto: una ingesta
+  interrumpida se reanuda desde el último lote confirmado.
+
+Para probar sin conexión, `simulador_api.py` ofrece un servidor local
+compatible con `/v1/embeddings` (con 429 e interrupciones inyectadas) y
+`python simulador_api.py --comprobar` ejercita los reintentos y la reanudación.
+"""
+
+import itertools
+import logging
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Iterable, List, Sequence, Tuple
+
+from langchain.schema import Document
+
+from rag.splitter import contar_tokens
+from trazas import en_contexto, tramo
+
+log = logging.getLogger(__name__)
+
+TAMANO_LOTE = 256
+MAX_TOKENS_LOTE = 100_000
+MAX_PETICIONES_PARALELAS = 4
+# Lotes en vuelo (pedidos y aún no escritos), como múltiplo de las peticiones paralelas
+FACTOR_VENTANA = 2
+MAX_INTENTOS = 6
+ESPERA_INICIAL = 1.0
+ESPERA_MAXIMA = 60.0
+
+
+def _es_rate_limit(error: Exception) -> bool:
+    """True si la excepción corresponde a un HTTP 429 de la API."""
+    if getattr(error, "status_code", None) == 429:
+        return True
+    return type(error).__name__ == "RateLimitError"
+
+
+def _textos(fragmentos: Sequence[Tuple[str, Document]]) -> List[str]:
+    # Una vista de `rag.corpus.Corpus` da los textos sin crear los `Document`
+    if hasattr(fragmentos, "textos"):
+        return fragmentos.textos()
+    return [d.page_content for _, d in fragmentos]
+
+
+def agrupar_en_lotes(
+    fragmentos: Sequence[Tuple[str, Document]],
+    tamano_lote: int = TAMANO_LOTE,
+    max_tokens_lote: int = MAX_TOKENS_LOTE,
+) -> List[Sequence[Tuple[str, Document]]]:
+    """
+    Reparte los fragmentos (id, documento) en lotes que no superan ni
+    `tamano_lote` textos ni `max_tokens_lote` tokens. Un texto que por sí solo
+    excede el presupuesto forma su propio lote. Cada lote es un corte de
+    `fragmentos` (una vista perezosa si lo es la entrada).
+    """
+    if not fragmentos:
+        return []
+    tokens = contar_tokens(_textos(fragmentos))
+
+    lotes: List[Sequence[Tuple[str, Document]]] = []
+    inicio, tokens_actual = 0, 0
+    for posicion, n_tokens in enumerate(tokens):
+        tamano = posicion - inicio
+        if tamano and (tamano >= tamano_lote or tokens_actual + n_tokens > max_tokens_lote):
+            lotes.append(fragmentos[inicio:posicion])
+            inicio, tokens_actual = posicion, 0
+        tokens_actual += n_tokens
+    lotes.append(fragmentos[inicio:])
+    return lotes
+
+
+def embeber_con_reintentos(embeddings, textos: List[str], max_intentos: int = MAX_INTENTOS) -> List[List[float]]:
+    """
+    Calcula los embeddings de un lote. Ante un 429 espera de forma exponencial
+    (con variación aleatoria para no sincronizar los hilos) y reintenta.
+    """
+    espera = ESPERA_INICIAL
+    for intento in range(1, max_intentos + 1):
+        try:
+            return embeddings.embed_documents(textos)
+        except Exception as e:
+            if not _es_rate_limit(e) or intento == max_intentos:
+                raise
+            pausa = min(espera, ESPERA_MAXIMA) * random.uniform(0.5, 1.5)
+            log.warning("Límite de peticiones alcanzado; reintento %d en %.1fs", intento, pausa)
+            time.sleep(pausa)
+            espera *= 2
+    return []
+
+
+def ingerir(
+    coleccion,
+    fragmentos: Iterable[Tuple[str, Document]],
+    embeddings,
+    al_confirmar: Callable[[List[str]], None] | None = None,
+    tamano_lote: int = TAMANO_LOTE,
+    max_tokens_lote: int = MAX_TOKENS_LOTE,
+    max_paralelo: int = MAX_PETICIONES_PARALELAS,
+) -> int:
+    """
+    Calcula embeddings por lotes y los inserta en la colección.
+
+    Args:
+        coleccion: Vectorstore de destino (Chroma o `IndiceNumpy`).
+        fragmentos: Pares (id estable, documento) a indexar; con una vista de
+            `rag.corpus.Corpus` cada `Document` se crea al escribir su lote.
+        embeddings: Modelo de embeddings (p. ej. `EmbeddingsCacheadas`).
+        al_confirmar: Se invoca con los ids de cada lote ya persistido.
+        tamano_lote: Máximo de textos por petición.
+        max_tokens_lote: Máximo de tokens por petición.
+        max_paralelo: Peticiones de embeddings simultáneas.
+
+    Returns:
+        Número de fragmentos insertados.
+    """
+    if not isinstance(fragmentos, Sequence):
+        fragmentos = list(fragmentos)
+    lotes = agrupar_en_lotes(fragmentos, tamano_lote, max_tokens_lote)
+    if not lotes:
+        return 0
+
+    insertados = 0
+    # Las escrituras se hacen desde este hilo, lote a lote. Chroma expone
+    # `upsert` en su colección nativa; `IndiceNumpy`, directamente
+    destino = getattr(coleccion, "_collection", coleccion)
+    siguientes = iter(lotes)
+    with ThreadPoolExecutor(max_workers=max_paralelo) as pool:
+        en_vuelo = {}
+
+        def pedir(n: int) -> None:
+            for lote in itertools.islice(siguientes, n):
+                en_vuelo[pool.submit(en_contexto(embeber_con_reintentos), embeddings, _textos(lote))] = lote
+
+        pedir(max_paralelo * FACTOR_VENTANA)
+        while en_vuelo:
+            terminados, _ = wait(en_vuelo, return_when=FIRST_COMPLETED)
+            for futuro in terminados:
+                lote = list(en_vuelo.pop(futuro))
+                ids = [i for i, _ in lote]
+                vectores = futuro.result()
+                with tramo("indexar", fragmentos=len(lote)):
+                    destino.upsert(
+                        ids=ids,
+                        embeddings=vectores,
+                        documents=[d.page_content for _, d in lote],
+                        metadatas=[d.metadata for _, d in lote],
+                    )
+                insertados += len(lote)
+                if al_confirmar is not None:
+                    al_confirmar(ids)
+                log.info("%d fragmentos indexados", insertados)
+            pedir(len(terminados))
+    return insertados
@@ -0,0 +1,215 @@
+"""
+rag/lexico.py
+
+Índice léxico (BM25) y de metadatos exactos por colección:
+
+• Se construye durante la ingesta, junto a las colecciones vectoriales, y se
+  actualiza de forma incremental con los mismos identificadores de fragmento.
+• Índice invertido término → {fragmento: frecuencia} para puntuar con BM25;
+  los términos se normalizan (minúsculas, sin tildes) y se descartan las
+  palabras vacías más comunes.
+• Índice exacto campo → valor → fragmentos para los campos del `Registro`
+  que se consultan literalmente (año, empresa, ley, artículo, resolución,
+  tribunal): los filtros por año y las referencias de la pregunta se resuelven
+  con búsquedas en diccionario, sin recorrer los documentos. Los años se
+  indexan además en un `IndicePeriodos` para los filtros por intervalo.
+• Se persiste como JSON (escritura atómica) con el texto, los metadatos y las
+  frecuencias de cada fragmento; el índice invertido se reconstruye al abrir.
+"""
+
+import json
+import math
+import os
+import re
+import unicodedata
+from collections import Counter, defaultdict
+
+from langchain.schema import Document
+
+from rag.periodos import IndicePeriodos, intervalo_de
+
+VERSION_LEXICO = 1
+# Parámetros habituales de BM25
+BM25_K1 = 1.5
+BM25_B = 0.75
+CAMPOS_EXACTOS = ("año", "empresa", "ley", "articulo", "resolucion", "tribunal")
+
+TERMINO_RE = re.compile(r"\w+", re.UNICODE)
+RESOLUCION_RE = re.compile(r"\b(\d{2,5}-\d{4})\b")
+ARTICULO_RE = re.compile(r"\bart(?:iculo|\.)?\s*(\d+)", re.IGNORECASE)
+PALABRAS_VACIAS = frozenset(
+    "a al con de del el en entre es la las lo los o para por que se sin su sus un una y".split()
+)
+
+
+def normalizar(texto: str) -> str:
+    """Minúsculas, sin tildes y con espacios simples."""
+    texto = unicodedata.normalize("NFKD", str(texto)).encode("ascii", "ignore").decode("ascii")
+    return " ".join(texto.lower().split())
+
+
+def terminos(texto: str) -> list[str]:
+    return [t for t in TERMINO_RE.findall(normalizar(texto)) if t not in PALABRAS_VACIAS]
+
+
+class IndiceLexico:
+    """Índice BM25 y de campos exactos de una colección."""
+
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        # id -> {"texto", "metadatos", "tf": {término: frecuencia}}
+        self.documentos: dict[str, dict] = {}
+        if os.path.exists(ruta):
+            with open(ruta, encoding="utf-8") as f:
+                datos = json.load(f)
+            if datos.get("version") == VERSION_LEXICO:
+                self.documentos = datos["documentos"]
+        self.invertido: dict[str, dict[str, int]] = defaultdict(dict)
+        self.exactos: dict[str, dict[str, set[str]]] = {campo: defaultdict(set) for campo in CAMPOS_EXACTOS}
+        self.periodos = IndicePeriodos()
+        self.longitudes: dict[str, int] = {}
+        self.longitud_total = 0
+        for id_doc, doc in self.documentos.items():
+            self._indexar(id_doc, doc)
+
+    def __contains__(self, id_doc: str) -> bool:
+        return id_doc in self.documentos
+
+    def __len__(self) -> int:
+        return len(self.documentos)
+
+    def _indexar(self, id_doc: str, doc: dict) -> None:
+        for termino, frecuencia in doc["tf"].items():
+            self.invertido[termino][id_doc] = frecuencia
+        self.longitudes[id_doc] = sum(doc["tf"].values())
+        self.longitud_total += self.longitudes[id_doc]
+        if isinstance(doc["metadatos"].get("año"), int):
+            self.periodos.agregar(id_doc, doc["metadatos"]["año"])
+        for campo in CAMPOS_EXACTOS:
+            valor = doc["metadatos"].get(campo)
+            if valor is not None:
+                self.exactos[campo][normalizar(valor)].add(id_doc)
+
+    def agregar(self, fragmentos: list[tuple[str, Document]]) -> None:
+        """Añade (o reemplaza) fragmentos identificados por su id estable."""
+        for id_doc, chunk in fragmentos:
+            if id_doc in self.documentos:
+                self.eliminar([id_doc])
+            # Los metadatos también puntúan: así "Ley", "Resolución" o la
+            # contraparte cuentan aunque no se repitan en el texto
+            valores = (str(v) for campo, v in chunk.metadata.items() if campo != "fuente")
+            contenido = " ".join([chunk.page_content, *valores])
+            doc = {"texto": chunk.page_content, "metadatos": chunk.metadata, "tf": dict(Counter(terminos(contenido)))}
+            self.documentos[id_doc] = doc
+            self._indexar(id_doc, doc)
+
+    def eliminar(self, ids: list[str]) -> None:
+        for id_doc in ids:
+            doc = self.documentos.pop(id_doc, None)
+            if doc is None:
+                continue
+            for termino in doc["tf"]:
+                self.invertido[termino].pop(id_doc, None)
+                if not self.invertido[termino]:
+                    del self.invertido[termino]
+            self.longitud_total -= self.longitudes.pop(id_doc)
+            if isinstance(doc["metadatos"].get("año"), int):
+                self.periodos.eliminar(id_doc, doc["metadatos"]["año"])
+            for campo in CAMPOS_EXACTOS:
+                valor = doc["metadatos"].get(campo)
+                if valor is not None:
+                    self.exactos[campo][normalizar(valor)].discard(id_doc)
+
+    def guardar(self) -> None:
+        os.makedirs(os.path.dirname(self.ruta) or ".", exist_ok=True)
+        temporal = self.ruta + ".tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump({"version": VERSION_LEXICO, "documentos": self.documentos}, f, ensure_ascii=False)
+        os.replace(temporal, self.ruta)
+
+    def documento(self, id_doc: str) -> Document:
+        doc = self.documentos[id_doc]
+        return Document(page_content=doc["texto"], metadata=doc["metadatos"])
+
+    # ------------------------------------------------------------------
+    # Consulta
+    # ------------------------------------------------------------------
+    def candidatos(self, filtro: dict | None) -> set[str] | None:
+        """
+        Fragmentos que cumplen un filtro de metadatos (misma sintaxis que en
+        Chroma) usando el índice exacto; None si no hay filtro.
+        """
+        if not filtro:
+            return None
+        resultado: set[str] | None = None
+        for campo, condicion in filtro.items():
+            if campo == "$and":
+                partes = [self.candidatos(parte) for parte in condicion]
+            else:
+                if campo not in self.exactos:
+                    raise ValueError(f"Campo sin índice exacto: {campo}")
+                operador, valor = next(iter(condicion.items())) if isinstance(condicion, dict) else ("$eq", condicion)
+                if operador in ("$gte", "$gt", "$lte", "$lt") and campo == "año":
+                    partes = [self.periodos.registros(*intervalo_de(operador, valor))]
+                elif operador in ("$in", "$eq"):
+                    coinciden = set()
+                    for v in (list(valor) if operador == "$in" else [valor]):
+                        coinciden |= self.exactos[campo].get(normalizar(v), set())
+                    partes = [coinciden]
+                else:
+                    raise ValueError(f"Operador de filtro no soportado: {operador}")
+            for parte in partes:
+                if parte is not None:
+                    resultado = parte if resultado is None else resultado & parte
+        return resultado
+
+    def referencias(self, texto: str) -> dict[str, list[str]]:
+        """
+        Valores de campos exactos citados en `texto`: resoluciones ("097-2021"),
+        artículos ("art. 12") y leyes, empresas o tribunales que aparecen
+        literalmente. Se recorre el vocabulario de cada campo, no los documentos.
+        """
+        texto_normalizado = normalizar(texto)
+        encontrados: dict[str, list[str]] = {}
+        resoluciones = [r for r in RESOLUCION_RE.findall(texto_normalizado) if r in self.exactos["resolucion"]]
+        if resoluciones:
+            encontrados["resolucion"] = resoluciones
+        articulos = [a for a in ARTICULO_RE.findall(texto_normalizado) if a in self.exactos["articulo"]]
+        if articulos:
+            encontrados["articulo"] = articulos
+        for campo in ("ley", "empresa", "tribunal"):
+            citados = [v for v, ids in self.exactos[campo].items() if ids and len(v) > 3 and v in texto_normalizado]
+            if citados:
+                encontrados[campo] = citados
+        return encontrados
+
+    def buscar_exacto(self, referencias: dict[str, list[str]], filtro: dict | None = None) -> list[str]:
+        """Ids de los fragmentos que coinciden con alguna referencia y cumplen el filtro."""
+        permitidos = self.candidatos(filtro)
+        ids: set[str] = set()
+        for campo, valores in referencias.items():
+            for valor in valores:
+                ids |= self.exactos[campo].get(normalizar(valor), set())
+        if permitidos is not None:
+            ids &= permitidos
+        return sorted(ids)
+
+    def buscar(self, consulta: str, k: int, filtro: dict | None = None) -> list[tuple[str, float]]:
+        """Top-k (id, puntuación BM25) entre los fragmentos que cumplen el filtro."""
+        if not self.documentos or k <= 0:
+            return []
+        permitidos = self.candidatos(filtro)
+        n = len(self.documentos)
+        media = self.longitud_total / n or 1.0
+        puntuaciones: dict[str, float] = defaultdict(float)
+        for termino in set(terminos(consulta)):
+            apariciones = self.invertido.get(termino)
+            if not apariciones:
+                continue
+            idf = math.log(1 + (n - len(apariciones) + 0.5) / (len(apariciones) + 0.5))
+            for id_doc, tf in apariciones.items():
+                if permitidos is not None and id_doc not in permitidos:
+                    continue
+                longitud = self.longitudes[id_doc]
+                puntuaciones[id_doc] += idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * longitud / media))
+        return sorted(puntuaciones.items(), key=lambda p: p[1], reverse=True)[:k]
@@ -9,93 +9,237 @@ Carga documentos legales en formato segmentado:
     ---FIN---
 
 Para legislación, los segmentos intermedios usan simplemente `---` como separador.
-Cada segmento se convierte en un `Document` con metadatos normalizados.
+Cada segmento se convierte en un `Document` cuyos metadatos son un `Registro`
+con todos los campos del segmento, extraídos en una sola pasada por archivo.
+
+Los archivos se leen y segmentan en paralelo (pool de procesos cuando hay
+muchos) y los documentos se entregan como flujo, archivo por archivo, para que
+la memoria no crezca con el tamaño de `data/`.
 """
 
+import logging
+import os
 import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import List
+from typing import Iterator, List, Sequence, Tuple, TypedDict
 
-from langchain_community.document_loaders import TextLoader
 from langchain.docstore.document import Document
 
+from rag.corpus import Corpus
+
+log = logging.getLogger(__name__)
+
 BASE_DIR = Path("data")
 TIPOS = ["legislacion", "jurisprudencia", "contrato", "estatutos", "libro_contables"]
 
-SEGMENT_RE = re.compile(r"^---(.*?)---$", re.MULTILINE)
+# A partir de cuántos archivos compensa repartir el parseo entre procesos
+UMBRAL_PARALELO = 64
+
+SEGMENT_RE = re.compile(r"^---(.*?)---$")
+CAMPO_RE = re.compile(r"^\s*([^:\[\]]+?)\s*:\s*(.*?)\s*$")
 
 
-def _segmentar_contenido(texto: str) -> List[str]:
+class Registro(TypedDict, total=False):
     """
-    Divide el texto en segmentos delimitados por líneas '---…---'.
-    Para legislación, los segmentos internos también están separados por '---'.
+    Campos estructurados de un segmento. Viaja como metadatos del `Document`
+    (y de sus fragmentos), de modo que las etapas posteriores no vuelven a
+    parsear `page_content`.
+    """
+    tipo: str
+    fuente: str
+    año: int
+    mes: str
+    empresa: str
+    categoria: str
+    monto_crc: int
+    duracion: str
+    pago: str
+    propiedad: str
+    confidencialidad: str
+    alcance: str
+    tribunal: str
+    resolucion: str
+    tema: str
+    jurisprudencia_aplicada: str
+    ley: str
+    articulo: str
+    norma_aplicada: str
+    resumen: str
+
+
+# Clave del archivo (en minúsculas) -> (campo del registro, conversión)
+_CAMPOS = {
+    "año": ("año", int),
+    "ano": ("año", int),
+    "year": ("año", int),
+    "mes": ("mes", str),
+    "empresa": ("empresa", str),
+    "empresa contraparte": ("empresa", str),
+    # "Tipo" en un contrato es su categoría; `tipo` ya identifica la colección
+    "tipo": ("categoria", str),
+    "monto_crc": ("monto_crc", int),
+    "monto": ("monto_crc", int),
+    "duración": ("duracion", str),
+    "duracion": ("duracion", str),
+    "pago": ("pago", str),
+    "propiedad": ("propiedad", str),
+    "confidencialidad": ("confidencialidad", str),
+    "alcance": ("alcance", str),
+    "tribunal": ("tribunal", str),
+    "resolución": ("resolucion", str),
+    "resolucion": ("resolucion", str),
+    "tema": ("tema", str),
+    "jurisprudencia_aplicada": ("jurisprudencia_aplicada", str),
+    "ley": ("ley", str),
+    "artículo": ("articulo", str),
+    "articulo": ("articulo", str),
+    "norma_aplicada": ("norma_aplicada", str),
+    "resumen": ("resumen", str),
+}
+
+
+def _asignar_campo(registro: Registro, linea: str) -> None:
+    """Incorpora al registro el campo `clave: valor` de la línea, si lo hay."""
+    m = CAMPO_RE.match(linea)
+    if not m:
+        return
+    campo = _CAMPOS.get(m.group(1).lower())
+    if campo is None or campo[0] in registro:
+        return
+    nombre, conversion = campo
+    valor = m.group(2)
+    if conversion is int:
+        # Enteros para filtrar por periodo y agregar montos; si el valor no es
+        # numérico se conserva el texto original
+        digitos = valor.replace(",", "").replace(".", "").strip()
+        registro[nombre] = int(digitos) if digitos.isdigit() else valor
+    else:
+        registro[nombre] = valor
+
+
+def parsear_segmentos(texto: str, tipo: str) -> List[Tuple[str, Registro]]:
+    """
+    Recorre el texto una sola vez: detecta los marcadores '---…---', acumula
+    las líneas de cada segmento y extrae sus campos en la misma pasada.
+    El texto previo al primer marcador se descarta; si no hay marcadores, el
+    archivo completo es un único segmento.
 
-    Retorna una lista de segmentos (cadenas) sin los marcadores.
+    Retorna tuplas (texto del segmento sin marcadores, registro).
     """
-    bloques = []
-    marcas = [m for m in SEGMENT_RE.finditer(texto)]
-    if not marcas:
-        # No hay separadores -> texto completo como un bloque
-        return [texto.strip()]
+    segmentos: List[Tuple[str, Registro]] = []
+    lineas: List[str] = []
+    registro: Registro = {"tipo": tipo}
+    hay_marcas = False
 
-    for i, match in enumerate(marcas):
-        start = match.end()
-        end = marcas[i + 1].start() if i + 1 < len(marcas) else len(texto)
-        segmento = texto[start:end].strip()
+    def cerrar() -> None:
+        segmento = "\n".join(lineas).strip()
         if segmento and segmento.upper() != "FIN":
-            bloques.append(segmento)
-    return bloques
+            segmentos.append((segmento, registro))
+
+    for linea in texto.splitlines():
+        if SEGMENT_RE.match(linea):
+            if hay_marcas:
+                cerrar()
+            hay_marcas = True
+            lineas = []
+            registro = {"tipo": tipo}
+            continue
+        lineas.append(linea)
+        _asignar_campo(registro, linea)
+    cerrar()
+    return segmentos
 
 
-def _parse_metadata(segmento: str, tipo: str) -> dict:
+def _parse_metadata(segmento: str, tipo: str) -> Registro:
     """
-    Extrae metadatos simples (año, mes, etc.) del segmento.
+    Extrae el registro estructurado (año, mes, empresa, ley, etc.) de un
+    segmento ya aislado. El año y el monto se guardan como enteros.
     """
-    meta = {"tipo": tipo}
+    registro: Registro = {"tipo": tipo}
     for linea in segmento.splitlines():
-        if ":" not in linea:
-            continue
-        clave, valor = [s.strip() for s in linea.split(":", 1)]
-        clave_lower = clave.lower()
-        if clave_lower in {"año", "ano", "year"}:
-            meta["año"] = valor
-        elif clave_lower in {"mes"}:
-            meta["mes"] = valor
-        elif clave_lower in {"empresa"}:
-            meta["empresa"] = valor
-        elif clave_lower in {"ley"}:
-            meta["ley"] = valor
-        elif clave_lower in {"artículo", "articulo"}:
-            meta["articulo"] = valor
-        elif clave_lower in {"resolución", "resolucion"}:
-            meta["resolucion"] = valor
-    return meta
+        _asignar_campo(registro, linea)
+    return registro
 
 
-def cargar_documentos() -> List[Document]:
+def _procesar_archivo(archivo: Path, tipo: str) -> List[Tuple[str, Registro]]:
     """
-    Recorre los directorios en `data/` y carga cada archivo .txt,
-    dividiéndolo según los marcadores '---…---'. Devuelve una lista
-    de `Document` para usar en la fase de vectorización.
+    Lee un archivo completo con una sola lectura directa y lo divide en
+    segmentos. Devuelve tuplas (texto, registro) para que sean baratas de
+    transferir entre procesos.
     """
-    documentos: List[Document] = []
+    texto = archivo.read_bytes().decode("utf-8")
+    segmentos = parsear_segmentos(texto, tipo)
+    for _, registro in segmentos:
+        registro["fuente"] = str(archivo)
+    return segmentos
 
+
+def listar_archivos(base_dir: Path = BASE_DIR) -> List[Tuple[Path, str]]:
+    """Archivos `.txt` de cada tipo en `base_dir`, como tuplas (ruta, tipo)."""
+    archivos = []
     for tipo in TIPOS:
-        ruta = BASE_DIR / tipo
+        ruta = base_dir / tipo
         if not ruta.exists():
             continue
-        for archivo in ruta.glob("*.txt"):
-            # Cargar texto completo
-            loader = TextLoader(str(archivo))
-            raw_docs = loader.load()  # regresa una lista con un Document
-            if not raw_docs:
-                continue
-            texto = raw_docs[0].page_content
-            # Dividir en segmentos
-            segmentos = _segmentar_contenido(texto)
-            for seg in segmentos:
-                meta = _parse_metadata(seg, tipo)
-                documentos.append(Document(page_content=seg.strip(), metadata=meta))
-
-    print(f"[LOADER] Documentos cargados: {len(documentos)}")
-    return documentos
+        archivos.extend((archivo, tipo) for archivo in sorted(ruta.glob("*.txt")))
+    return archivos
+
+
+def iterar_documentos(base_dir: Path = BASE_DIR, max_workers: int | None = None) -> Iterator[Document]:
+    """
+    Recorre los directorios en `data/` y entrega un `Document` por segmento a
+    medida que se procesa cada archivo, en orden determinista.
+    """
+    return iterar_archivos(listar_archivos(base_dir), max_workers)
+
+
+def iterar_archivos(archivos: Sequence[Tuple[Path, str]], max_workers: int | None = None) -> Iterator[Document]:
+    """
+    Entrega un `Document` por segmento de los archivos indicados (ruta, tipo).
+
+    Con pocos archivos se procesa en el propio proceso; con muchos se usa un
+    pool de procesos con una ventana acotada de archivos en vuelo.
+    """
+    total = 0
+
+    if len(archivos) < UMBRAL_PARALELO:
+        for archivo, tipo in archivos:
+            for texto, meta in _procesar_archivo(archivo, tipo):
+                total += 1
+                yield Document(page_content=texto, metadata=meta)
+    else:
+        max_workers = max_workers or os.cpu_count() or 1
+        ventana = max_workers * 4
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            pendientes = deque()
+            for archivo, tipo in archivos:
+                pendientes.append(pool.submit(_procesar_archivo, archivo, tipo))
+                if len(pendientes) < ventana:
+                    continue
+                for texto, meta in pendientes.popleft().result():
+                    total += 1
+                    yield Document(page_content=texto, metadata=meta)
+            while pendientes:
+                for texto, meta in pendientes.popleft().result():
+                    total += 1
+                    yield Document(page_content=texto, metadata=meta)
+
+    log.info("Documentos cargados: %d", total)
+
+
+def cargar_documentos() -> List[Document]:
+    """
+    Carga todos los segmentos de `data/` en una lista. Para corpus grandes es
+    preferible consumir `iterar_documentos()` directamente o usar `cargar_corpus`.
+    """
+    return list(iterar_documentos())
+
+
+def cargar_corpus(base_dir: Path = BASE_DIR) -> Corpus:
+    """
+    Carga todos los segmentos de `data/` en un `rag.corpus.Corpus`: columnas
+    compactas con cadenas internadas en lugar de un `Document` por segmento.
+    """
+    return Corpus(iterar_documentos(base_dir))
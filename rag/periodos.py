@@ -0,0 +1,76 @@
+"""
+rag/periodos.py
+
+Consultas por intervalo de años, compartidas por el índice y el redactor:
+
+• `filtro_periodo` expresa un periodo como rango (`$gte` / `$lte`) sobre el
+  campo `año` de los metadatos; lo entienden Chroma, `IndiceNumpy` y el índice
+  léxico, así que un periodo amplio (2000-2025) no genera una lista de años.
+• `en_periodo` comprueba un registro ya recuperado a partir de su año entero,
+  sin buscar el año como texto dentro del contenido.
+• `IndicePeriodos` (año → registros, con los años ordenados) se mantiene
+  durante la ingesta dentro del índice léxico y resuelve un intervalo con dos
+  búsquedas binarias.
+"""
+
+from bisect import bisect_left, bisect_right, insort
+
+
+def filtro_periodo(anio_inicio: int, anio_fin: int) -> dict:
+    """Filtro de metadatos (sintaxis de Chroma) para los años del intervalo cerrado."""
+    if anio_inicio == anio_fin:
+        return {"año": anio_inicio}
+    return {"$and": [{"año": {"$gte": anio_inicio}}, {"año": {"$lte": anio_fin}}]}
+
+
+def en_periodo(registro: dict, anio_inicio: int, anio_fin: int) -> bool:
+    """True si el año del registro está en el intervalo (False si no tiene año)."""
+    anio = registro.get("año")
+    return isinstance(anio, int) and anio_inicio <= anio <= anio_fin
+
+
+def intervalo_de(operador: str, valor) -> tuple[float, float]:
+    """Intervalo cerrado de años equivalente a una condición de filtro."""
+    if operador == "$gte":
+        return valor, float("inf")
+    if operador == "$gt":
+        return valor + 1, float("inf")
+    if operador == "$lte":
+        return float("-inf"), valor
+    if operador == "$lt":
+        return float("-inf"), valor - 1
+    raise ValueError(f"Operador de intervalo no soportado: {operador}")
+
+
+class IndicePeriodos:
+    """Registros por año con los años ordenados para consultar intervalos."""
+
+    def __init__(self):
+        self._ids: dict[int, set[str]] = {}
+        self._anios: list[int] = []
+
+    def agregar(self, id_registro: str, anio: int) -> None:
+        if anio not in self._ids:
+            self._ids[anio] = set()
+            insort(self._anios, anio)
+        self._ids[anio].add(id_registro)
+
+    def eliminar(self, id_registro: str, anio: int) -> None:
+        ids = self._ids.get(anio)
+        if ids is None:
+            return
+        ids.discard(id_registro)
+        if not ids:
+            del self._ids[anio]
+            self._anios.remove(anio)
+
+    def anios(self, anio_inicio: float = float("-inf"), anio_fin: float = float("inf")) -> list[int]:
+        """Años con registros dentro del intervalo cerrado."""
+        return self._anios[bisect_left(self._anios, anio_inicio):bisect_right(self._anios, anio_fin)]
+
+    def registros(self, anio_inicio: float = float("-inf"), anio_fin: float = float("inf")) -> set[str]:
+        """Registros de los años del intervalo cerrado."""
+        resultado: set[str] = set()
+        for anio in self.anios(anio_inicio, anio_fin):
+            resultado |= self._ids[anio]
+        return resultado
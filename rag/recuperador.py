@@ -0,0 +1,139 @@
+"""
+rag/recuperador.py
+
+Recuperación concurrente sobre varias colecciones:
+
+• Los textos de consulta de todas las colecciones se vectorizan en una sola
+  petición de embeddings.
+• Las búsquedas por vector se lanzan en paralelo en un pool de hilos, de modo
+  que la latencia total se aproxima a la de la colección más lenta.
+• Cada búsqueda registra un tramo "similarity_search" por colección.
+• En las colecciones híbridas (`ColeccionHibrida`) los resultados vectoriales
+  se combinan con los de BM25 (`rag/lexico.py`) mediante Reciprocal Rank
+  Fusion, y los fragmentos que coinciden exactamente con una resolución, un
+  artículo, una ley o una empresa citada en la pregunta van primero.
+• El índice léxico de una `ColeccionHibrida` se carga al abrirla y no cambia
+  después: sus ids son la instantánea de la colección. Los vectores que la
+  vigilancia de `data/` añade o retira más tarde no alteran las consultas
+  hasta que se abre una instantánea nueva.
+"""
+
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain.schema import Document
+
+from rag.lexico import IndiceLexico
+from trazas import en_contexto, tramo
+
+# Constante de Reciprocal Rank Fusion: 1 / (RRF_K + posición)
+RRF_K = 60
+# Candidatos por método antes de fusionar, como múltiplo de k
+FACTOR_CANDIDATOS = 2
+
+
+def id_fragmento(chunk: Document) -> str:
+    """
+    Identificador estable de un fragmento: hash SHA-256 de sus metadatos y su
+    contenido. Cualquier cambio en uno u otro produce un identificador distinto.
+    """
+    h = hashlib.sha256()
+    h.update(json.dumps(chunk.metadata, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    h.update(b"\0")
+    h.update(chunk.page_content.encode("utf-8"))
+    return h.hexdigest()
+
+
+def fusionar(rankings: list[list[str]], k: int) -> list[str]:
+    """Reciprocal Rank Fusion de varias listas de ids ordenadas por relevancia."""
+    puntuaciones: dict[str, float] = {}
+    for ranking in rankings:
+        for posicion, id_doc in enumerate(ranking):
+            puntuaciones[id_doc] = puntuaciones.get(id_doc, 0.0) + 1.0 / (RRF_K + posicion + 1)
+    return sorted(puntuaciones, key=puntuaciones.get, reverse=True)[:k]
+
+
+class ColeccionHibrida:
+    """
+    Colección vectorial (Chroma o `IndiceNumpy`) acompañada de su índice
+    léxico. Delega en la colección todo lo que no es búsqueda híbrida.
+    """
+
+    def __init__(self, vectorial, lexico: IndiceLexico):
+        self.vectorial = vectorial
+        self.lexico = lexico
+
+    def __getattr__(self, nombre):
+        return getattr(self.vectorial, nombre)
+
+    def busqueda_hibrida(
+        self,
+        consulta: str,
+        vector: list[float],
+        k: int,
+        filtro: dict | None = None,
+        referencias: dict[str, list[str]] | None = None,
+    ) -> list[Document]:
+        candidatos = k * FACTOR_CANDIDATOS
+        vectoriales = self.vectorial.similarity_search_by_vector(vector, k=candidatos, filter=filtro)
+        documentos = {id_fragmento(d): d for d in vectoriales}
+        if len(self.lexico):
+            # Solo los fragmentos de la instantánea (ver docstring del módulo)
+            documentos = {i: d for i, d in documentos.items() if i in self.lexico}
+        lexicos = [id_doc for id_doc, _ in self.lexico.buscar(consulta, candidatos, filtro)]
+        exactos = self.lexico.buscar_exacto(referencias, filtro) if referencias else []
+
+        orden = exactos[:k] + [i for i in fusionar([list(documentos), lexicos], k) if i not in exactos]
+        return [documentos[i] if i in documentos else self.lexico.documento(i) for i in orden[:k]]
+
+
+def recuperar_contexto(
+    vectorstores: dict,
+    consultas: dict[str, tuple[str, int]],
+    filtro: dict | None = None,
+    pregunta: str = "",
+) -> dict[str, list[Document]]:
+    """
+    Ejecuta las consultas de cada colección y devuelve los documentos
+    recuperados, con su `Registro` estructurado en los metadatos.
+
+    Args:
+        vectorstores: Colecciones abiertas, por nombre.
+        consultas: Por colección, el texto de consulta y el número de resultados (k).
+        filtro: Filtro de metadatos de Chroma aplicado a todas las búsquedas.
+        pregunta: Texto del usuario. En las colecciones híbridas se suma a la
+            consulta léxica y aporta las referencias exactas.
+
+    Returns:
+        Por colección, la lista de documentos recuperados (vacía si la
+        colección no existe).
+    """
+    contexto: dict[str, list[Document]] = {nombre: [] for nombre in consultas}
+    activas = [nombre for nombre in consultas if nombre in vectorstores]
+    if not activas:
+        return contexto
+
+    # Todas las colecciones comparten el mismo modelo de embeddings
+    embeddings = vectorstores[activas[0]].embeddings
+    vectores = embeddings.embed_documents([consultas[nombre][0] for nombre in activas])
+
+    def buscar(nombre: str, vector: list[float]) -> list[Document]:
+        k = consultas[nombre][1]
+        coleccion = vectorstores[nombre]
+        with tramo("similarity_search", coleccion=nombre, k=k) as medida:
+            if isinstance(coleccion, ColeccionHibrida):
+                referencias = coleccion.lexico.referencias(pregunta) if pregunta else None
+                consulta = f"{consultas[nombre][0]} {pregunta}".strip()
+                docs = coleccion.busqueda_hibrida(consulta, vector, k, filtro, referencias)
+                medida["exactos"] = sum(map(len, (referencias or {}).values()))
+            else:
+                docs = coleccion.similarity_search_by_vector(vector, k=k, filter=filtro)
+            medida["resultados"] = len(docs)
+        return docs
+
+    with ThreadPoolExecutor(max_workers=len(activas)) as pool:
+        futuros = {nombre: pool.submit(en_contexto(buscar), nombre, vector) for nombre, vector in zip(activas, vectores)}
+        for nombre, futuro in futuros.items():
+            contexto[nombre] = futuro.result()
+    return contexto
@@ -2,59 +2,151 @@
 rag/splitter.py
 
 Divide los documentos cargados en fragmentos semánticos únicamente cuando su
-longitud supera el `chunk_size` especificado. Esto evita sobre‑fragmentar
+longitud en tokens supera el `chunk_size` especificado. Esto evita sobre‑fragmentar
 documentos cortos (por ejemplo, un solo artículo de ley) y reduce llamadas
 innecesarias al modelo en la fase de RAG.
 """
 
-from typing import List
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Iterable, Iterator, List
 
+import tiktoken
 from langchain.schema import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
+from trazas import tramo
+
+log = logging.getLogger(__name__)
+
 DEFAULT_CHUNK_SIZE = 600
 DEFAULT_CHUNK_OVERLAP = 80
+ENCODING_NAME = "cl100k_base"
+# Documentos que se tokenizan juntos con `encode_batch`
+TAMANO_BLOQUE = 512
+# A partir de cuántos documentos largos por bloque se divide en paralelo
+UMBRAL_PARALELO = 32
 
 
-def _needs_split(text: str, threshold: int) -> bool:
-    """True si el texto supera el umbral y requiere división."""
-    return len(text) > threshold
+@lru_cache(maxsize=1)
+def obtener_codificador() -> tiktoken.Encoding:
+    """Codificador de tokens compartido por el splitter y la ingesta."""
+    return tiktoken.get_encoding(ENCODING_NAME)
 
 
-def dividir_documentos(
-    documentos: List[Document],
+@lru_cache(maxsize=8)
+def _obtener_splitter(chunk_size: int, chunk_overlap: int) -> RecursiveCharacterTextSplitter:
+    """Splitter reutilizable por configuración (se construye una sola vez)."""
+    return RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+        encoding_name=ENCODING_NAME,
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+    )
+
+
+@lru_cache(maxsize=1)
+def _obtener_pool() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=os.cpu_count() or 1)
+
+
+def contar_tokens(textos: List[str]) -> List[int]:
+    """Cuenta los tokens de varios textos en una sola llamada (`encode_batch`)."""
+    if not textos:
+        return []
+    return [len(t) for t in obtener_codificador().encode_batch(textos, disallowed_special=())]
+
+
+def _needs_split(n_tokens: int, threshold: int) -> bool:
+    """True si el número de tokens supera el umbral y requiere división."""
+    return n_tokens > threshold
+
+
+def _dividir(doc: Document, splitter: RecursiveCharacterTextSplitter) -> List[Document]:
+    # Mantener metadatos en cada fragmento
+    sub_docs = splitter.split_documents([doc])
+    for sub in sub_docs:
+        sub.metadata.update(doc.metadata)
+    return sub_docs
+
+
+def _procesar_bloque(bloque: List[Document], chunk_size: int, chunk_overlap: int) -> Iterator[Document]:
+    # cl100k_base es un BPE sobre bytes: cada token cubre al menos un byte
+    # UTF-8, así que un texto nunca tiene más tokens que bytes (sí puede tener
+    # más que caracteres: '🙂🙂🙂' son 3 caracteres y 6 tokens). Solo se
+    # tokenizan los que superan `chunk_size` bytes, todos en un único lote
+    candidatos = [i for i, doc in enumerate(bloque) if len(doc.page_content.encode("utf-8")) > chunk_size]
+    tokens = contar_tokens([bloque[i].page_content for i in candidatos])
+    a_dividir = [i for i, n in zip(candidatos, tokens) if _needs_split(n, chunk_size)]
+
+    splitter = _obtener_splitter(chunk_size, chunk_overlap)
+    if len(a_dividir) >= UMBRAL_PARALELO:
+        resultados = _obtener_pool().map(lambda i: _dividir(bloque[i], splitter), a_dividir)
+    else:
+        resultados = (_dividir(bloque[i], splitter) for i in a_dividir)
+    divididos = dict(zip(a_dividir, resultados))
+
+    for i, doc in enumerate(bloque):
+        if i in divididos:
+            yield from divididos[i]
+        else:
+            yield doc
+
+
+def iterar_fragmentos(
+    documentos: Iterable[Document],
     chunk_size: int = DEFAULT_CHUNK_SIZE,
     chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
-) -> List[Document]:
+) -> Iterator[Document]:
     """
-    Divide los documentos en fragmentos solo cuando sea necesario.
+    Versión en flujo de `dividir_documentos`: consume los documentos por
+    bloques (por ejemplo desde `rag.loader.iterar_documentos`) y entrega sus
+    fragmentos en el mismo orden.
 
-    • Para documentos cortos (<= chunk_size) devuelve el documento tal cual.
-    • Para documentos largos usa RecursiveCharacterTextSplitter respetando solapamiento.
+    • Para documentos cortos (<= chunk_size tokens) devuelve el documento tal cual.
+    • Para documentos largos usa RecursiveCharacterTextSplitter respetando
+      solapamiento; con muchos documentos largos la división se reparte en un
+      pool de hilos.
     • Conservar metadatos originales en los fragmentos resultantes.
     """
-    if not documentos:
-        print("No hay documentos para dividir.")
-        return []
+    def dividir_bloque(bloque: List[Document]) -> List[Document]:
+        with tramo("dividir", documentos=len(bloque)) as t:
+            fragmentos = list(_procesar_bloque(bloque, chunk_size, chunk_overlap))
+            t["fragmentos"] = len(fragmentos)
+        return fragmentos
 
-    print(f"Total documentos recibidos: {len(documentos)}")
+    recibidos = 0
+    generados = 0
+    bloque: List[Document] = []
+    for doc in documentos:
+        recibidos += 1
+        bloque.append(doc)
+        if len(bloque) < TAMANO_BLOQUE:
+            continue
+        fragmentos = dividir_bloque(bloque)
+        generados += len(fragmentos)
+        yield from fragmentos
+        bloque = []
+    if bloque:
+        fragmentos = dividir_bloque(bloque)
+        generados += len(fragmentos)
+        yield from fragmentos
 
-    splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-        encoding_name="cl100k_base",
-        chunk_size=chunk_size,
-        chunk_overlap=chunk_overlap,
-    )
+    log.info("Documentos recibidos: %d; fragmentos generados: %d", recibidos, generados)
 
-    chunks: List[Document] = []
-    for doc in documentos:
-        if _needs_split(doc.page_content, chunk_size):
-            # Mantener metadatos en cada fragmento
-            sub_docs = splitter.split_documents([doc])
-            for sub in sub_docs:
-                sub.metadata.update(doc.metadata)
-            chunks.extend(sub_docs)
-        else:
-            chunks.append(doc)
 
-    print(f"Fragmentos generados: {len(chunks)}")
-    return chunks
\ No newline at end of file
+def dividir_documentos(
+    documentos: List[Document],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+) -> List[Document]:
+    """
+    Divide los documentos en fragmentos solo cuando sea necesario y devuelve
+    la lista completa (ver `iterar_fragmentos`).
+    """
+    if not documentos:
+        log.info("No hay documentos para dividir.")
+        return []
+
+    return list(iterar_fragmentos(documentos, chunk_size, chunk_overlap))
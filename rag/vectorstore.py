@@ -1,69 +1,369 @@
-from langchain_chroma import Chroma
-from langchain_openai import OpenAIEmbeddings
-from rag.loader import cargar_documentos
-from rag.splitter import dividir_documentos
+"""
+rag/vectorstore.py
+
+Indexación incremental de los fragmentos en colecciones persistentes:
+
+• Cada fragmento recibe un identificador estable (hash SHA-256 de su tipo,
+  metadatos y contenido).
+• Un manifiesto junto a las colecciones registra los identificadores ya
+  indexados en cada colección.
+• Solo se generan embeddings para fragmentos nuevos o modificados y se
+  eliminan los vectores de los segmentos que ya no existen en `data/`.
+• En la ruta de consulta las colecciones existentes se abren sin reindexar.
+• `ALIE_INDICE` elige el almacén: "chroma" (por defecto, `rag/chroma_db`) o
+  "numpy" (`rag/numpy_db`, ver `rag/indice_numpy.py`). Cada almacén tiene su
+  propio manifiesto, así que cambiar de uno a otro no corrompe el índice.
+  Con "numpy", `ALIE_CUANTIZACION=int8` busca sobre una copia int8 de los
+  vectores y reordena los mejores candidatos en float32.
+• Junto a las colecciones se mantiene un índice léxico BM25 por colección
+  (`lexico/<colección>.json`, ver `rag/lexico.py`), actualizado con los mismos
+  identificadores; si falta o está incompleto se completa sin pedir embeddings.
+  Las colecciones se abren como `ColeccionHibrida` (búsqueda vectorial + BM25).
+• `actualizar_archivos` aplica la misma sincronización a una lista de
+  archivos (los que detecta `rag/vigilancia.py`): solo se vuelven a parsear
+  esos archivos y solo se consideran eliminables sus fragmentos. Los vectores
+  retirados se borran después, con `eliminar_fragmentos`, cuando ninguna
+  consulta lee ya la instantánea anterior.
+• En la misma pasada de carga se mantiene la tabla de montos de contratos y
+  libros contables (`analitica.npz`, ver `rag/analitica.py`) con la que el
+  informe calcula sus cifras exactas.
+"""
+
+import json
+import logging
 import os
+import sys
+import threading
+from pathlib import Path
+from typing import Iterable
+
+from langchain.schema import Document
+
+from backends import obtener_embeddings_base
+from rag.analitica import TablaMontos, abrir_tabla
+from rag.cache import EmbeddingsCacheadas
+from rag.corpus import Corpus
+from rag.ingesta import ingerir
+from rag.lexico import IndiceLexico
+from rag.loader import TIPOS, iterar_archivos, iterar_documentos
+from rag.recuperador import ColeccionHibrida, id_fragmento
+from rag.splitter import iterar_fragmentos
+from trazas import medir_iterador, tramo
+
+log = logging.getLogger(__name__)
 
 CHROMA_PATH = "rag/chroma_db"
+NUMPY_PATH = "rag/numpy_db"
+ARCHIVO_MANIFIESTO = "manifiesto.json"
+ARCHIVO_ANALITICA = "analitica.npz"
+VERSION_MANIFIESTO = 1
+MODELO_EMBEDDINGS = "text-embedding-ada-002"
+
+# Colección de destino -> tipos de documento que la alimentan
+COLECCIONES = {
+    "contrato": ("contrato",),
+    "jurisprudencia": ("jurisprudencia",),
+    "finanzas": ("finanzas", "libro_contables"),
+    "estatutos": ("estatutos",),
+    "legislacion": ("legislacion",),
+}
+
+# Serializa las escrituras del índice (precalentado y vigilancia en paralelo)
+_escritura = threading.RLock()
+
+
+def indice_activo() -> str:
+    """Almacén vectorial configurado con `ALIE_INDICE` ("chroma" o "numpy")."""
+    indice = os.getenv("ALIE_INDICE", "chroma").strip().lower()
+    if indice not in ("chroma", "numpy"):
+        raise ValueError(f"ALIE_INDICE desconocido: {indice!r} (use 'chroma' o 'numpy').")
+    return indice
+
+
+def cuantizacion_activa() -> str | None:
+    """Cuantización de `IndiceNumpy` configurada con `ALIE_CUANTIZACION` (None o "int8")."""
+    cuantizacion = os.getenv("ALIE_CUANTIZACION", "").strip().lower() or None
+    if cuantizacion not in (None, "int8"):
+        raise ValueError(f"ALIE_CUANTIZACION desconocida: {cuantizacion!r} (use 'int8' o nada).")
+    return cuantizacion
+
+
+def _ruta_indice() -> str:
+    return NUMPY_PATH if indice_activo() == "numpy" else CHROMA_PATH
+
+
+def _ruta_manifiesto() -> str:
+    return os.path.join(_ruta_indice(), ARCHIVO_MANIFIESTO)
+
+
+def _ruta_analitica() -> str:
+    return os.path.join(_ruta_indice(), ARCHIVO_ANALITICA)
+
+
+def _ruta_lexico(coleccion: str) -> str:
+    return os.path.join(_ruta_indice(), "lexico", f"{coleccion}.json")
+
+
+def _coleccion_de(tipo: str | None) -> str | None:
+    """Devuelve la colección en la que se indexa un tipo de documento."""
+    for coleccion, tipos in COLECCIONES.items():
+        if tipo in tipos:
+            return coleccion
+    return None
+
+
+def _cargar_manifiesto() -> dict | None:
+    """
+    Lee el manifiesto de indexación. Devuelve None si no existe o si fue escrito
+    por una versión incompatible (las colecciones deben reconstruirse).
+    """
+    ruta = _ruta_manifiesto()
+    if not os.path.exists(ruta):
+        return None
+    try:
+        with open(ruta, encoding="utf-8") as f:
+            manifiesto = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    if manifiesto.get("version") != VERSION_MANIFIESTO:
+        return None
+    return manifiesto
+
+
+def _guardar_manifiesto(manifiesto: dict) -> None:
+    """Escribe el manifiesto de forma atómica para no dejarlo a medias."""
+    ruta = _ruta_manifiesto()
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    temporal = ruta + ".tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(manifiesto, f, ensure_ascii=False, indent=1)
+    os.replace(temporal, ruta)
+
 
-def construir_vectorstore(anios_filtrados: list[int] = None):
-    print("[VECTORSTORE] Iniciando carga y división de documentos...")
-    documentos = cargar_documentos()
-    chunks = dividir_documentos(documentos)
-
-    # Separar por tipo
-    contratos = [c for c in chunks if c.metadata.get("tipo") == "contrato"]
-    jurisprudencia = [c for c in chunks if c.metadata.get("tipo") == "jurisprudencia"]
-    finanzas = [c for c in chunks if c.metadata.get("tipo") in ("finanzas", "libro_contables")]
-    estatutos = [c for c in chunks if c.metadata.get("tipo") == "estatutos"]
-    legislacion = [c for c in chunks if c.metadata.get("tipo") == "legislacion"]
-
-    def filtrar_anios(lista):
-        if not anios_filtrados:
-            return lista
-        # Mantener solo los chunks cuyo metadato "año" (o "Año") coincida, manejando espacios y mayúsculas/minúsculas
-        return [
-            chunk
-            for chunk in lista
-            if (
-                (a := chunk.metadata.get("año") or chunk.metadata.get("Año"))
-                and str(a).strip().isdigit()
-                and int(str(a).strip()) in anios_filtrados
-            )
+def obtener_embeddings() -> EmbeddingsCacheadas:
+    """
+    Crea el modelo de embeddings envuelto en la caché persistente, de modo que
+    los textos ya vistos (fragmentos o consultas) no se vuelvan a enviar a la API.
+    Con `ALIE_BACKEND=local` se usan embeddings por hashing (ver `backends`).
+    """
+    return EmbeddingsCacheadas(obtener_embeddings_base(MODELO_EMBEDDINGS))
+
+
+def _abrir_coleccion(coleccion: str, embeddings):
+    directorio = f"{_ruta_indice()}/{coleccion}"
+    if indice_activo() == "numpy":
+        from rag.indice_numpy import IndiceNumpy
+
+        return IndiceNumpy(directorio, embedding_function=embeddings, cuantizacion=cuantizacion_activa())
+    from langchain_chroma import Chroma
+
+    return Chroma(persist_directory=directorio, embedding_function=embeddings)
+
+
+def _preparar_manifiesto() -> dict:
+    """Manifiesto vigente; si falta o es incompatible, vacía las colecciones."""
+    manifiesto = _cargar_manifiesto()
+    if manifiesto is None:
+        # Sin manifiesto no se sabe qué contienen las colecciones: se vacían
+        for coleccion in COLECCIONES:
+            if os.path.isdir(f"{_ruta_indice()}/{coleccion}"):
+                _abrir_coleccion(coleccion, None).delete_collection()
+            if os.path.exists(_ruta_lexico(coleccion)):
+                os.remove(_ruta_lexico(coleccion))
+        manifiesto = {"version": VERSION_MANIFIESTO, "colecciones": {}}
+        _guardar_manifiesto(manifiesto)
+    return manifiesto
+
+
+def actualizar_indice(embeddings=None) -> dict[str, dict[str, int]]:
+    """
+    Sincroniza las colecciones persistidas con el contenido actual de `data/`.
+
+    Returns:
+        Por colección, cuántos fragmentos se agregaron y cuántos se eliminaron.
+    """
+    with _escritura:
+        cambios, _ = _sincronizar(_preparar_manifiesto(), iterar_documentos(), embeddings)
+        if indice_activo() == "numpy" and cuantizacion_activa():
+            # Índices creados sin cuantizar: la copia int8 se escribe aquí, no al abrir
+            for coleccion in COLECCIONES:
+                if os.path.isdir(f"{_ruta_indice()}/{coleccion}"):
+                    _abrir_coleccion(coleccion, embeddings).cuantizar()
+    return cambios
+
+
+def actualizar_archivos(
+    rutas: Iterable[str], embeddings=None
+) -> tuple[dict[str, dict[str, int]], dict[str, list[str]]]:
+    """
+    Sincroniza solo los archivos indicados (añadidos, modificados o
+    eliminados de `data/`): el resto del índice no se vuelve a parsear.
+
+    Los fragmentos nuevos se indexan de inmediato y los que desaparecen se
+    quitan del índice léxico, pero sus vectores se conservan hasta llamar a
+    `eliminar_fragmentos`, para no alterar las consultas en curso.
+
+    Returns:
+        Los cambios por colección y los ids retirados pendientes de borrar.
+    """
+    fuentes = {str(Path(ruta)) for ruta in rutas}
+    archivos = [
+        (Path(ruta), Path(ruta).parent.name)
+        for ruta in sorted(fuentes)
+        if Path(ruta).parent.name in TIPOS and Path(ruta).is_file()
+    ]
+    with _escritura:
+        return _sincronizar(
+            _preparar_manifiesto(), iterar_archivos(archivos), embeddings, fuentes=fuentes, diferir_eliminaciones=True
+        )
+
+
+def eliminar_fragmentos(retirados: dict[str, list[str]], embeddings=None) -> None:
+    """Borra de las colecciones y del manifiesto los ids retirados por `actualizar_archivos`."""
+    with _escritura:
+        manifiesto = _cargar_manifiesto()
+        if manifiesto is None:
+            return
+        for coleccion, ids in retirados.items():
+            if not ids:
+                continue
+            _abrir_coleccion(coleccion, embeddings).delete(ids=ids)
+            confirmados = manifiesto["colecciones"].get(coleccion, {})
+            for i in ids:
+                confirmados.pop(i, None)
+        _guardar_manifiesto(manifiesto)
+
+
+def _sincronizar(
+    manifiesto: dict,
+    documentos: Iterable[Document],
+    embeddings=None,
+    fuentes: set[str] | None = None,
+    diferir_eliminaciones: bool = False,
+) -> tuple[dict[str, dict[str, int]], dict[str, list[str]]]:
+    """
+    Indexa los fragmentos de `documentos` que faltan y elimina los que ya no
+    están. Con `fuentes`, solo se eliminan fragmentos de esos archivos.
+    """
+    lexicos = {coleccion: IndiceLexico(_ruta_lexico(coleccion)) for coleccion in COLECCIONES}
+    # Una sincronización completa reconstruye la tabla; una parcial sustituye
+    # las filas de sus archivos
+    if fuentes is None:
+        montos = TablaMontos()
+    else:
+        montos = TablaMontos.cargar(_ruta_analitica())
+        montos.eliminar_fuentes(fuentes)
+
+    def en_ambito(fuente: str | None) -> bool:
+        return fuentes is None or fuente in fuentes
+
+    # Recorrer los documentos en flujo y repartir por colección en la misma
+    # pasada: de los fragmentos ya indexados solo se guarda el id; los nuevos se
+    # retienen en un `Corpus` columnar (sin un `Document` por fragmento)
+    log.info("Iniciando carga y división de documentos...")
+    presentes: dict[str, dict[str, str]] = {coleccion: {} for coleccion in COLECCIONES}
+    pendientes = Corpus()
+    filas: dict[str, dict[str, int]] = {coleccion: {} for coleccion in COLECCIONES}
+    # "cargar" mide solo la lectura y el parseo; "dividir" se registra por bloque
+    for chunk in iterar_fragmentos(medir_iterador("cargar", montos.registrar(documentos))):
+        coleccion = _coleccion_de(chunk.metadata.get("tipo"))
+        if coleccion is None:
+            continue
+        id_chunk = id_fragmento(chunk)
+        presentes[coleccion][id_chunk] = sys.intern(chunk.metadata.get("fuente", ""))
+        if id_chunk not in manifiesto["colecciones"].get(coleccion, {}) or id_chunk not in lexicos[coleccion]:
+            # Fragmentos idénticos comparten identificador
+            if id_chunk not in filas[coleccion]:
+                filas[coleccion][id_chunk] = pendientes.agregar(chunk, id_chunk)
+
+    montos.guardar(_ruta_analitica())
+
+    cambios: dict[str, dict[str, int]] = {}
+    retirados: dict[str, list[str]] = {}
+    for coleccion in COLECCIONES:
+        indexados = manifiesto["colecciones"].get(coleccion, {})
+        lexico = lexicos[coleccion]
+        nuevos = pendientes.pares([f for i, f in filas[coleccion].items() if i not in indexados])
+        eliminados = [i for i, f in indexados.items() if i not in presentes[coleccion] and en_ambito(f)]
+        # El índice léxico no necesita embeddings: se completa por separado
+        lexico_nuevos = pendientes.pares([f for i, f in filas[coleccion].items() if i not in lexico])
+        lexico_eliminados = [
+            i
+            for i, doc in lexico.documentos.items()
+            if i not in presentes[coleccion] and en_ambito(doc["metadatos"].get("fuente"))
         ]
+        if lexico_nuevos or lexico_eliminados:
+            with tramo("indexar_lexico", coleccion=coleccion, fragmentos=len(lexico_nuevos)):
+                lexico.eliminar(lexico_eliminados)
+                lexico.agregar(lexico_nuevos)
+                lexico.guardar()
+        if not (nuevos or eliminados):
+            continue
+        cambios[coleccion] = {"agregados": len(nuevos), "eliminados": len(eliminados)}
+        log.info("%s: +%d / -%d fragmentos", coleccion, len(nuevos), len(eliminados))
+        if diferir_eliminaciones and eliminados:
+            # Siguen en la colección (y en el manifiesto) hasta `eliminar_fragmentos`;
+            # las instantáneas nuevas ya no los ven porque no están en el léxico
+            retirados[coleccion], eliminados = eliminados, []
+            if not nuevos:
+                continue
+
+        if embeddings is None:
+            embeddings = obtener_embeddings()
+        os.makedirs(f"{_ruta_indice()}/{coleccion}", exist_ok=True)
+        vs = _abrir_coleccion(coleccion, embeddings)
+        if eliminados:
+            vs.delete(ids=eliminados)
 
-    contratos = filtrar_anios(contratos)
-    jurisprudencia = filtrar_anios(jurisprudencia)
-    finanzas = filtrar_anios(finanzas)
-    estatutos = filtrar_anios(estatutos)
-    legislacion = filtrar_anios(legislacion)
+        # El manifiesto refleja en todo momento lo que ya está persistido:
+        # se guarda tras cada lote para que una ingesta interrumpida se reanude
+        descartados = set(eliminados)
+        confirmados = {i: f for i, f in indexados.items() if i not in descartados}
+        manifiesto["colecciones"][coleccion] = confirmados
+        _guardar_manifiesto(manifiesto)
 
-    # Obtener la API key desde las variables de entorno
-    api_key = os.getenv("OPENAI_API_KEY")
+        def confirmar(ids: list[str]) -> None:
+            for i in ids:
+                confirmados[i] = presentes[coleccion][i]
+            _guardar_manifiesto(manifiesto)
 
-    if not api_key:
-        raise ValueError("La API key de OpenAI no está configurada en las variables de entorno.")
+        ingerir(vs, nuevos, embeddings, al_confirmar=confirmar)
 
-    embeddings = OpenAIEmbeddings(
-        model="text-embedding-ada-002",
-        api_key=api_key
-    )
+    return cambios, retirados
 
-    print("[VECTORSTORE] Construyendo índices vectoriales separados...")
-    # Asegurar que los subdirectorios existan
-    for sub in ("contrato", "jurisprudencia", "finanzas", "estatutos", "legislacion"):
-        os.makedirs(f"{CHROMA_PATH}/{sub}", exist_ok=True)
 
+def abrir_vectorstores(embeddings=None, colecciones: Iterable[str] | None = None) -> dict:
+    """
+    Abre las colecciones ya indexadas (todas o solo `colecciones`) sin escribir
+    en ellas. Solo se devuelven las que contienen al menos un fragmento según
+    el manifiesto.
+    """
+    manifiesto = _cargar_manifiesto() or {"colecciones": {}}
     vectorstores = {}
-    if contratos:
-        vectorstores["contrato"] = Chroma.from_documents(documents=contratos, embedding=embeddings, persist_directory=CHROMA_PATH+"/contrato")
-    if jurisprudencia:
-        vectorstores["jurisprudencia"] = Chroma.from_documents(documents=jurisprudencia, embedding=embeddings, persist_directory=CHROMA_PATH+"/jurisprudencia")
-    if finanzas:
-        vectorstores["finanzas"] = Chroma.from_documents(documents=finanzas, embedding=embeddings, persist_directory=CHROMA_PATH+"/finanzas")
-    if estatutos:
-        vectorstores["estatutos"] = Chroma.from_documents(documents=estatutos, embedding=embeddings, persist_directory=CHROMA_PATH+"/estatutos")
-    if legislacion:
-        vectorstores["legislacion"] = Chroma.from_documents(documents=legislacion, embedding=embeddings, persist_directory=CHROMA_PATH+"/legislacion")
-    print("[VECTORSTORE] Vectorstores generados exitosamente.")
-    return vectorstores
\ No newline at end of file
+    for coleccion in COLECCIONES if colecciones is None else colecciones:
+        if not manifiesto["colecciones"].get(coleccion):
+            continue
+        if embeddings is None:
+            embeddings = obtener_embeddings()
+        vectorstores[coleccion] = ColeccionHibrida(
+            _abrir_coleccion(coleccion, embeddings), IndiceLexico(_ruta_lexico(coleccion))
+        )
+    return vectorstores
+
+
+def abrir_analitica() -> TablaMontos:
+    """Tabla de montos del índice activo (ver `rag/analitica.py`), sin reindexar."""
+    return abrir_tabla(_ruta_analitica())
+
+
+def construir_vectorstore():
+    """
+    Actualiza el índice de forma incremental (sin llamadas de embeddings si
+    `data/` no cambió) y devuelve las colecciones listas para consulta.
+    """
+    embeddings = obtener_embeddings()
+    with tramo("actualizar_indice"):
+        actualizar_indice(embeddings)
+    vectorstores = abrir_vectorstores(embeddings)
+    log.info("Vectorstores listos para consulta. Caché de embeddings: %s", embeddings.estadisticas())
+    return vectorstores
@@ -0,0 +1,128 @@
+"""
+rag/vigilancia.py
+
+Vigilancia de `data/` en segundo plano para el modo servicio:
+
+• Un hilo revisa cada `intervalo` segundos la fecha de modificación y el
+  tamaño de los `.txt` de cada tipo (sondeo de mtime: no depende de inotify y
+  funciona igual en cualquier sistema de archivos).
+• Solo los archivos añadidos, modificados o eliminados se vuelven a parsear
+  con `rag.loader` y `rag.splitter` (`actualizar_archivos`); los fragmentos
+  nuevos se indexan y los que desaparecen se retiran.
+• Las colecciones afectadas se reabren y se entregan a `al_actualizar`, que
+  sustituye la instantánea que leen las consultas. Las consultas en curso
+  terminan sobre la instantánea anterior.
+• Los vectores retirados se borran en la revisión siguiente, cuando ya
+  ninguna consulta usa la instantánea que los contenía.
+"""
+
+import logging
+import threading
+import time
+from pathlib import Path
+from typing import Callable
+
+from rag.loader import BASE_DIR, listar_archivos
+from rag.vectorstore import abrir_vectorstores, actualizar_archivos, eliminar_fragmentos, obtener_embeddings
+from trazas import tramo
+
+log = logging.getLogger(__name__)
+
+INTERVALO_SEGUNDOS = 5.0
+
+
+class Vigilante:
+    """Mantiene el índice al día con `data/` sin bloquear las consultas."""
+
+    def __init__(
+        self,
+        al_actualizar: Callable[[dict, list[str]], None],
+        intervalo: float = INTERVALO_SEGUNDOS,
+        base_dir: Path = BASE_DIR,
+        embeddings=None,
+    ):
+        """
+        Args:
+            al_actualizar: Recibe las colecciones reabiertas y los nombres de
+                las que cambiaron (una colección que queda vacía no se reabre).
+            intervalo: Segundos entre revisiones.
+            base_dir: Directorio de datos vigilado.
+            embeddings: Modelo de embeddings; por defecto `obtener_embeddings()`.
+        """
+        self.al_actualizar = al_actualizar
+        self.intervalo = intervalo
+        self.base_dir = base_dir
+        self.embeddings = embeddings or obtener_embeddings()
+        self.actualizaciones = 0
+        self.ultima_actualizacion: float | None = None
+        self._estado = self._explorar()
+        self._retirados: dict[str, list[str]] = {}
+        self._detener = threading.Event()
+        self._hilo: threading.Thread | None = None
+
+    def _explorar(self) -> dict[str, tuple[int, int]]:
+        """Ruta -> (mtime en ns, tamaño) de cada archivo vigilado."""
+        estado = {}
+        for archivo, _ in listar_archivos(self.base_dir):
+            try:
+                info = archivo.stat()
+            except FileNotFoundError:
+                continue
+            estado[str(archivo)] = (info.st_mtime_ns, info.st_size)
+        return estado
+
+    def revisar(self) -> dict[str, dict[str, int]]:
+        """
+        Una revisión: borra los vectores retirados en la anterior y sincroniza
+        los archivos que cambiaron desde entonces.
+
+        Returns:
+            Por colección, cuántos fragmentos se agregaron y cuántos se eliminaron.
+        """
+        if self._retirados:
+            eliminar_fragmentos(self._retirados, self.embeddings)
+            self._retirados = {}
+
+        estado = self._explorar()
+        modificados = sorted(r for r in estado.keys() | self._estado.keys() if estado.get(r) != self._estado.get(r))
+        if not modificados:
+            return {}
+
+        with tramo("vigilancia", archivos=len(modificados)) as medida:
+            cambios, self._retirados = actualizar_archivos(modificados, self.embeddings)
+            medida["colecciones"] = len(cambios)
+        # Si la sincronización falla, el estado no avanza y se reintenta
+        self._estado = estado
+        if cambios:
+            self.al_actualizar(abrir_vectorstores(self.embeddings, colecciones=cambios), sorted(cambios))
+            self.actualizaciones += 1
+            self.ultima_actualizacion = time.time()
+            log.info("Índice actualizado desde %d archivo(s): %s", len(modificados), cambios)
+        return cambios
+
+    def _bucle(self) -> None:
+        while not self._detener.wait(self.intervalo):
+            try:
+                self.revisar()
+            except Exception:
+                log.exception("Error al sincronizar los cambios de %s", self.base_dir)
+
+    def iniciar(self) -> None:
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._bucle, name="vigilancia", daemon=True)
+            self._hilo.start()
+            log.info("Vigilando %s cada %.1f s", self.base_dir, self.intervalo)
+
+    def detener(self) -> None:
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join()
+            self._hilo = None
+
+    def estado(self) -> dict:
+        return {
+            "intervalo": self.intervalo,
+            "archivos": len(self._estado),
+            "actualizaciones": self.actualizaciones,
+            "ultima_actualizacion": self.ultima_actualizacion,
+        }
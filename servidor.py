@@ -0,0 +1,237 @@
+"""
+servidor.py
+
+Modo servicio residente del asistente legal.
+--------------------------------------------
+• Importa LangChain, Chroma y ReportLab una sola vez y mantiene abiertas las
+  colecciones de `rag/chroma_db` entre peticiones.
+• Atiende informes para cualquier periodo y empresa sin pagar de nuevo el
+  arranque en frío.
+• Con `--vigilar` un hilo incorpora los archivos nuevos, modificados o
+  eliminados de `data/` (ver `rag/vigilancia.py`) y sustituye las colecciones
+  abiertas por una instantánea nueva; las peticiones no esperan al índice.
+
+Uso:
+    python main.py --servidor [--host 127.0.0.1] [--puerto 8080] [--vigilar [SEGUNDOS]]
+
+Endpoints:
+    GET  /salud        Estado del servicio y colecciones abiertas.
+    POST /precalentar  Sincroniza el índice con `data/` y reabre las colecciones.
+    POST /informe      {"periodo": "2020-2022", "empresa": "Cacti S.A.", "pregunta": "..."}
+    POST /informe/stream  Mismo cuerpo; responde texto plano por partes
+                          (chunked) a medida que se genera el informe.
+    POST /informe/pdf  Mismo cuerpo; devuelve el PDF generado en memoria.
+    GET  /metricas     Latencia, tokens, caché y coste por tramo (formato Prometheus).
+"""
+
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+from agents.pdf_informe import renderizar_pdf_en_segundo_plano
+from graph.flujo import ejecutar_flujo_legal, ejecutar_flujo_legal_stream
+from rag.vectorstore import construir_vectorstore
+from trazas import metricas_prometheus, nueva_traza
+
+log = logging.getLogger(__name__)
+
+EMPRESA_POR_DEFECTO = "Cacti S.A."
+PREGUNTA_POR_DEFECTO = "¿Cuál es el resumen legal del periodo indicado?"
+
+
+class EstadoServicio:
+    """Colecciones abiertas compartidas por todas las peticiones."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.vectorstores: dict | None = None
+        self.vigilante = None
+
+    def precalentar(self) -> dict:
+        """Actualiza el índice de forma incremental y abre las colecciones."""
+        with self._lock:
+            self.vectorstores = construir_vectorstore()
+            return self.vectorstores
+
+    def reemplazar(self, abiertas: dict, colecciones: list[str]) -> None:
+        """Publica una instantánea nueva con las colecciones reabiertas."""
+        with self._lock:
+            vectorstores = {n: c for n, c in (self.vectorstores or {}).items() if n not in colecciones}
+            vectorstores.update(abiertas)
+            # Cada petición toma el diccionario una vez: cambiar la referencia
+            # no afecta a las que ya están en curso
+            self.vectorstores = vectorstores
+
+    def vigilar(self, intervalo: float) -> None:
+        """Arranca la vigilancia de `data/` en segundo plano."""
+        from rag.vigilancia import Vigilante
+
+        self.vigilante = Vigilante(self.reemplazar, intervalo)
+        self.vigilante.iniciar()
+
+    def obtener_vectorstores(self) -> dict:
+        if self.vectorstores is None:
+            return self.precalentar()
+        return self.vectorstores
+
+    def salud(self) -> dict:
+        return {
+            "estado": "ok",
+            "listo": self.vectorstores is not None,
+            "colecciones": sorted(self.vectorstores or {}),
+            "vigilancia": self.vigilante.estado() if self.vigilante else None,
+        }
+
+
+class ManejadorInformes(BaseHTTPRequestHandler):
+    # HTTP/1.1 para poder responder con Transfer-Encoding: chunked
+    protocol_version = "HTTP/1.1"
+    estado: EstadoServicio
+
+    def _responder(self, codigo: int, cuerpo: dict) -> None:
+        datos = json.dumps(cuerpo, ensure_ascii=False).encode("utf-8")
+        self.send_response(codigo)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def _leer_json(self) -> Any:
+        """Cuerpo JSON de la petición tal cual (no necesariamente un objeto)."""
+        longitud = int(self.headers.get("Content-Length") or 0)
+        if not longitud:
+            return {}
+        return json.loads(self.rfile.read(longitud).decode("utf-8"))
+
+    def _responder_texto(self, texto: str, tipo: str) -> None:
+        datos = texto.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def _responder_pdf(self, datos: bytes) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "application/pdf")
+        self.send_header("Content-Length", str(len(datos)))
+        self.end_headers()
+        self.wfile.write(datos)
+
+    def _responder_stream(self, partes) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def escribir(datos: bytes) -> None:
+            self.wfile.write(f"{len(datos):X}\r\n".encode("ascii") + datos + b"\r\n")
+            self.wfile.flush()
+
+        # Las cabeceras ya se enviaron: un error no puede convertirse en un 500,
+        # se comunica como último fragmento y se cierra la respuesta
+        try:
+            try:
+                for parte in partes:
+                    datos = parte.encode("utf-8")
+                    if datos:
+                        escribir(datos)
+            except ConnectionError:
+                raise
+            except Exception as e:
+                log.exception("Error durante el streaming del informe")
+                escribir(f"\n\n[Error: {e}]\n".encode("utf-8"))
+            self.wfile.write(b"0\r\n\r\n")
+        except ConnectionError:
+            # El cliente cerró la conexión (BrokenPipe, reset): no queda nada que enviar
+            log.info("Conexión cerrada durante el streaming del informe.")
+            self.close_connection = True
+        finally:
+            if hasattr(partes, "close"):
+                partes.close()
+
+    def _leer_solicitud_informe(self) -> dict | None:
+        """Valida el cuerpo de /informe; responde 400 y devuelve None si no es válido."""
+        solicitud = self._leer_json()
+        if not isinstance(solicitud, dict):
+            self._responder(400, {"error": "El cuerpo debe ser un objeto JSON."})
+            return None
+        periodo = solicitud.get("periodo")
+        # `null`, listas u objetos no son un periodo (str() los convertiría en texto)
+        if isinstance(periodo, bool) or not isinstance(periodo, (str, int)):
+            periodo = ""
+        periodo = str(periodo).strip()
+        if not periodo:
+            self._responder(400, {"error": "Debe indicar un periodo válido."})
+            return None
+        return {
+            "pregunta": solicitud.get("pregunta") or PREGUNTA_POR_DEFECTO,
+            "empresa": solicitud.get("empresa") or EMPRESA_POR_DEFECTO,
+            "periodo": periodo,
+            "vectorstores": self.estado.obtener_vectorstores(),
+        }
+
+    def do_GET(self) -> None:
+        if self.path == "/salud":
+            self._responder(200, self.estado.salud())
+        elif self.path == "/metricas":
+            self._responder_texto(metricas_prometheus(), "text/plain; version=0.0.4; charset=utf-8")
+        else:
+            self._responder(404, {"error": "Ruta no encontrada."})
+
+    def do_POST(self) -> None:
+        with nueva_traza():
+            self._atender_post()
+
+    def _atender_post(self) -> None:
+        try:
+            if self.path == "/precalentar":
+                self.estado.precalentar()
+                self._responder(200, self.estado.salud())
+            elif self.path == "/informe":
+                solicitud = self._leer_solicitud_informe()
+                if solicitud is not None:
+                    # El cliente recibe el texto: no se escribe ningún PDF compartido
+                    self._responder(200, {"resumen": ejecutar_flujo_legal(**solicitud, nombre_pdf=None)})
+            elif self.path == "/informe/stream":
+                solicitud = self._leer_solicitud_informe()
+                if solicitud is not None:
+                    self._responder_stream(ejecutar_flujo_legal_stream(**solicitud, nombre_pdf=None))
+            elif self.path == "/informe/pdf":
+                solicitud = self._leer_solicitud_informe()
+                if solicitud is not None:
+                    secciones = {}
+                    for _ in ejecutar_flujo_legal_stream(**solicitud, nombre_pdf=None, secciones=secciones):
+                        pass
+                    # Se renderiza en el pool de procesos, fuera del GIL del servidor
+                    self._responder_pdf(renderizar_pdf_en_segundo_plano(secciones).result())
+            else:
+                self._responder(404, {"error": "Ruta no encontrada."})
+        except json.JSONDecodeError:
+            self._responder(400, {"error": "El cuerpo de la petición no es JSON válido."})
+        except Exception as e:
+            self._responder(500, {"error": str(e)})
+
+
+def servir(host: str = "127.0.0.1", puerto: int = 8080, vigilar: float | None = None) -> None:
+    """
+    Precalienta las colecciones y atiende peticiones hasta Ctrl+C. Con
+    `vigilar`, revisa `data/` cada tantos segundos.
+    """
+    estado = EstadoServicio()
+    estado.precalentar()
+    if vigilar:
+        estado.vigilar(vigilar)
+    manejador = type("Manejador", (ManejadorInformes,), {"estado": estado})
+    servidor = ThreadingHTTPServer((host, puerto), manejador)
+    log.info("Escuchando en http://%s:%d", host, puerto)
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if estado.vigilante:
+            estado.vigilante.detener()
+        servidor.server_close()
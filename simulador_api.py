@@ -0,0 +1,230 @@
+"""
+simulador_api.py
+
+Servidor local que sustituye al endpoint de embeddings de OpenAI.
+-----------------------------------------------------------------
+• Atiende `POST /v1/embeddings` con la misma forma de respuesta que la API
+  (incluido `encoding_format="base64"`, el que usa el SDK por defecto) y
+  vectores de `backends.EmbeddingsHash`: la ingesta con `ALIE_BACKEND=openai`
+  se prueba sin red ni API key.
+• Inyecta fallos: respuestas 429 (`--tasa-429`, de forma determinista: una
+  de cada 1/tasa peticiones, empezando por la primera) y una interrupción
+  tras N peticiones atendidas (`--fallar-tras`), que responde 400 a todo lo
+  demás como si el proceso de ingesta se hubiera cortado.
+• `--comprobar` ejecuta una ingesta completa contra el simulador: la primera
+  se interrumpe a medias, la segunda debe reanudarse desde los lotes ya
+  confirmados en el manifiesto sin volver a pedir sus embeddings, y ambas
+  deben superar los 429 con la espera exponencial de `rag/ingesta.py`.
+
+Uso:
+    python simulador_api.py --puerto 8081 --tasa-429 0.1
+    OPENAI_BASE_URL=http://127.0.0.1:8081/v1 OPENAI_API_KEY=sk-simulado python main.py --servidor
+    python simulador_api.py --comprobar [--segmentos 2000]
+"""
+
+import argparse
+import base64
+import json
+import os
+import shutil
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import numpy as np
+
+from backends import DIMENSION_HASH, EmbeddingsHash
+
+
+class SimuladorAPI:
+    """Endpoint `/v1/embeddings` local con 429 e interrupciones inyectadas."""
+
+    def __init__(
+        self,
+        tasa_429: float = 0.0,
+        fallar_tras: int | None = None,
+        dimension: int = DIMENSION_HASH,
+    ):
+        self.tasa_429 = tasa_429
+        self.fallar_tras = fallar_tras
+        self.embeddings = EmbeddingsHash(dimension)
+        self._lock = threading.Lock()
+        self._servidor: ThreadingHTTPServer | None = None
+        self.reiniciar_contadores()
+
+    def reiniciar_contadores(self) -> None:
+        self.peticiones = 0
+        self.recibidas = 0
+        self.respuestas_429 = 0
+        self.textos_embebidos = 0
+
+    def _decidir(self, textos: int) -> int:
+        """Código de respuesta de la petición (y contadores), de forma atómica."""
+        with self._lock:
+            if self.fallar_tras is not None and self.peticiones >= self.fallar_tras:
+                return 400
+            self.recibidas += 1
+            if self.tasa_429 and (self.recibidas - 1) % max(1, round(1 / self.tasa_429)) == 0:
+                self.respuestas_429 += 1
+                return 429
+            self.peticiones += 1
+            self.textos_embebidos += textos
+            return 200
+
+    def _respuesta(self, cuerpo: dict) -> tuple[int, dict]:
+        entradas = cuerpo.get("input", [])
+        # El SDK envía texto o, tras tokenizar, listas de ids de tokens
+        if isinstance(entradas, str) or (entradas and isinstance(entradas[0], int)):
+            entradas = [entradas]
+        textos = [e if isinstance(e, str) else " ".join(map(str, e)) for e in entradas]
+
+        codigo = self._decidir(len(textos))
+        if codigo == 429:
+            return 429, {"error": {"message": "Rate limit simulado", "type": "rate_limit_error", "code": "rate_limit_exceeded"}}
+        if codigo == 400:
+            return 400, {"error": {"message": "Interrupción simulada de la ingesta", "type": "invalid_request_error"}}
+
+        base64_pedido = cuerpo.get("encoding_format") == "base64"
+        datos = []
+        for indice, vector in enumerate(self.embeddings.embed_documents(textos)):
+            if base64_pedido:
+                vector = base64.b64encode(np.asarray(vector, dtype="<f4").tobytes()).decode("ascii")
+            datos.append({"object": "embedding", "index": indice, "embedding": vector})
+        uso = sum(len(t.split()) for t in textos)
+        return 200, {
+            "object": "list",
+            "data": datos,
+            "model": cuerpo.get("model", "simulado"),
+            "usage": {"prompt_tokens": uso, "total_tokens": uso},
+        }
+
+    def iniciar(self, host: str = "127.0.0.1", puerto: int = 0) -> str:
+        """Atiende en un hilo en segundo plano y devuelve la URL base (`.../v1`)."""
+        simulador = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args) -> None:
+                pass
+
+            def do_POST(self) -> None:
+                longitud = int(self.headers.get("Content-Length") or 0)
+                cuerpo = json.loads(self.rfile.read(longitud) or b"{}")
+                if self.path.rstrip("/").endswith("/embeddings"):
+                    codigo, respuesta = simulador._respuesta(cuerpo)
+                else:
+                    codigo, respuesta = 404, {"error": {"message": "Solo se simula /v1/embeddings"}}
+                datos = json.dumps(respuesta).encode("utf-8")
+                self.send_response(codigo)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(datos)))
+                self.end_headers()
+                self.wfile.write(datos)
+
+        self._servidor = ThreadingHTTPServer((host, puerto), Manejador)
+        threading.Thread(target=self._servidor.serve_forever, name="simulador-api", daemon=True).start()
+        return f"http://{host}:{self._servidor.server_port}/v1"
+
+    def detener(self) -> None:
+        if self._servidor is not None:
+            self._servidor.shutdown()
+            self._servidor.server_close()
+            self._servidor = None
+
+
+def _fragmentos_confirmados() -> int:
+    from rag.vectorstore import _cargar_manifiesto
+
+    manifiesto = _cargar_manifiesto() or {"colecciones": {}}
+    return sum(len(ids) for ids in manifiesto["colecciones"].values())
+
+
+def comprobar(segmentos: int = 2_000, tasa_429: float = 0.25, fallar_tras: int = 5, semilla: int = 0) -> None:
+    """
+    Ingesta interrumpida y reanudada contra el simulador, en un directorio
+    temporal. Lanza `AssertionError` si los reintentos o la reanudación fallan.
+    """
+    simulador = SimuladorAPI(tasa_429=tasa_429, fallar_tras=fallar_tras)
+    os.environ.update(
+        OPENAI_BASE_URL=simulador.iniciar(),
+        OPENAI_API_KEY="sk-simulado",
+        ALIE_BACKEND="openai",
+        # Los 429 llegan a `rag.ingesta` en lugar de reintentarse en el SDK
+        ALIE_MAX_REINTENTOS="0",
+        ALIE_INDICE=os.getenv("ALIE_INDICE", "numpy"),
+    )
+
+    import clientes
+    from benchmark import generar_corpus
+    from rag import ingesta
+    from rag.vectorstore import actualizar_indice
+
+    os.environ["ALIE_BACKEND"] = "openai"  # `benchmark` fija el backend local al importarse
+    clientes.cerrar()
+    ingesta.ESPERA_INICIAL = 0.05
+
+    origen = os.getcwd()
+    directorio = tempfile.mkdtemp(prefix="alie_simulador_")
+    os.chdir(directorio)
+    try:
+        generar_corpus(Path("data"), segmentos, semilla)
+
+        try:
+            actualizar_indice()
+        except Exception as e:
+            print(f"1ª ingesta interrumpida tras {simulador.peticiones} lotes: {type(e).__name__}")
+        else:
+            raise AssertionError("La primera ingesta debía interrumpirse: aumente --segmentos.")
+        confirmados = _fragmentos_confirmados()
+        print(f"  fragmentos confirmados: {confirmados}  respuestas 429 superadas: {simulador.respuestas_429}")
+        assert confirmados > 0, "Ningún lote llegó a confirmarse."
+        assert simulador.respuestas_429 > 0, "No se ejercitaron los reintentos ante 429."
+
+        simulador.fallar_tras = None
+        simulador.reiniciar_contadores()
+        cambios = actualizar_indice()
+        agregados = sum(c["agregados"] for c in cambios.values())
+        total = _fragmentos_confirmados()
+        print(
+            f"2ª ingesta: {agregados} fragmentos agregados, {simulador.textos_embebidos} textos enviados"
+            f" a la API, {simulador.respuestas_429} respuestas 429 superadas ({total} en total)"
+        )
+        assert simulador.respuestas_429 > 0, "No se ejercitaron los reintentos ante 429."
+        assert agregados == total - confirmados, "Se volvieron a indexar fragmentos ya confirmados."
+        assert simulador.textos_embebidos <= agregados, "Se volvieron a pedir embeddings de lotes confirmados."
+
+        simulador.reiniciar_contadores()
+        assert actualizar_indice() == {} and simulador.textos_embebidos == 0, "La 3ª ingesta debía estar vacía."
+        print("3ª ingesta: sin cambios ni peticiones. Reintentos y reanudación correctos.")
+    finally:
+        os.chdir(origen)
+        simulador.detener()
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Endpoint de embeddings local para probar la ingesta sin conexión.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=8081)
+    parser.add_argument("--tasa-429", type=float, default=0.0, help="Fracción de peticiones que responden 429.")
+    parser.add_argument("--fallar-tras", type=int, help="Peticiones atendidas antes de simular una interrupción.")
+    parser.add_argument("--semilla", type=int, default=0, help="Semilla del corpus de --comprobar.")
+    parser.add_argument("--comprobar", action="store_true", help="Ejecuta la comprobación de reintentos y reanudación.")
+    parser.add_argument("--segmentos", type=int, default=2_000, help="Tamaño del corpus de --comprobar.")
+    args = parser.parse_args()
+
+    if args.comprobar:
+        comprobar(args.segmentos, args.tasa_429 or 0.25, args.fallar_tras or 5, args.semilla)
+        return
+    simulador = SimuladorAPI(args.tasa_429, args.fallar_tras)
+    print(f"Simulador escuchando en {simulador.iniciar(args.host, args.puerto)} (Ctrl+C para terminar)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        simulador.detener()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+"""
+trazas.py
+
+Instrumentación del flujo: tramos (spans) con latencia, tokens, caché y coste.
+-----------------------------------------------------------------------------
+• `tramo(nombre, **atributos)` mide el tiempo real de un bloque; dentro del
+  bloque se pueden añadir atributos (tokens, aciertos de caché, coste...).
+• Cada tramo se agrega en memoria para el endpoint `/metricas` (formato de
+  texto de Prometheus) y, si se configura, se escribe como una línea JSON en
+  el archivo de `ALIE_TRAZAS` (o el indicado en `configurar_trazas`).
+• Los tramos de un mismo informe comparten un identificador de traza
+  (`nueva_traza`); los hilos lanzados con `en_contexto` lo heredan.
+• `coste_estimado` aplica la tabla `PRECIOS_USD_POR_MILLON` a los tokens.
+"""
+
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+
+FORMATO_LOG = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+# Precio en USD por millón de tokens: (entrada, salida)
+PRECIOS_USD_POR_MILLON = {
+    "gpt-4o": (2.50, 10.00),
+    "text-embedding-ada-002": (0.10, 0.0),
+    "text-embedding-3-small": (0.02, 0.0),
+    "text-embedding-3-large": (0.13, 0.0),
+}
+
+# Límites superiores (segundos) del histograma de latencias
+CUBETAS_SEGUNDOS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Atributos numéricos que se acumulan como contadores por tramo
+CONTADORES = {
+    "tokens_entrada": "Tokens enviados a la API",
+    "tokens_salida": "Tokens generados por la API",
+    "aciertos_cache": "Consultas resueltas por la caché",
+    "fallos_cache": "Consultas que no estaban en caché",
+    "coste_usd": "Coste estimado de la API en USD",
+}
+
+log = logging.getLogger(__name__)
+
+_traza: contextvars.ContextVar[str | None] = contextvars.ContextVar("traza", default=None)
+
+
+def configurar_logging(nivel: int = logging.INFO) -> None:
+    """Configura el logging de la aplicación (sustituye a los `print` de progreso)."""
+    logging.basicConfig(level=nivel, format=FORMATO_LOG)
+
+
+def coste_estimado(modelo: str, tokens_entrada: int, tokens_salida: int = 0) -> float:
+    """Coste aproximado en USD de una llamada; 0 si el modelo no está en la tabla."""
+    entrada, salida = PRECIOS_USD_POR_MILLON.get(modelo, (0.0, 0.0))
+    return (tokens_entrada * entrada + tokens_salida * salida) / 1_000_000
+
+
+class _Registro:
+    """Agregados en memoria por nombre de tramo y, opcionalmente, archivo JSONL."""
+
+    def __init__(self, ruta_jsonl: str | None = None):
+        self._lock = threading.Lock()
+        self.ruta_jsonl = ruta_jsonl
+        self.cuentas: dict[str, int] = defaultdict(int)
+        self.errores: dict[str, int] = defaultdict(int)
+        self.segundos: dict[str, float] = defaultdict(float)
+        self.cubetas: dict[str, list[int]] = defaultdict(lambda: [0] * len(CUBETAS_SEGUNDOS))
+        self.contadores: dict[tuple[str, str], float] = defaultdict(float)
+
+    def registrar(self, nombre: str, segundos: float, atributos: dict[str, Any], error: str | None) -> None:
+        registro = {"ts": round(time.time(), 3), "traza": _traza.get(), "tramo": nombre, "segundos": round(segundos, 6)}
+        registro.update(atributos)
+        if error:
+            registro["error"] = error
+        with self._lock:
+            self.cuentas[nombre] += 1
+            self.segundos[nombre] += segundos
+            if error:
+                self.errores[nombre] += 1
+            cubetas = self.cubetas[nombre]
+            for i, limite in enumerate(CUBETAS_SEGUNDOS):
+                if segundos <= limite:
+                    cubetas[i] += 1
+            for clave in CONTADORES:
+                valor = atributos.get(clave)
+                if isinstance(valor, (int, float)):
+                    self.contadores[(clave, nombre)] += valor
+            if self.ruta_jsonl:
+                with open(self.ruta_jsonl, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(registro, ensure_ascii=False, default=str) + "\n")
+
+    def resumen(self) -> dict[str, dict[str, float]]:
+        """Por tramo: número de registros, segundos acumulados y contadores."""
+        with self._lock:
+            resumen = {
+                nombre: {"cuenta": self.cuentas[nombre], "segundos": self.segundos[nombre], "errores": self.errores[nombre]}
+                for nombre in self.cuentas
+            }
+            for (clave, nombre), valor in self.contadores.items():
+                resumen[nombre][clave] = valor
+        return resumen
+
+    def reiniciar(self) -> None:
+        with self._lock:
+            for agregado in (self.cuentas, self.errores, self.segundos, self.cubetas, self.contadores):
+                agregado.clear()
+
+    def prometheus(self) -> str:
+        """Agregados en formato de texto de Prometheus."""
+        with self._lock:
+            lineas = [
+                "# HELP alie_tramo_segundos Duración de los tramos del flujo.",
+                "# TYPE alie_tramo_segundos histogram",
+            ]
+            for nombre in sorted(self.cuentas):
+                for limite, valor in zip(CUBETAS_SEGUNDOS, self.cubetas[nombre]):
+                    lineas.append(f'alie_tramo_segundos_bucket{{tramo="{nombre}",le="{limite}"}} {valor}')
+                lineas.append(f'alie_tramo_segundos_bucket{{tramo="{nombre}",le="+Inf"}} {self.cuentas[nombre]}')
+                lineas.append(f'alie_tramo_segundos_sum{{tramo="{nombre}"}} {self.segundos[nombre]:.6f}')
+                lineas.append(f'alie_tramo_segundos_count{{tramo="{nombre}"}} {self.cuentas[nombre]}')
+            lineas += ["# HELP alie_tramo_errores_total Tramos terminados con excepción.", "# TYPE alie_tramo_errores_total counter"]
+            for nombre in sorted(self.cuentas):
+                lineas.append(f'alie_tramo_errores_total{{tramo="{nombre}"}} {self.errores[nombre]}')
+            for clave, ayuda in CONTADORES.items():
+                lineas += [f"# HELP alie_{clave}_total {ayuda}.", f"# TYPE alie_{clave}_total counter"]
+                for (c, nombre), valor in sorted(self.contadores.items()):
+                    if c == clave:
+                        lineas.append(f'alie_{clave}_total{{tramo="{nombre}"}} {valor:g}')
+        return "\n".join(lineas) + "\n"
+
+
+_registro = _Registro(os.getenv("ALIE_TRAZAS") or None)
+
+
+def configurar_trazas(ruta_jsonl: str | None) -> None:
+    """Escribe cada tramo como una línea JSON en `ruta_jsonl` (None lo desactiva)."""
+    _registro.ruta_jsonl = ruta_jsonl
+
+
+def registrar_tramo(nombre: str, segundos: float, error: str | None = None, **atributos) -> None:
+    """Registra un tramo medido por otro medio (p. ej. en un proceso hijo)."""
+    _registro.registrar(nombre, segundos, atributos, error)
+
+
+@contextmanager
+def tramo(nombre: str, **atributos) -> Iterator[dict[str, Any]]:
+    """
+    Mide el bloque y lo registra al salir. El diccionario devuelto admite
+    atributos adicionales, que se incluyen en la traza y en las métricas.
+    """
+    datos = dict(atributos)
+    inicio = time.perf_counter()
+    error = None
+    try:
+        yield datos
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        _registro.registrar(nombre, time.perf_counter() - inicio, datos, error)
+
+
+def medir_iterador(nombre: str, iterable, **atributos) -> Iterator:
+    """
+    Recorre `iterable` y registra como un único tramo el tiempo pasado dentro
+    de él (sin contar el del consumidor), con el número de elementos.
+    """
+    iterador = iter(iterable)
+    segundos, elementos = 0.0, 0
+    while True:
+        inicio = time.perf_counter()
+        try:
+            elemento = next(iterador)
+        except StopIteration:
+            segundos += time.perf_counter() - inicio
+            break
+        segundos += time.perf_counter() - inicio
+        elementos += 1
+        yield elemento
+    registrar_tramo(nombre, segundos, elementos=elementos, **atributos)
+
+
+@contextmanager
+def nueva_traza(traza: str | None = None) -> Iterator[str]:
+    """Agrupa los tramos siguientes bajo un identificador de traza."""
+    traza = traza or uuid.uuid4().hex[:16]
+    token = _traza.set(traza)
+    try:
+        yield traza
+    finally:
+        _traza.reset(token)
+
+
+def en_contexto(funcion: Callable) -> Callable:
+    """Envuelve `funcion` para que se ejecute con la traza actual en otro hilo."""
+    contexto = contextvars.copy_context()
+    return lambda *args, **kwargs: contexto.run(funcion, *args, **kwargs)
+
+
+def metricas_prometheus() -> str:
+    return _registro.prometheus()
+
+
+def resumen_tramos() -> dict[str, dict[str, float]]:
+    """Agregados por tramo desde el arranque (o el último `reiniciar_tramos`)."""
+    return _registro.resumen()
+
+
+def reiniciar_tramos() -> None:
+    _registro.reiniciar()